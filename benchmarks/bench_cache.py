@@ -0,0 +1,133 @@
+"""Response cache cost at 10k entries, its size estimate, and compression.
+
+Times ``set`` into a full cache (every insert evicts), ``get_entry`` hits and
+misses, and sweeping 10k expired entries, next to the linear scan over all
+entries that ``set`` used to run on every insert. Then fills a cache with
+real-sized boards, catalog and thread responses from fixtures.py and compares
+the byte estimate the budget is enforced against with tracemalloc, for the
+decoded ``TTLCache`` and for ``CompressedCache`` (``--compress-cache``),
+whose cold lookups pay for a decompress and decode.
+
+Run with ``uv run python benchmarks/bench_cache.py``.
+"""
+
+import json
+import time
+import timeit
+import tracemalloc
+
+import fixtures
+
+from imageboard_explorer.clients.chan_api import ResponseCache, TTLCache, entry_bytes
+from imageboard_explorer.clients.compressed_cache import CompressedCache
+
+ENTRIES = 10_000
+BODY = b'{"posts":[]}' + b" " * 500
+
+
+def per_call(label: str, func: object, number: int) -> None:
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{label:<40} {seconds * 1e6:8.2f} us")
+
+
+def keys(prefix: str) -> list[str]:
+    return [f"https://a.4cdn.org/{prefix}/thread/{no}.json" for no in range(ENTRIES)]
+
+
+def timing() -> None:
+    size = entry_bytes(None, BODY)
+    cache = TTLCache(max_bytes=ENTRIES * size, stale_grace_seconds=300)
+    for key in keys("g"):
+        cache.set(key, {"posts": []}, 60, None, BODY)
+    print(f"{cache.stats.entries} entries, {cache.stats.bytes / 2**20:.1f} MiB")
+
+    churn = iter(range(10**9))
+    per_call(
+        "set into a full cache (evicts one)",
+        lambda: cache.set(f"k{next(churn)}", {"posts": []}, 60, None, BODY),
+        ENTRIES,
+    )
+    hot = keys("g")[-1]
+    per_call("get_entry hit", lambda: cache.get_entry(hot), 100_000)
+    per_call("get_entry miss", lambda: cache.get_entry("missing"), 100_000)
+    per_call("refresh", lambda: cache.refresh(hot, 60), 100_000)
+
+    def linear_sweep() -> list[str]:
+        now = time.monotonic()
+        return [key for key, entry in cache._entries.items() if entry.expires_at <= now]
+
+    per_call("old per-set sweep: scan of 10k entries", linear_sweep, 100)
+
+    expiring = TTLCache(max_bytes=2 * ENTRIES * size)
+    for key in keys("v"):
+        expiring.set(key, {"posts": []}, 0.05, None, BODY)
+    time.sleep(0.06)
+    started = time.perf_counter()
+    expiring.set("next", {"posts": []}, 60, None, BODY)
+    print(
+        f"{'set sweeping 10k expired entries':<40} "
+        f"{(time.perf_counter() - started) * 1e6:8.2f} us "
+        f"({expiring.stats.expirations} expired)"
+    )
+
+
+def responses() -> list[bytes]:
+    bodies = [json.dumps(fixtures.boards()).encode()]
+    bodies += [json.dumps(fixtures.catalog(seed=seed)).encode() for seed in range(5)]
+    for index, posts in enumerate((5, 20, 50, 150, 300, 1500)):
+        bodies.append(json.dumps(fixtures.thread(posts, seed=index)).encode())
+    # A board-browsing mix: mostly small and medium threads
+    return [bodies[i % len(bodies)] for i in range(200)]
+
+
+def memory(label: str, cache: ResponseCache, mix: list[bytes]) -> None:
+    tracemalloc.start()
+    for index, body in enumerate(mix):
+        # Decoded as the client does; only what the cache keeps stays allocated
+        cache.set(f"key{index}", json.loads(body), 60, None, body)
+    measured, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<28} estimate {cache.stats.bytes / 2**20:6.1f} MiB, "
+        f"tracemalloc {measured / 2**20:6.1f} MiB"
+    )
+
+
+def compressed_lookups() -> None:
+    cache = CompressedCache(decoded_bytes=0)
+    for label, data in (
+        ("catalog 150", fixtures.catalog()),
+        ("thread 300", fixtures.thread(300)),
+        ("thread 1500", fixtures.thread(1500)),
+    ):
+        body = json.dumps(data).encode()
+        # Nothing holds the entries handed out, so every lookup decodes
+        per_call(
+            f"compressed set {label}",
+            lambda label=label, data=data, body=body: cache.set(
+                label, data, 60, None, body
+            ),
+            20,
+        )
+        per_call(
+            f"compressed cold get_entry {label}",
+            lambda label=label: cache.get_entry(label),
+            20,
+        )
+
+
+def main() -> None:
+    timing()
+    mix = responses()
+    print(f"{len(mix)} responses, {sum(map(len, mix)) / 2**20:.1f} MiB on the wire:")
+    memory("decoded (TTLCache)", TTLCache(max_bytes=1 << 40), mix)
+    memory(
+        "compressed, no decoded tier",
+        CompressedCache(max_bytes=1 << 40, decoded_bytes=0),
+        mix,
+    )
+    compressed_lookups()
+
+
+if __name__ == "__main__":
+    main()
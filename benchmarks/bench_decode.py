@@ -0,0 +1,71 @@
+"""Catalog/thread decode cost: strict pydantic models vs the lean dict path.
+
+Payloads are the catalog and threads from fixtures.py.
+
+Run with ``uv run python benchmarks/bench_decode.py``.
+"""
+
+import timeit
+import tracemalloc
+from collections.abc import Callable
+
+import fixtures
+
+from imageboard_explorer.clients.chan_api import CacheEntry
+from imageboard_explorer.models import CatalogThread, decode
+from imageboard_explorer.text import parse_comment
+from imageboard_explorer.threads import ThreadState, build_catalog_payload
+
+
+def measure(name: str, func: Callable[[], object]) -> None:
+    def cold() -> object:
+        # Comments parsed by the previous run would otherwise be memoized
+        parse_comment.cache_clear()
+        return func()
+
+    best = min(timeit.repeat(cold, number=5, repeat=5)) / 5
+    tracemalloc.start()
+    cold()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>22}: {best * 1000:7.2f} ms  peak {peak / 1024:8.1f} KiB")
+
+
+def main() -> None:
+    catalog = fixtures.catalog()
+    thread = fixtures.thread()
+    for strict in (True, False):
+        mode = "strict" if strict else "lean"
+        measure(
+            f"catalog 150 ({mode})",
+            lambda strict=strict: [
+                build_catalog_payload("a", decode(CatalogThread, item, strict))
+                for page in catalog
+                for item in page["threads"]
+            ],
+        )
+        measure(
+            f"thread 300 ({mode})",
+            lambda strict=strict: ThreadState("a", 1, strict=strict).ingest(
+                CacheEntry(thread, 0.0, None)
+            ),
+        )
+    # post_view / post_image: one post out of a big thread
+    big = CacheEntry(fixtures.thread(1500), 0.0, None)
+    middle = big.data["posts"][750]["no"]
+    measure(
+        "thread 1500 (ingest)",
+        lambda: ThreadState("a", 1).ingest(big),
+    )
+    measure(
+        "post of 1500",
+        lambda: ThreadState("a", 1).post(big, middle),
+    )
+    measure(
+        "image of 1500",
+        lambda: ThreadState("a", 1).post(big, middle, replies=False),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Search index build time, memory and query latency at 100k posts.
+
+10 boards x 100 threads x 100 posts, each thread generated by fixtures.py like
+the other benchmarks' payloads. Memory is reported both as the index's own
+estimate (what the budget is enforced against) and as measured by tracemalloc.
+
+Run with ``uv run python benchmarks/bench_search.py``.
+"""
+
+import random
+import statistics
+import time
+import tracemalloc
+
+import fixtures
+
+from imageboard_explorer.clients.chan_api import CacheEntry
+from imageboard_explorer.search import SearchIndex
+
+BOARDS = [fixtures.board_name(index) for index in range(10)]
+THREADS_PER_BOARD = 100
+POSTS_PER_THREAD = 100
+
+
+def synthetic_boards() -> dict[str, CacheEntry]:
+    """``{url: entry}`` for every thread of every board."""
+    entries = {}
+    for board_index, board in enumerate(BOARDS):
+        for index in range(THREADS_PER_BOARD):
+            thread_id = fixtures.FIRST_POST + index * fixtures.THREAD_SPACING
+            data = fixtures.thread(
+                POSTS_PER_THREAD,
+                seed=board_index * THREADS_PER_BOARD + index,
+                first=thread_id,
+            )
+            url = f"https://a.4cdn.org/{board}/thread/{thread_id}.json"
+            entries[url] = CacheEntry(data, 0.0, None)
+    return entries
+
+
+def time_queries(index: SearchIndex, query: str, **kwargs: object) -> None:
+    samples = []
+    for _ in range(50):
+        started = time.perf_counter()
+        hits = index.search(query, **kwargs)
+        samples.append(time.perf_counter() - started)
+    print(
+        f"{query!r:>24}{' ' + str(kwargs) if kwargs else '':<18}"
+        f" median {statistics.median(samples) * 1000:6.3f} ms"
+        f"  max {max(samples) * 1000:6.3f} ms  hits {len(hits)}"
+    )
+
+
+def main() -> None:
+    entries = synthetic_boards()
+    posts = sum(len(entry.data["posts"]) for entry in entries.values())
+
+    index = SearchIndex(max_bytes=1 << 40)
+    started = time.perf_counter()
+    for url, entry in entries.items():
+        index.update(url, entry)
+    elapsed = time.perf_counter() - started
+    print(
+        f"indexed {posts} posts in {elapsed:.2f} s "
+        f"({posts / elapsed:,.0f} posts/s), {index.term_count} terms"
+    )
+
+    tracemalloc.start()
+    measured_index = SearchIndex(max_bytes=1 << 40)
+    for url, entry in entries.items():
+        measured_index.update(url, entry)
+    measured, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured_index
+    print(
+        f"memory: estimate {index.total_bytes / 2**20:.1f} MiB, "
+        f"tracemalloc {measured / 2**20:.1f} MiB"
+    )
+
+    time_queries(index, "anon")
+    time_queries(index, "synthetic")
+    time_queries(index, "anon keyboard")
+    time_queries(index, "linux arch install")
+    time_queries(index, "anon", board=BOARDS[3])
+    time_queries(index, str(fixtures.FIRST_POST + 42))
+
+    # A thread refetched with five new posts: only those are tokenized
+    url, entry = next(iter(entries.items()))
+    grown = [dict(post) for post in entry.data["posts"]]
+    last = grown[-1]["no"]
+    rng = random.Random(0)
+    grown += [fixtures.make_post(rng, last + n, n, [last]) for n in range(1, 6)]
+    before = index.stats.indexed_posts
+    started = time.perf_counter()
+    index.update(url, CacheEntry({"posts": grown}, 0.0, None))
+    print(
+        f"incremental update: {(time.perf_counter() - started) * 1000:.2f} ms, "
+        f"{index.stats.indexed_posts - before} posts tokenized"
+    )
+
+    budget = 16 * 2**20
+    bounded = SearchIndex(max_bytes=budget)
+    for url, entry in entries.items():
+        bounded.update(url, entry)
+    print(
+        f"16 MiB budget: {bounded.document_count} posts kept, "
+        f"{bounded.stats.evicted_sources} threads evicted"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Thread page TTFB and peak memory: buffered TemplateResponse vs streaming.
+
+Drives the real route through a raw ASGI call so the time to the first body
+chunk is measured the way a server would see it. Threads are warm (already
+ingested), so the numbers isolate rendering and sending.
+
+Run with ``uv run python benchmarks/bench_stream.py``.
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+import fixtures
+import httpx
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import ChanAPIClient, RequestScheduler
+
+
+async def request_page(path: str) -> tuple[float, float, int]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8000),
+    }
+    first_byte_at = None
+    size = 0
+
+    requested = False
+
+    async def receive() -> dict:
+        nonlocal requested
+        if requested:
+            # Streaming responses listen for a disconnect that never comes
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        nonlocal first_byte_at, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            if first_byte_at is None:
+                first_byte_at = time.perf_counter()
+            size += len(message["body"])
+
+    started = time.perf_counter()
+    await main.app(scope, receive, send)
+    finished = time.perf_counter()
+    assert first_byte_at is not None
+    return first_byte_at - started, finished - started, size
+
+
+async def measure(posts: int, stream: bool, repeat: int = 10) -> None:
+    main.settings.stream_min_posts = 1 if stream else 0
+    path = f"/board/a/thread/{posts}"
+    await request_page(path)  # warm the thread state
+    timings = [await request_page(path) for _ in range(repeat)]
+    ttfb = min(t[0] for t in timings)
+    total = min(t[1] for t in timings)
+    tracemalloc.start()
+    await request_page(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mode = "stream" if stream else "buffered"
+    print(
+        f"{posts:>5} posts {mode:>8}: ttfb {ttfb * 1000:6.2f} ms  "
+        f"total {total * 1000:6.2f} ms  peak {peak / 1024:8.1f} KiB  "
+        f"body {timings[0][2] / 1024:7.1f} KiB"
+    )
+
+
+async def run() -> None:
+    threads = {posts: fixtures.thread(posts) for posts in (300, 500, 1500)}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posts = int(request.url.path.rsplit("/", 1)[1].removesuffix(".json"))
+        return httpx.Response(200, json=threads[posts])
+
+    main.client = ChanAPIClient(
+        transport=httpx.MockTransport(handler),
+        scheduler=RequestScheduler(interval_seconds=0),
+    )
+    main.thread_index = None
+    main.prefetcher = None
+    # Time rendering, not bodies the page cache already holds
+    main.page_cache = None
+    try:
+        for posts in threads:
+            for stream in (False, True):
+                await measure(posts, stream)
+    finally:
+        await main.client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
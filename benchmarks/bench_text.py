@@ -0,0 +1,47 @@
+"""Per-post cost of the chained text helpers vs the single-pass parse_comment.
+
+Comments are those of a 300-post thread from fixtures.py.
+
+Run with ``uv run python benchmarks/bench_text.py``.
+"""
+
+import timeit
+
+import fixtures
+
+from imageboard_explorer.text import (
+    extract_all_quotes,
+    extract_quotes,
+    html_to_text,
+    parse_comment,
+    strip_header_quotes,
+    text_to_html,
+)
+
+
+def chained(raw: str) -> None:
+    # What the thread route did per post before parse_comment existed
+    comment_text = html_to_text(raw)
+    extract_all_quotes(comment_text)
+    comment_text = html_to_text(raw)
+    extract_quotes(comment_text)
+    text_to_html(strip_header_quotes(comment_text))
+
+
+def single_pass(raw: str) -> None:
+    # Past the memo, which would otherwise answer every repeat
+    parse_comment.__wrapped__(raw)
+
+
+def main() -> None:
+    comments = [post["com"] for post in fixtures.thread(300)["posts"]]
+    for name, func in (("chained", chained), ("parse_comment", single_pass)):
+        best = min(
+            timeit.repeat(lambda f=func: [f(c) for c in comments], number=20, repeat=5)
+        )
+        per_post_us = best / (20 * len(comments)) * 1e6
+        print(f"{name:>14}: {per_post_us:7.2f} us/post")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Local stand-in for the 4chan read-only API, for load tests.
+
+Serves generated ``boards.json``, catalogs, ``threads.json`` and threads
+built from fixtures.py, with ``Last-Modified`` headers and 304 answers to a
+matching ``If-Modified-Since``. ``--latency`` delays every response and
+``--mutate`` appends a reply to a random thread every so often, bumping it
+and its board the way new posts do upstream. ``/_stats`` returns the
+request counts by kind and status.
+
+    uv run python benchmarks/fake_upstream.py --port 8100 --latency 0.05
+
+then start the app against it with
+``IMAGEBOARD_EXPLORER_UPSTREAM_URL=http://127.0.0.1:8100``.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from email.utils import formatdate, parsedate_to_datetime
+
+import fixtures
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+THREAD_SIZES = (50, 300, 1500)
+
+
+class _Resource:
+    """A JSON document with its Last-Modified, encoded once per change."""
+
+    def __init__(self, data: object, modified: int) -> None:
+        self.data = data
+        self.modified = modified
+        self._body: bytes | None = None
+
+    def changed(self, modified: int) -> None:
+        self.modified = modified
+        self._body = None
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = json.dumps(self.data, separators=(",", ":")).encode()
+        return self._body
+
+
+class FakeChan:
+    def __init__(
+        self,
+        boards: int = 3,
+        threads: int = 150,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        mutate_seconds: float = 0.0,
+        seed: int = 1,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.mutate_seconds = mutate_seconds
+        self.requests: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+        now = int(time.time())
+        self._boards = _Resource(fixtures.boards(boards), now)
+        self._catalogs: dict[str, _Resource] = {}
+        self._threads: dict[tuple[str, int], _Resource] = {}
+        for index, board in enumerate(fixtures.board_name(i) for i in range(boards)):
+            pages = fixtures.catalog(threads, seed=index + 1)
+            for position, item in enumerate(
+                item for page in pages for item in page["threads"]
+            ):
+                # Sizes cycle so every board has small, medium and huge threads
+                size = THREAD_SIZES[position % len(THREAD_SIZES)]
+                item.update(replies=size - 1, images=size // 3, last_modified=now)
+            self._catalogs[board] = _Resource(pages, now)
+
+    def _thread(self, board: str, no: int) -> _Resource | None:
+        resource = self._threads.get((board, no))
+        if resource is not None:
+            return resource
+        catalog = self._catalogs.get(board)
+        item = catalog and next(
+            (
+                item
+                for page in catalog.data
+                for item in page["threads"]
+                if item["no"] == no
+            ),
+            None,
+        )
+        if item is None:
+            return None
+        # Generated on first request, sized to what the catalog claims
+        data = fixtures.thread(item["replies"] + 1, seed=no, first=no)
+        resource = self._threads[(board, no)] = _Resource(data, item["last_modified"])
+        return resource
+
+    def _threads_index(self, board: str) -> _Resource:
+        catalog = self._catalogs[board]
+        return _Resource(
+            [
+                {
+                    "page": page["page"],
+                    "threads": [
+                        {
+                            "no": item["no"],
+                            "last_modified": item["last_modified"],
+                            "replies": item["replies"],
+                        }
+                        for item in page["threads"]
+                    ],
+                }
+                for page in catalog.data
+            ],
+            catalog.modified,
+        )
+
+    def mutate(self) -> None:
+        """Append a reply to a random thread and bump it to the front."""
+        board = self._rng.choice(list(self._catalogs))
+        catalog = self._catalogs[board]
+        items = [item for page in catalog.data for item in page["threads"]]
+        item = self._rng.choice(items[: max(1, len(items) // 3)])
+        now = int(time.time())
+        thread = self._thread(board, item["no"])
+        assert thread is not None
+        posts = thread.data["posts"]
+        posts.append(
+            fixtures.make_post(
+                self._rng,
+                posts[-1]["no"] + 1,
+                len(posts),
+                [post["no"] for post in posts[-20:]],
+            )
+        )
+        thread.changed(now)
+        item.update(replies=item["replies"] + 1, last_modified=now)
+        items.remove(item)
+        items.insert(0, item)
+        per_page = len(catalog.data[0]["threads"])
+        for page_index, page in enumerate(catalog.data):
+            page["threads"] = items[page_index * per_page : (page_index + 1) * per_page]
+        catalog.changed(now)
+
+    async def respond(self, request: Request) -> Response:
+        path = request.url.path
+        parts = path.strip("/").removesuffix(".json").split("/")
+        resource = None
+        kind = "other"
+        if parts == ["boards"]:
+            kind, resource = "boards", self._boards
+        elif len(parts) == 2 and parts[0] in self._catalogs:
+            kind = parts[1]
+            if parts[1] == "catalog":
+                resource = self._catalogs[parts[0]]
+            elif parts[1] == "threads":
+                resource = self._threads_index(parts[0])
+        elif len(parts) == 3 and parts[1] == "thread" and parts[2].isdigit():
+            kind = "thread"
+            resource = self._thread(parts[0], int(parts[2]))
+
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if resource is None:
+            self.requests[f"{kind} 404"] += 1
+            return Response(status_code=404)
+        headers = {"last-modified": formatdate(resource.modified, usegmt=True)}
+        since = request.headers.get("if-modified-since")
+        if since is not None:
+            with contextlib.suppress(ValueError):
+                if resource.modified <= parsedate_to_datetime(since).timestamp():
+                    self.requests[f"{kind} 304"] += 1
+                    return Response(status_code=304, headers=headers)
+        self.requests[f"{kind} 200"] += 1
+        return Response(resource.body, media_type="application/json", headers=headers)
+
+    async def stats(self, _request: Request) -> JSONResponse:
+        return JSONResponse(
+            {"requests": dict(self.requests), "total": sum(self.requests.values())}
+        )
+
+    async def _mutate_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.mutate_seconds)
+            self.mutate()
+
+    def app(self) -> Starlette:
+        @contextlib.asynccontextmanager
+        async def lifespan(_app: Starlette) -> AsyncIterator[None]:
+            task = None
+            if self.mutate_seconds > 0:
+                task = asyncio.create_task(self._mutate_forever())
+            yield
+            if task is not None:
+                task.cancel()
+
+        return Starlette(
+            routes=[
+                Route("/_stats", self.stats),
+                Route("/{path:path}", self.respond),
+            ],
+            lifespan=lifespan,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--boards", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=150, help="Threads per board")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random extra latency, up to this"
+    )
+    parser.add_argument(
+        "--mutate",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Add a reply to a random thread this often (default: never)",
+    )
+    args = parser.parse_args()
+    fake = FakeChan(
+        args.boards,
+        args.threads,
+        latency=args.latency,
+        jitter=args.jitter,
+        mutate_seconds=args.mutate,
+    )
+    uvicorn.run(fake.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Deterministic synthetic 4chan API payloads for the benchmarks.
+
+Comments mix what real posts carry: quotelinks to earlier posts, inline and
+greentext quotes, cross-thread links and long URLs broken up with ``<wbr>``.
+The same seed always produces the same payload.
+"""
+
+import random
+
+FIRST_POST = 10**8
+# Gap between catalog thread numbers, room for each thread's own posts
+THREAD_SPACING = 10_000
+_WORDS = [
+    "lorem",
+    "ipsum",
+    "dolor",
+    "sit",
+    "amet",
+    "anon",
+    "thread",
+    "based",
+    "image",
+    "source",
+    "sauce",
+    "bump",
+    "kek",
+    "desktop",
+    "keyboard",
+    "linux",
+    "arch",
+    "install",
+    "window",
+    "manager",
+    "theme",
+]
+
+
+def _line(rng: random.Random, earlier: list[int]) -> str:
+    line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 16)))
+    roll = rng.random()
+    if roll < 0.2:
+        return f'<span class="quote">&gt;{line}</span>'
+    if roll < 0.35:
+        return (
+            f"{line} https://example.com/some/very/long/pa<wbr>th/to/a/page?a=1&amp;b=2"
+        )
+    if roll < 0.45 and earlier:
+        no = rng.choice(earlier)
+        return f'{line} <a href="#p{no}" class="quotelink">&gt;&gt;{no}</a>'
+    if roll < 0.5:
+        return f'<a href="/g/thread/{FIRST_POST + 7}#p{FIRST_POST + 9}" class="quotelink">&gt;&gt;&gt;/g/{FIRST_POST + 9}</a> {line}'
+    return line
+
+
+def comment(rng: random.Random, earlier: list[int]) -> str:
+    header = [
+        f'<a href="#p{no}" class="quotelink">&gt;&gt;{no}</a>'
+        for no in rng.sample(earlier, min(len(earlier), rng.choice((0, 0, 1, 1, 2))))
+    ]
+    body = [_line(rng, earlier) for _ in range(rng.randint(1, 6))]
+    return "<br>".join(header + body)
+
+
+def make_post(rng: random.Random, no: int, index: int, earlier: list[int]) -> dict:
+    post = {
+        "no": no,
+        "now": "01/01/24(Mon)00:00:00",
+        "time": 1704067200 + index,
+        "name": "Anonymous",
+        "com": comment(rng, earlier),
+    }
+    if index % 3 == 0:
+        post.update(
+            tim=1704067200000 + index,
+            ext=rng.choice((".jpg", ".png", ".webm")),
+            filename=rng.choice(_WORDS),
+            fsize=rng.randint(10_000, 4_000_000),
+            w=1024,
+            h=768,
+        )
+    if index % 11 == 0:
+        post.update(country="US", country_name="United States")
+    return post
+
+
+def thread(posts: int = 300, seed: int = 1, first: int = FIRST_POST) -> dict:
+    rng = random.Random(seed)
+    items = []
+    earlier: list[int] = []
+    for index in range(posts):
+        no = first + index
+        post = make_post(rng, no, index, earlier[-50:])
+        post["resto"] = 0 if not index else first
+        if not index:
+            post.update(sub="Synthetic thread", replies=posts - 1, images=posts // 3)
+        items.append(post)
+        earlier.append(no)
+    return {"posts": items}
+
+
+def catalog(threads: int = 150, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    items = []
+    for index in range(threads):
+        item = make_post(rng, FIRST_POST + index * THREAD_SPACING, index * 3, [])
+        if index % 2:
+            item["sub"] = f"Thread {index}"
+        item.update(
+            replies=rng.randint(0, 300),
+            images=rng.randint(0, 150),
+            last_modified=1704067200 + rng.randint(0, 86400),
+        )
+        if index < 2:
+            item["sticky"] = 1
+        items.append(item)
+    return [
+        {"page": page + 1, "threads": items[page * 15 : page * 15 + 15]}
+        for page in range((threads + 14) // 15)
+    ]
+
+
+def board_name(index: int) -> str:
+    """``a`` ... ``z``, ``aa`` ... ``zz``, ...: valid board names for the routes."""
+    return chr(ord("a") + index % 26) * (index // 26 + 1)
+
+
+def boards(count: int = 70) -> dict:
+    return {
+        "boards": [
+            {
+                "board": board_name(index),
+                "title": f"Board {index}",
+                "ws_board": index % 2,
+                "meta_description": f"&quot;/{board_name(index)}/&quot; is a synthetic board",
+            }
+            for index in range(count)
+        ]
+    }
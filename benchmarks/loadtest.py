@@ -0,0 +1,311 @@
+"""End-to-end load test of the app against the local fake upstream.
+
+Starts fake_upstream.py and the app (pointed at it through
+``IMAGEBOARD_EXPLORER_UPSTREAM_URL``) as subprocesses, then drives each
+scenario with ``--concurrency`` clients for ``--duration`` seconds after a
+warm-up, and reports requests per second, latency percentiles and a
+histogram, and how many requests reached the upstream. Nothing touches the
+real API.
+
+    uv run python benchmarks/loadtest.py
+    uv run python benchmarks/loadtest.py --latency 0.1 --mutate 0.5 thread post
+    uv run python benchmarks/loadtest.py -- --stream-threads 300 --workers 2
+
+Arguments after ``--`` are passed to ``imageboard-explorer``. Requests
+against threads and posts follow a Zipf-like popularity over ``--hot``
+threads per board. The load generator shares the machine with the app, so
+very high request rates are bounded by the client as well.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+
+import httpx
+
+SCENARIOS = ("home", "catalog", "thread", "post", "image", "mixed")
+HISTOGRAM_MS = (5, 10, 25, 50, 100, 250, 500, 1000)
+_HERE = Path(__file__).parent
+
+
+def _spawn(
+    args: list[str], env: dict[str, str] | None = None, *, verbose: bool = False
+) -> subprocess.Popen:
+    output = None if verbose else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, *args],
+        env={**os.environ, **(env or {})},
+        stdout=output,
+        stderr=output,
+    )
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            with contextlib.suppress(httpx.TransportError):
+                await client.get(url)
+                return
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            await asyncio.sleep(0.1)
+
+
+class Targets:
+    """URLs for each scenario, drawn from the fake upstream's catalogs."""
+
+    def __init__(self, catalogs: dict[str, list[dict]], hot: int, seed: int) -> None:
+        self._rng = random.Random(seed)
+        self.boards = list(catalogs)
+        self.threads = []
+        for board, pages in catalogs.items():
+            items = [item for page in pages for item in page["threads"]]
+            self.threads += [(board, item) for item in items[:hot]]
+        self._weights = [1 / (rank + 1) for rank in range(len(self.threads))]
+        self._rng.shuffle(self.threads)
+
+    def _thread(self) -> tuple[str, dict]:
+        return self._rng.choices(self.threads, self._weights)[0]
+
+    def home(self) -> str:
+        return "/"
+
+    def catalog(self) -> str:
+        return f"/board/{self._rng.choice(self.boards)}/catalog"
+
+    def thread(self) -> str:
+        board, item = self._thread()
+        return f"/board/{board}/thread/{item['no']}"
+
+    def post(self) -> str:
+        board, item = self._thread()
+        no = item["no"] + self._rng.randrange(item["replies"] + 1)
+        return f"/board/{board}/thread/{item['no']}/post/{no}"
+
+    def image(self) -> str:
+        # Every third post of a fixture thread has a file
+        board, item = self._thread()
+        no = item["no"] + 3 * self._rng.randrange(item["replies"] // 3 + 1)
+        return f"/board/{board}/thread/{item['no']}/post/{no}/image"
+
+    def mixed(self) -> str:
+        pick = self._rng.choices(
+            (self.home, self.catalog, self.thread, self.post, self.image),
+            (1, 4, 10, 3, 2),
+        )[0]
+        return pick()
+
+
+async def _drive(
+    app_url: str, pick: Callable[[], str], concurrency: int, seconds: float
+) -> tuple[list[float], Counter[int]]:
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while time.monotonic() < deadline:
+            url = pick()
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    async with httpx.AsyncClient(
+        base_url=app_url, limits=limits, timeout=60, headers={"accept-encoding": "gzip"}
+    ) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(
+    name: str,
+    latencies: list[float],
+    statuses: Counter[int],
+    seconds: float,
+    upstream: dict[str, int],
+) -> dict:
+    ordered = sorted(latencies)
+    buckets = Counter()
+    for latency in ordered:
+        ms = latency * 1000
+        bucket = next((f"<={edge}ms" for edge in HISTOGRAM_MS if ms <= edge), ">1s")
+        buckets[bucket] += 1
+    return {
+        "scenario": name,
+        "requests": len(ordered),
+        "rps": len(ordered) / seconds,
+        "p50_ms": _percentile(ordered, 0.5) * 1000,
+        "p90_ms": _percentile(ordered, 0.9) * 1000,
+        "p99_ms": _percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "histogram": dict(buckets),
+        "upstream": upstream,
+    }
+
+
+def print_result(result: dict) -> None:
+    errors = sum(
+        count for status, count in result["statuses"].items() if status[0] != "2"
+    )
+    print(
+        f"{result['scenario']:<8} {result['requests']:>7} req "
+        f"{result['rps']:>8.1f} rps  p50 {result['p50_ms']:7.1f} ms  "
+        f"p90 {result['p90_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+        f"max {result['max_ms']:7.1f} ms  errors {errors}"
+    )
+    histogram = result["histogram"]
+    print(
+        "         "
+        + "  ".join(
+            f"{label} {histogram.get(label, 0)}"
+            for label in [*(f"<={edge}ms" for edge in HISTOGRAM_MS), ">1s"]
+        )
+    )
+    upstream = ", ".join(
+        f"{kind} {n}" for kind, n in sorted(result["upstream"].items())
+    )
+    print(f"         upstream: {upstream or 'none'}")
+
+
+def _delta(before: dict[str, int], after: dict[str, int]) -> dict[str, int]:
+    return {
+        kind: count - before.get(kind, 0)
+        for kind, count in after.items()
+        if count != before.get(kind, 0)
+    }
+
+
+async def run(args: argparse.Namespace, app_args: list[str]) -> list[dict]:
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    processes = [
+        _spawn(
+            [
+                str(_HERE / "fake_upstream.py"),
+                f"--port={args.upstream_port}",
+                f"--boards={args.boards}",
+                f"--latency={args.latency}",
+                f"--jitter={args.jitter}",
+                f"--mutate={args.mutate}",
+            ],
+            verbose=args.verbose,
+        ),
+        _spawn(
+            [
+                "-m",
+                "imageboard_explorer.main",
+                f"--port={args.app_port}",
+                *app_args,
+            ],
+            {"IMAGEBOARD_EXPLORER_UPSTREAM_URL": upstream_url},
+            verbose=args.verbose,
+        ),
+    ]
+    try:
+        await _wait_ready(f"{upstream_url}/_stats")
+        await _wait_ready(f"{app_url}/static/css/app.css")
+        async with httpx.AsyncClient(base_url=upstream_url) as client:
+            boards = (await client.get("/boards.json")).json()["boards"]
+            catalogs = {
+                board["board"]: (
+                    await client.get(f"/{board['board']}/catalog.json")
+                ).json()
+                for board in boards
+            }
+            targets = Targets(catalogs, args.hot, args.seed)
+
+            async def upstream_counts() -> dict[str, int]:
+                return (await client.get("/_stats")).json()["requests"]
+
+            results = []
+            for name in args.scenarios:
+                pick = getattr(targets, name)
+                await _drive(app_url, pick, args.concurrency, args.warmup)
+                before = await upstream_counts()
+                latencies, statuses = await _drive(
+                    app_url, pick, args.concurrency, args.duration
+                )
+                result = summarize(
+                    name,
+                    latencies,
+                    statuses,
+                    args.duration,
+                    _delta(before, await upstream_counts()),
+                )
+                print_result(result)
+                results.append(result)
+            return results
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    app_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, app_args = argv[:split], argv[split + 1 :]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        default=list(SCENARIOS),
+        help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each")
+    parser.add_argument(
+        "--warmup", type=float, default=2.0, help="Unmeasured seconds before each"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--boards", type=int, default=3)
+    parser.add_argument(
+        "--hot", type=int, default=20, help="Threads per board that get traffic"
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--mutate", type=float, default=0.0, metavar="SECONDS")
+    parser.add_argument("--upstream-port", type=int, default=8100)
+    parser.add_argument("--app-port", type=int, default=8101)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="Also write the results here")
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the servers' own output"
+    )
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    results = asyncio.run(run(args, app_args))
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
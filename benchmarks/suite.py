@@ -0,0 +1,350 @@
+"""Microbenchmarks for the parse/render hot path, with saved baselines.
+
+Every case runs offline against the deterministic payloads in fixtures.py:
+a 150-thread catalog and threads of 50, 300 and 1500 posts. Each case is
+timed with ``timeit`` (auto-ranged, best of ``--repeat``) and reported per
+call.
+
+    uv run python benchmarks/suite.py                      # print results
+    uv run python benchmarks/suite.py --json base.json     # save them
+    uv run python benchmarks/suite.py --baseline base.json # compare, exit 1
+                                                           # on regressions
+    uv run python benchmarks/suite.py -k render            # matching cases only
+
+Baselines are only comparable on the same machine and Python version.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import timeit
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+import fixtures
+import httpx
+
+from imageboard_explorer import main as app
+from imageboard_explorer.clients.chan_api import (
+    CacheEntry,
+    ChanAPIClient,
+    RequestScheduler,
+    TTLCache,
+    entry_bytes,
+)
+from imageboard_explorer.models import CatalogThread, ThreadPost, decode
+from imageboard_explorer.search import SearchIndex
+from imageboard_explorer.text import html_to_text, parse_comment, text_to_html
+from imageboard_explorer.threads import ThreadState, build_post_payload
+
+THREAD_SIZES = (50, 300, 1500)
+BOARD = "g"
+
+
+def _upstream() -> ChanAPIClient:
+    payloads = {f"/{BOARD}/catalog.json": fixtures.catalog()}
+    payloads.update(
+        {f"/{BOARD}/thread/{size}.json": fixtures.thread(size) for size in THREAD_SIZES}
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=payloads[request.url.path])
+
+    return ChanAPIClient(
+        transport=httpx.MockTransport(handler),
+        scheduler=RequestScheduler(interval_seconds=0),
+    )
+
+
+def cold(func: Callable[[], object]) -> Callable[[], object]:
+    """``func`` run with the parse_comment memo empty, as a first view finds it."""
+
+    def run() -> object:
+        parse_comment.cache_clear()
+        return func()
+
+    return run
+
+
+def text_cases(comments: list[str]) -> dict[str, Callable[[], object]]:
+    texts = [html_to_text(raw) for raw in comments]
+    return {
+        "text/html_to_text x300": lambda: [html_to_text(raw) for raw in comments],
+        "text/text_to_html x300": lambda: [text_to_html(text) for text in texts],
+        "text/parse_comment x300": cold(
+            lambda: [parse_comment(raw) for raw in comments]
+        ),
+    }
+
+
+def thread_cases(
+    loop: asyncio.AbstractEventLoop, threads: dict[int, dict]
+) -> dict[str, Callable[[], object]]:
+    def load(size: int) -> list[dict]:
+        # Cached upstream response, cold thread state: the ingest a first view pays
+        app._thread_states.clear()
+        parse_comment.cache_clear()
+        return loop.run_until_complete(app._load_thread_posts(BOARD, size))
+
+    cases: dict[str, Callable[[], object]] = {
+        f"thread/_load_thread_posts {size}": lambda size=size: load(size)
+        for size in THREAD_SIZES
+    }
+    posts = threads[300]["posts"]
+    cases["thread/build_post_payload x300"] = cold(
+        lambda: [build_post_payload(BOARD, 300, post, []) for post in posts]
+    )
+    big = CacheEntry(threads[1500], 0.0, None)
+    middle = threads[1500]["posts"][750]["no"]
+    cases["thread/post of 1500"] = cold(
+        lambda: ThreadState(BOARD, 1500).post(big, middle)
+    )
+    return cases
+
+
+def model_cases(
+    catalog: list[dict], threads: dict[int, dict]
+) -> dict[str, Callable[[], object]]:
+    items = [item for page in catalog for item in page["threads"]]
+    posts = threads[300]["posts"]
+    cases = {}
+    for strict in (True, False):
+        mode = "strict" if strict else "lean"
+        cases[f"models/catalog 150 ({mode})"] = lambda strict=strict: [
+            decode(CatalogThread, item, strict) for item in items
+        ]
+        cases[f"models/thread 300 ({mode})"] = lambda strict=strict: [
+            decode(ThreadPost, post, strict) for post in posts
+        ]
+    return cases
+
+
+def cache_cases() -> dict[str, Callable[[], object]]:
+    keys = [f"https://a.4cdn.org/{BOARD}/thread/{no}.json" for no in range(1000)]
+    warm = TTLCache(max_size=len(keys), stale_grace_seconds=300)
+    for key in keys:
+        warm.set(key, {"posts": []}, 60, None)
+
+    def fill() -> None:
+        cache = TTLCache(stale_grace_seconds=300)
+        for key in keys:
+            cache.set(key, {"posts": []}, 60, None)
+
+    # 10k entries at the byte budget: every insert evicts one
+    body = b'{"posts":[]}'
+    full = TTLCache(max_bytes=10_000 * entry_bytes(None, body), stale_grace_seconds=300)
+    for no in range(10_000):
+        full.set(f"https://a.4cdn.org/{BOARD}/thread/{no}.json", {}, 60, None, body)
+
+    def churn() -> None:
+        for key in keys:
+            full.set(f"{key}#", {"posts": []}, 60, None, body)
+            full.set(key, {"posts": []}, 60, None, body)
+
+    return {
+        "cache/set x1000": fill,
+        "cache/set into 10k x2000": churn,
+        "cache/get_entry hit x1000": lambda: [warm.get_entry(key) for key in keys],
+        "cache/get_entry miss x1000": lambda: [
+            warm.get_entry(f"{key}?") for key in keys
+        ],
+    }
+
+
+def render_cases(
+    catalog: list[dict], threads: dict[int, dict]
+) -> dict[str, Callable[[], object]]:
+    def renderer(name: str, context: dict) -> Callable[[], str]:
+        template = app.templates.get_template(name)
+        context = {"fragment": False, "request": None, **context}
+        return lambda: template.render(context)
+
+    boards = [
+        {**board, "description": app._board_description(board)}
+        for board in fixtures.boards()["boards"]
+    ]
+    items = app._catalog_items(catalog)
+    catalog_payloads = app._catalog_payloads(BOARD, items)
+    states = {}
+    for size in THREAD_SIZES:
+        states[size] = ThreadState(BOARD, size)
+        states[size].ingest(CacheEntry(threads[size], 0.0, None))
+    post = next(post for post in states[300].posts if post["reply_from"])
+    image = next(post for post in states[300].posts if post["image_url"])
+    index = SearchIndex()
+    for size in THREAD_SIZES:
+        index.update(
+            f"https://a.4cdn.org/{BOARD}/thread/{size}.json",
+            CacheEntry(threads[size], 0.0, None),
+        )
+
+    cases = {
+        "render/home.html": renderer(
+            "home.html",
+            {
+                "screen": "home",
+                "boards": boards,
+                "selected": boards[0]["board"],
+                "selected_description": boards[0]["description"],
+            },
+        ),
+        "render/catalog.html 150": renderer(
+            "catalog.html",
+            {
+                "screen": "catalog",
+                "board": BOARD,
+                "threads": catalog_payloads,
+                "selected": items[0]["no"],
+            },
+        ),
+        "render/catalog_items.html 30": renderer(
+            "catalog_items.html",
+            {"board": BOARD, "threads": catalog_payloads[:30], "selected": None},
+        ),
+        "render/post_view.html": renderer(
+            "post_view.html", {"screen": "post", "board": BOARD, "post": post}
+        ),
+        "render/image_view.html": renderer(
+            "image_view.html",
+            {
+                "screen": "image",
+                "board": BOARD,
+                "image_url": image["image_url"],
+                "media_kind": image["media_kind"],
+                "file_name": image["file_name"],
+                "file_size": image["file_size"],
+            },
+        ),
+        "render/search.html 50": renderer(
+            "search.html",
+            {
+                "screen": "search",
+                "query": "linux",
+                "board": None,
+                "hits": index.search("linux"),
+                "indexed": index.document_count,
+            },
+        ),
+        "render/overview.html 3x5": renderer(
+            "overview.html",
+            {
+                "screen": "overview",
+                "sections": [
+                    {"board": board, "threads": catalog_payloads[:5]}
+                    for board in ("a", "g", "v")
+                ],
+                "selected": None,
+            },
+        ),
+    }
+    for size in THREAD_SIZES:
+        cases[f"render/thread.html {size}"] = renderer(
+            "thread.html",
+            {
+                "screen": "thread",
+                "board": BOARD,
+                "posts": states[size].posts,
+                "selected": states[size].posts[0]["no"],
+            },
+        )
+    return cases
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Best time per call in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """Print each case against the baseline; return the ones that regressed."""
+    regressions = []
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<36} {seconds * 1000:10.3f} ms  (new)")
+            continue
+        change = seconds / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<36} {seconds * 1000:10.3f} ms  "
+            f"was {before * 1000:10.3f} ms  {change:+7.1%}{flag}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    parser.add_argument(
+        "--baseline", type=Path, help="Compare against results saved with --json"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Slowdown that counts as a regression (default: 0.25 = 25%%)",
+    )
+    parser.add_argument("-k", dest="pattern", help="Only run cases containing this")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    catalog = fixtures.catalog()
+    threads = {size: fixtures.thread(size) for size in THREAD_SIZES}
+    comments = [post["com"] for post in threads[300]["posts"]]
+
+    loop = asyncio.new_event_loop()
+    app.client = _upstream()
+    app.thread_index = None
+    app.prefetcher = None
+    cases = {
+        **text_cases(comments),
+        **thread_cases(loop, threads),
+        **model_cases(catalog, threads),
+        **cache_cases(),
+        **render_cases(catalog, threads),
+    }
+    if args.pattern:
+        cases = {name: func for name, func in cases.items() if args.pattern in name}
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = measure(func, args.repeat)
+        if args.baseline is None:
+            print(f"{name:<36} {results[name] * 1000:10.3f} ms")
+    loop.run_until_complete(app.client.aclose())
+    loop.close()
+
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps(
+                {
+                    "created": datetime.now(UTC).isoformat(timespec="seconds"),
+                    "python": sys.version.split()[0],
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from .chan_api import CacheEntry, ChanAPIClient, Priority
+
+
+@dataclass
+class _BoardState:
+    interval: float
+    due_at: float
+    entry: CacheEntry | None = None
+
+
+@dataclass
+class RefresherStats:
+    refreshed: int = 0
+    # Refreshes that found a new catalog
+    changed: int = 0
+    failed: int = 0
+
+
+class CatalogRefresher:
+    """Keeps the catalogs of a fixed list of boards warm in the background.
+
+    A single task refreshes whichever board is due next, at prefetch priority
+    and never more than ``budget_per_minute`` times a minute, so the refreshes
+    are spread out and page loads keep the rest of the rate limit. A board's
+    interval halves each time its catalog has changed since the last refresh
+    and grows by half each time it has not, within ``min_seconds`` and
+    ``max_seconds``: busy boards settle on frequent refreshes, slow ones on
+    rare ones.
+    """
+
+    def __init__(
+        self,
+        client: ChanAPIClient,
+        boards: Sequence[str],
+        *,
+        budget_per_minute: float = 6.0,
+        min_seconds: float = 30.0,
+        max_seconds: float = 600.0,
+        ttl_seconds: float = 30.0,
+    ) -> None:
+        self._client = client
+        self._spacing = 60 / budget_per_minute
+        self._min = min_seconds
+        self._max = max_seconds
+        self._ttl = ttl_seconds
+        now = time.monotonic()
+        # Staggered first refreshes, one budget slot apart
+        self._boards = {
+            board: _BoardState(min_seconds, now + position * self._spacing)
+            for position, board in enumerate(dict.fromkeys(boards))
+        }
+        self._task: asyncio.Task[None] | None = None
+        self.stats = RefresherStats()
+
+    @property
+    def boards(self) -> list[str]:
+        return list(self._boards)
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    def latest(self, board: str) -> CacheEntry | None:
+        """The catalog from the last successful refresh of ``board``, if any."""
+        state = self._boards.get(board)
+        return state.entry if state is not None else None
+
+    def interval(self, board: str) -> float:
+        return self._boards[board].interval
+
+    async def refresh(self, board: str) -> None:
+        """Refresh ``board`` now and schedule its next refresh."""
+        state = self._boards[board]
+        path = f"/{board}/catalog.json"
+        cached = await self._client.peek(path)
+        try:
+            # A fresh copy (say from a page load) counts as a refresh; a stale
+            # one is revalidated rather than served
+            entry = await self._client.fetch_entry(
+                path,
+                ttl_seconds=self._ttl,
+                priority=Priority.PREFETCH,
+                must_revalidate=cached is not None and not cached.is_fresh(),
+            )
+        except Exception:
+            self.stats.failed += 1
+            self._reschedule(state, changed=False)
+            return
+        self.stats.refreshed += 1
+        previous = state.entry
+        state.entry = entry
+        if previous is None:
+            self._reschedule(state, changed=None)
+            return
+        changed = (
+            entry.data is not previous.data
+            if entry.last_modified is None
+            else entry.last_modified != previous.last_modified
+        )
+        self.stats.changed += changed
+        self._reschedule(state, changed=changed)
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, RuntimeError):
+            await self._task
+
+    def _reschedule(self, state: _BoardState, *, changed: bool | None) -> None:
+        if changed:
+            state.interval = max(self._min, state.interval / 2)
+        elif changed is not None:
+            state.interval = min(self._max, state.interval * 1.5)
+        state.due_at = time.monotonic() + state.interval
+
+    async def _run(self) -> None:
+        if not self._boards:
+            return
+        next_start = time.monotonic()
+        while True:
+            board, state = min(self._boards.items(), key=lambda item: item[1].due_at)
+            delay = max(state.due_at, next_start) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_start = time.monotonic() + self._spacing
+            await self.refresh(board)
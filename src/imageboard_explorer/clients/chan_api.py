@@ -1,12 +1,19 @@
 import asyncio
+import heapq
+import itertools
 import json
+import re
 import time
 from collections import OrderedDict
+from collections.abc import Callable
 from dataclasses import dataclass
-from typing import Any
+from enum import IntEnum
+from typing import Any, Protocol, runtime_checkable
 
 import httpx
 
+from imageboard_explorer.metrics import Histogram, add_phase, phase, untimed
+
 
 @dataclass
 class CacheEntry:
@@ -14,116 +21,620 @@ class CacheEntry:
     expires_at: float
     last_modified: str | None
 
+    def is_fresh(self, now: float | None = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        return self.expires_at > now
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Entries dropped for age or capacity
+    evictions: int = 0
+    # The part of ``evictions`` dropped for age
+    expirations: int = 0
+    # Lookups that had to decode a compressed body
+    decodes: int = 0
+    # What is held now, in entries and approximate bytes
+    entries: int = 0
+    bytes: int = 0
+
+
+class ResponseCache(Protocol):
+    """What ChanAPIClient needs from a cache backend."""
+
+    @property
+    def stats(self) -> CacheStats: ...
+
+    def get(self, key: str) -> Any | None: ...
+
+    # ``record_stats=False`` leaves hits and misses alone (e.g. for a peek)
+    def get_entry(
+        self, key: str, *, record_stats: bool = True
+    ) -> CacheEntry | None: ...
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry: ...
+
+    def refresh(self, key: str, ttl_seconds: float) -> None: ...
+
+
+@runtime_checkable
+class PersistentCache(ResponseCache, Protocol):
+    """A cache backed by a file, whose lookups and stores block on I/O.
+
+    ChanAPIClient awaits the ``a``-prefixed variants, which do that I/O off
+    the event loop, and closes the file with the client.
+    """
+
+    async def aget_entry(
+        self, key: str, *, record_stats: bool = True
+    ) -> CacheEntry | None: ...
+
+    async def aset(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry: ...
+
+    async def arefresh(self, key: str, ttl_seconds: float) -> None: ...
+
+    def close(self) -> None: ...
+
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Decoded JSON takes about twice its wire size (measured on catalogs and
+# threads), plus the entry, key and bookkeeping
+_DECODED_BYTES_PER_BYTE = 2.2
+_ENTRY_BYTES = 400
+
+
+def entry_bytes(data: Any, body: bytes | None) -> int:
+    """Approximate memory held by a decoded response."""
+    if body is None:
+        body = json.dumps(data, separators=(",", ":")).encode()
+    return int(len(body) * _DECODED_BYTES_PER_BYTE) + _ENTRY_BYTES
+
 
 class TTLCache:
-    def __init__(self, max_size: int = 100) -> None:
+    """LRU cache with per-entry TTLs, bounded by approximate bytes.
+
+    With ``stale_grace_seconds`` > 0 the cache runs in stale-while-revalidate
+    mode: expired entries are kept for the grace window so ``get_entry`` can
+    still hand them out (with their ``last_modified``) while the caller
+    revalidates them. ``get`` only ever returns fresh data. ``on_evict`` is
+    called with the key of every entry the cache drops.
+
+    Entries are sized by ``sizer`` (by default from their response body, see
+    ``entry_bytes``) and the
+    least recently used are dropped once the total passes ``max_bytes``;
+    ``max_size`` optionally caps the entry count as well. Entries past their
+    grace window are dropped from a heap ordered by that deadline, so a
+    ``set`` costs O(log n) rather than a scan of the cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int | None = None,
+        stale_grace_seconds: float = 0.0,
+        on_evict: Callable[[str], None] | None = None,
+        *,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+        sizer: Callable[[Any, bytes | None], int] = entry_bytes,
+    ) -> None:
         self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        # (expires_at + grace, key); refreshed entries leave stale items behind,
+        # which are skipped when they come up
+        self._deadlines: list[tuple[float, str]] = []
         self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._sizer = sizer
+        self._stale_grace = stale_grace_seconds
+        self._on_evict = on_evict
+        self.stats = CacheStats()
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self.stats.bytes -= self._sizes.pop(key)
+        self.stats.entries -= 1
+
+    def _evicted(self, key: str) -> None:
+        self.stats.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(key)
+
+    def _is_dead(self, entry: CacheEntry, now: float) -> bool:
+        return entry.expires_at + self._stale_grace <= now
+
+    def _schedule(self, key: str, entry: CacheEntry) -> None:
+        heapq.heappush(self._deadlines, (entry.expires_at + self._stale_grace, key))
+        if len(self._deadlines) > 2 * len(self._entries) + 64:
+            # Mostly stale items from refreshes: rebuild from the live entries
+            self._deadlines = [
+                (live.expires_at + self._stale_grace, live_key)
+                for live_key, live in self._entries.items()
+            ]
+            heapq.heapify(self._deadlines)
+
+    def _expire(self, now: float) -> None:
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            deadline, key = heapq.heappop(deadlines)
+            entry = self._entries.get(key)
+            # Skip items left behind by a refresh or a replaced entry
+            if entry is None or entry.expires_at + self._stale_grace != deadline:
+                continue
+            self._remove(key)
+            self.stats.expirations += 1
+            self._evicted(key)
 
     def get(self, key: str) -> Any | None:
-        entry = self._entries.get(key)
-        if not entry:
+        entry = self.get_entry(key)
+        if not entry or not entry.is_fresh():
             return None
-        if entry.expires_at <= time.monotonic():
-            del self._entries[key]
-            return None
-        # Move to end (most recently used)
-        self._entries.move_to_end(key)
         return entry.data
 
-    def get_entry(self, key: str) -> CacheEntry | None:
+    def get_entry(self, key: str, *, record_stats: bool = True) -> CacheEntry | None:
         entry = self._entries.get(key)
-        if entry and entry.expires_at <= time.monotonic():
-            del self._entries[key]
+        if entry is not None and self._is_dead(entry, time.monotonic()):
+            self._remove(key)
+            self.stats.expirations += 1
+            self._evicted(key)
+            entry = None
+        if entry is None:
+            if record_stats:
+                self.stats.misses += 1
             return None
-        if entry:
-            self._entries.move_to_end(key)
+        # Move to end (most recently used)
+        self._entries.move_to_end(key)
+        if record_stats:
+            self.stats.hits += 1
         return entry
 
     def set(
-        self, key: str, data: Any, ttl_seconds: float, last_modified: str | None
-    ) -> None:
-        # Evict expired entries first
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry:
         now = time.monotonic()
-        expired = [k for k, v in self._entries.items() if v.expires_at <= now]
-        for k in expired:
-            del self._entries[k]
-
-        # Evict oldest if at capacity
-        while len(self._entries) >= self._max_size:
-            self._entries.popitem(last=False)
-
-        self._entries[key] = CacheEntry(
+        entry = CacheEntry(
             data=data,
             expires_at=now + ttl_seconds,
             last_modified=last_modified,
         )
+        size = self._sizer(data, body)
+        replaced = key in self._entries
+        if replaced:
+            self._remove(key)
+        self._expire(now)
+        if size > self._max_bytes:
+            # Would push out everything else; hand it out without keeping it
+            if replaced:
+                self._evicted(key)
+            return entry
+
+        # Evict least recently used until it fits
+        while self._entries and (
+            self.stats.bytes + size > self._max_bytes
+            or (self._max_size is not None and len(self._entries) >= self._max_size)
+        ):
+            evicted = next(iter(self._entries))
+            self._remove(evicted)
+            self._evicted(evicted)
+
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.stats.bytes += size
+        self.stats.entries += 1
+        self._schedule(key, entry)
+        return entry
 
     def refresh(self, key: str, ttl_seconds: float) -> None:
         entry = self._entries.get(key)
         if entry:
             entry.expires_at = time.monotonic() + ttl_seconds
+            self._schedule(key, entry)
+
+
+class UpstreamLimiter(Protocol):
+    async def wait(self) -> None: ...
+
+    def close(self) -> None: ...
+
 
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    REVALIDATE = 1
+    PREFETCH = 2
 
-class RateLimiter:
-    def __init__(self, interval_seconds: float) -> None:
+
+@dataclass
+class _Ticket:
+    priority: Priority
+    future: asyncio.Future[None]
+    enqueued_at: float
+    key: str | None
+
+
+@dataclass
+class WaitStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class RequestScheduler:
+    """Hands out upstream request slots at a fixed rate, best priority first.
+
+    Nothing is reserved while waiting: the next slot goes to whichever live
+    request has the highest priority when it opens, so an interactive page
+    load never queues behind revalidations or prefetches. A cancelled waiter
+    simply drops out of the queue. ``shared`` adds a host-wide limiter that
+    every slot must also pass (see ``SQLiteRateLimiter``).
+    """
+
+    def __init__(
+        self, interval_seconds: float, shared: UpstreamLimiter | None = None
+    ) -> None:
         self._interval = interval_seconds
-        self._lock = asyncio.Lock()
-        self._last_request_at = 0.0
+        self._shared = shared
+        self._heap: list[tuple[int, int, _Ticket]] = []
+        self._seq = itertools.count()
+        self._by_key: dict[str, _Ticket] = {}
+        self._last_dispatch_at = 0.0
+        self._dispatcher: asyncio.Task[None] | None = None
+        self.wait_stats = {priority: WaitStats() for priority in Priority}
+        self.wait_seconds = Histogram()
+
+    async def wait(
+        self, priority: Priority = Priority.INTERACTIVE, key: str | None = None
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(priority, loop.create_future(), time.monotonic(), key)
+        self._push(ticket)
+        if key is not None:
+            self._by_key[key] = ticket
+        if (
+            self._dispatcher is None
+            or self._dispatcher.done()
+            or self._dispatcher.get_loop() is not loop
+        ):
+            self._dispatcher = loop.create_task(self._dispatch())
+        try:
+            await ticket.future
+        finally:
+            if key is not None and self._by_key.get(key) is ticket:
+                del self._by_key[key]
+
+    def close(self) -> None:
+        if self._shared is not None:
+            self._shared.close()
+
+    def promote(self, key: str, priority: Priority) -> None:
+        """Raise the priority of the queued request registered under ``key``."""
+        ticket = self._by_key.get(key)
+        if (
+            ticket is not None
+            and not ticket.future.done()
+            and priority < ticket.priority
+        ):
+            # The old heap entry goes stale and is skipped when popped
+            ticket.priority = priority
+            self._push(ticket)
+
+    def is_queued(self, key: str) -> bool:
+        ticket = self._by_key.get(key)
+        return ticket is not None and not ticket.future.done()
+
+    def queue_depth(self) -> dict[Priority, int]:
+        depth = dict.fromkeys(Priority, 0)
+        for priority, _, ticket in self._heap:
+            if self._is_live(priority, ticket):
+                depth[ticket.priority] += 1
+        return depth
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        depth = self.queue_depth()
+        return {
+            priority.name.lower(): {
+                "queued": depth[priority],
+                "dispatched": stats.count,
+                "wait_seconds_total": stats.total_seconds,
+                "wait_seconds_max": stats.max_seconds,
+            }
+            for priority, stats in self.wait_stats.items()
+        }
 
-    async def wait(self) -> None:
-        async with self._lock:
+    def _push(self, ticket: _Ticket) -> None:
+        heapq.heappush(self._heap, (ticket.priority, next(self._seq), ticket))
+
+    @staticmethod
+    def _is_live(priority: int, ticket: _Ticket) -> bool:
+        return priority == ticket.priority and not ticket.future.done()
+
+    def _peek(self) -> _Ticket | None:
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            priority, _, ticket = self._heap[0]
+            if self._is_live(priority, ticket) and ticket.future.get_loop() is loop:
+                return ticket
+            heapq.heappop(self._heap)
+        return None
+
+    async def _dispatch(self) -> None:
+        while self._peek() is not None:
+            delay = self._last_dispatch_at + self._interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._shared is not None and self._peek() is not None:
+                await self._shared.wait()
+            # Pick the winner only now: later arrivals may outrank earlier ones
+            ticket = self._peek()
+            if ticket is None:
+                break
+            heapq.heappop(self._heap)
             now = time.monotonic()
-            elapsed = now - self._last_request_at
-            if elapsed < self._interval:
-                await asyncio.sleep(self._interval - elapsed)
-            self._last_request_at = time.monotonic()
+            self._last_dispatch_at = now
+            waited = now - ticket.enqueued_at
+            self.wait_stats[ticket.priority].record(waited)
+            self.wait_seconds.observe(waited, ticket.priority.name.lower())
+            ticket.future.set_result(None)
+
+
+_ENDPOINT_RE = re.compile(r"/(boards|catalog|threads|archive|thread/\d+)\.json$")
+
+
+def endpoint_kind(url: str) -> str:
+    """``boards``, ``catalog``, ``threads``, ``archive``, ``thread`` or ``other``."""
+    match = _ENDPOINT_RE.search(url)
+    if match is None:
+        return "other"
+    return match.group(1).split("/")[0]
 
 
 class ChanAPIClient:
     def __init__(
-        self, base_url: str = "https://a.4cdn.org", timeout: float = 10.0
+        self,
+        base_url: str = "https://a.4cdn.org",
+        timeout: float = 10.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+        *,
+        stale_grace_seconds: float = 300.0,
+        cache: ResponseCache | None = None,
+        scheduler: RequestScheduler | None = None,
+        on_entry: Callable[[str, CacheEntry], None] | None = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
+        self._transport = transport
         self._client: httpx.AsyncClient | None = None
-        self._cache = TTLCache()
-        self._rate_limiter = RateLimiter(interval_seconds=1.0)
+        self._cache: ResponseCache = (
+            cache
+            if cache is not None
+            else TTLCache(stale_grace_seconds=stale_grace_seconds)
+        )
+        self._persistent = cache if isinstance(cache, PersistentCache) else None
+        self.scheduler = (
+            scheduler
+            if scheduler is not None
+            else RequestScheduler(interval_seconds=1.0)
+        )
+        # One shared upstream fetch per URL; concurrent cache misses await it
+        self._inflight: dict[str, asyncio.Task[CacheEntry]] = {}
+        self._waiters: dict[str, int] = {}
+        # Sees every entry handed out or stored (e.g. to index it)
+        self._on_entry = on_entry
+        self.stale_served = 0
+        # Upstream round trips by endpoint kind and status
+        self.upstream_seconds = Histogram()
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        return self._cache.stats
 
     async def start(self) -> None:
         if self._client is None:
-            self._client = httpx.AsyncClient(timeout=self.timeout)
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, transport=self._transport
+            )
 
     async def aclose(self) -> None:
+        """Stop in-flight fetches and close the HTTP client and any SQLite files."""
+        for task in list(self._inflight.values()):
+            task.cancel()
         if self._client is not None:
             await self._client.aclose()
             self._client = None
+        if self._persistent is not None:
+            await asyncio.to_thread(self._persistent.close)
+        await asyncio.to_thread(self.scheduler.close)
+
+    async def fetch_json(
+        self,
+        path: str,
+        ttl_seconds: float,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Any:
+        entry = await self.fetch_entry(path, ttl_seconds, priority)
+        return entry.data
+
+    async def fetch_entry(
+        self,
+        path: str,
+        ttl_seconds: float,
+        priority: Priority = Priority.INTERACTIVE,
+        *,
+        must_revalidate: bool = False,
+    ) -> CacheEntry:
+        """Like ``fetch_json`` but returns the cache entry with ``last_modified``.
 
-    async def fetch_json(self, path: str, ttl_seconds: float) -> Any:
+        ``must_revalidate`` skips the cached copy, fresh or stale, and waits
+        for a (conditional) upstream request, for callers that know it is
+        outdated.
+        """
         if self._client is None:
             await self.start()
         assert self._client is not None
         url = f"{self.base_url}{path}"
-        cached = self._cache.get(url)
-        if cached is not None:
-            return cached
+        entry = await self._get_entry(url)
+        if entry is not None and must_revalidate:
+            if entry.is_fresh():
+                # Keep it for If-Modified-Since, but never serve it as fresh
+                await self._refresh(url, 0)
+        elif entry is not None:
+            if not entry.is_fresh():
+                # Stale-while-revalidate: serve now, refresh in the background
+                self.stale_served += 1
+                self._start_fetch(
+                    url,
+                    ttl_seconds,
+                    max(priority, Priority.REVALIDATE),
+                    background=True,
+                )
+            if self._on_entry is not None:
+                self._on_entry(url, entry)
+            return entry
+
+        task = self._start_fetch(url, ttl_seconds, priority)
+        self._waiters[url] = self._waiters.get(url, 0) + 1
+        try:
+            # Shield so a disconnecting caller doesn't cancel the fetch for others
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[url] -= 1
+            if not self._waiters[url]:
+                del self._waiters[url]
+                if not task.done() and self.scheduler.is_queued(url):
+                    # Every caller went away before the request left the queue
+                    del self._inflight[url]
+                    task.cancel()
+
+    async def peek(self, path: str, *, record_stats: bool = False) -> CacheEntry | None:
+        """Return the cached entry for ``path``, fresh or stale, without fetching.
+
+        Peeks only inform background work and routing decisions, so by
+        default they leave the cache's hit and miss counts alone.
+        """
+        return await self._get_entry(
+            f"{self.base_url}{path}", record_stats=record_stats
+        )
+
+    async def mark_fresh(self, path: str, ttl_seconds: float) -> None:
+        """Extend a cached entry known to be current without asking upstream."""
+        await self._refresh(f"{self.base_url}{path}", ttl_seconds)
 
-        entry = self._cache.get_entry(url)
+    async def _get_entry(
+        self, url: str, *, record_stats: bool = True
+    ) -> CacheEntry | None:
+        if self._persistent is not None:
+            return await self._persistent.aget_entry(url, record_stats=record_stats)
+        return self._cache.get_entry(url, record_stats=record_stats)
+
+    async def _refresh(self, url: str, ttl_seconds: float) -> None:
+        if self._persistent is not None:
+            await self._persistent.arefresh(url, ttl_seconds)
+        else:
+            self._cache.refresh(url, ttl_seconds)
+
+    async def _set(
+        self, url: str, data: Any, ttl_seconds: float, response: httpx.Response
+    ) -> CacheEntry:
+        last_modified = response.headers.get("Last-Modified")
+        if self._persistent is not None:
+            return await self._persistent.aset(
+                url, data, ttl_seconds, last_modified, body=response.content
+            )
+        return self._cache.set(
+            url, data, ttl_seconds, last_modified, body=response.content
+        )
+
+    def _start_fetch(
+        self,
+        url: str,
+        ttl_seconds: float,
+        priority: Priority,
+        *,
+        background: bool = False,
+    ) -> asyncio.Task[CacheEntry]:
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(
+                self._fetch(url, ttl_seconds, priority),
+                # Nobody waits on a background refresh, so no request pays for it
+                context=untimed() if background else None,
+            )
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._fetch_done(url, t))
+        else:
+            self.scheduler.promote(url, priority)
+        return task
+
+    def _fetch_done(self, url: str, task: asyncio.Task[CacheEntry]) -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    async def _fetch(
+        self, url: str, ttl_seconds: float, priority: Priority
+    ) -> CacheEntry:
+        assert self._client is not None
+        entry = await self._get_entry(url)
         headers = {}
         if entry and entry.last_modified:
             headers["If-Modified-Since"] = entry.last_modified
 
-        await self._rate_limiter.wait()
-        response = await self._client.get(url, headers=headers)
+        with phase("limiter"):
+            await self.scheduler.wait(priority, key=url)
+        # Another worker sharing the cache may have fetched it while we waited
+        latest = await self._get_entry(url)
+        if latest is not None and latest.is_fresh():
+            return latest
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._client.get(url, headers=headers)
+            status = str(response.status_code)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.upstream_seconds.observe(elapsed, endpoint_kind(url), status)
+            add_phase("upstream", elapsed)
         if response.status_code == 304 and entry:
-            self._cache.refresh(url, ttl_seconds)
-            return entry.data
+            await self._refresh(url, ttl_seconds)
+            return entry
 
         response.raise_for_status()
         try:
-            data = response.json()
+            with phase("decode"):
+                data = response.json()
         except json.JSONDecodeError as e:
             raise httpx.HTTPError(f"Invalid JSON response from {url}") from e
-        last_modified = response.headers.get("Last-Modified")
-        self._cache.set(url, data, ttl_seconds, last_modified)
-        return data
+        entry = await self._set(url, data, ttl_seconds, response)
+        if self._on_entry is not None:
+            self._on_entry(url, entry)
+        return entry
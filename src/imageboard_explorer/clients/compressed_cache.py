@@ -0,0 +1,147 @@
+import json
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+from weakref import WeakValueDictionary
+
+from imageboard_explorer.metrics import phase
+
+from .chan_api import (
+    DEFAULT_CACHE_BYTES,
+    CacheEntry,
+    CacheStats,
+    TTLCache,
+    entry_bytes,
+)
+
+DEFAULT_DECODED_BYTES = 16 * 1024 * 1024
+# Entry, key and heap item next to each compressed body
+_STORED_ENTRY_BYTES = 400
+
+
+def _stored_bytes(blob: bytes, _body: bytes | None) -> int:
+    return len(blob) + _STORED_ENTRY_BYTES
+
+
+class CompressedCache:
+    """Response cache keeping zlib-compressed bodies, decoded when looked up.
+
+    Bodies are stored with their ``Last-Modified`` in a ``TTLCache`` sized by
+    compressed length, so ``max_bytes`` holds many times the responses that
+    decoded ones would take (a thread's JSON compresses 5-8x, and decoding
+    doubles it). A lookup decompresses and decodes the body; the decoded
+    data of the most recently used entries is kept in an LRU of about
+    ``decoded_bytes`` (0 keeps none) so hot threads are decoded once.
+
+    An entry handed out stays the one returned for its key, and is refreshed
+    along with the stored body, for as long as anything holds on to it, so
+    caches keyed on the identity of ``entry.data`` keep working.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+        stale_grace_seconds: float = 0.0,
+        on_evict: Callable[[str], None] | None = None,
+        *,
+        decoded_bytes: int = DEFAULT_DECODED_BYTES,
+        level: int = 1,
+    ) -> None:
+        self._stored = TTLCache(
+            stale_grace_seconds=stale_grace_seconds,
+            on_evict=self._evicted,
+            max_bytes=max_bytes,
+            sizer=_stored_bytes,
+        )
+        self._on_evict = on_evict
+        self._level = level
+        # Decoded entries still referenced somewhere, current for their body
+        self._live: WeakValueDictionary[str, CacheEntry] = WeakValueDictionary()
+        # Strong references to the most recently used of them, with their size
+        self._decoded: OrderedDict[str, tuple[CacheEntry, int]] = OrderedDict()
+        self._decoded_bytes = 0
+        self._max_decoded_bytes = decoded_bytes
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stored.stats
+
+    @property
+    def decoded_bytes(self) -> int:
+        return self._decoded_bytes
+
+    def _evicted(self, key: str) -> None:
+        self._forget(key)
+        if self._on_evict is not None:
+            self._on_evict(key)
+
+    def _forget(self, key: str) -> None:
+        self._live.pop(key, None)
+        kept = self._decoded.pop(key, None)
+        if kept is not None:
+            self._decoded_bytes -= kept[1]
+
+    def _keep(self, key: str, entry: CacheEntry, size: int) -> None:
+        self._live[key] = entry
+        kept = self._decoded.pop(key, None)
+        if kept is not None:
+            self._decoded_bytes -= kept[1]
+        if size > self._max_decoded_bytes:
+            return
+        self._decoded[key] = (entry, size)
+        self._decoded_bytes += size
+        while self._decoded_bytes > self._max_decoded_bytes:
+            _, (_, evicted) = self._decoded.popitem(last=False)
+            self._decoded_bytes -= evicted
+
+    def get(self, key: str) -> Any | None:
+        entry = self.get_entry(key)
+        if not entry or not entry.is_fresh():
+            return None
+        return entry.data
+
+    def get_entry(self, key: str, *, record_stats: bool = True) -> CacheEntry | None:
+        stored = self._stored.get_entry(key, record_stats=record_stats)
+        if stored is None:
+            # Never stored (too big for the budget) or long gone
+            self._forget(key)
+            return None
+        entry = self._live.get(key)
+        if entry is not None:
+            if key in self._decoded:
+                self._decoded.move_to_end(key)
+            return entry
+        with phase("decode"):
+            body = zlib.decompress(stored.data)
+            data = json.loads(body)
+        self._stored.stats.decodes += 1
+        entry = CacheEntry(data, stored.expires_at, stored.last_modified)
+        self._keep(key, entry, entry_bytes(data, body))
+        return entry
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry:
+        if body is None:
+            body = json.dumps(data, separators=(",", ":")).encode()
+        with phase("compress"):
+            blob = zlib.compress(body, self._level)
+        # Drop the previous version first; its entry no longer matches
+        self._forget(key)
+        stored = self._stored.set(key, blob, ttl_seconds, last_modified)
+        entry = CacheEntry(data, stored.expires_at, last_modified)
+        self._keep(key, entry, entry_bytes(data, body))
+        return entry
+
+    def refresh(self, key: str, ttl_seconds: float) -> None:
+        self._stored.refresh(key, ttl_seconds)
+        entry = self._live.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl_seconds
@@ -0,0 +1,63 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    next_slot REAL NOT NULL
+)
+"""
+
+# A reservation further out than this can only come from a clock reset
+# (e.g. a reboot with the file left behind), not from a real queue.
+_MAX_BACKLOG_SECONDS = 600.0
+
+
+class SQLiteRateLimiter:
+    """Rate limiter shared by every process that opens the same SQLite file.
+
+    Each caller reserves the next free slot inside an ``IMMEDIATE``
+    transaction (in a worker thread, as it may wait on another process's
+    lock) and then sleeps until it, so nothing is locked while waiting. Slots
+    are on the monotonic clock, which is host-wide.
+    """
+
+    def __init__(
+        self, path: str | Path, interval_seconds: float, name: str = "upstream"
+    ) -> None:
+        self._interval = interval_seconds
+        self._name = name
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None, timeout=5.0
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _reserve(self) -> float:
+        now = time.monotonic()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT next_slot FROM rate_limits WHERE name = ?", (self._name,)
+            ).fetchone()
+            slot = now
+            if row is not None and now < row[0] <= now + _MAX_BACKLOG_SECONDS:
+                slot = row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (name, next_slot) VALUES (?, ?)",
+                (self._name, slot + self._interval),
+            )
+        return slot
+
+    async def wait(self) -> None:
+        delay = await asyncio.to_thread(self._reserve) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
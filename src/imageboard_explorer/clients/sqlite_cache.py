@@ -0,0 +1,236 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .chan_api import (
+    DEFAULT_CACHE_BYTES,
+    CacheEntry,
+    CacheStats,
+    ResponseCache,
+    TTLCache,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at);
+"""
+
+
+@dataclass
+class _Stored:
+    """A row newer than the copy in memory; ``body`` is None if only its expiry is."""
+
+    data: Any
+    body: bytes | None
+    last_modified: str | None
+    remaining: float
+
+
+class SQLiteCache:
+    """Response cache persisted to a SQLite file so it survives restarts.
+
+    Raw response bodies are stored with their ``Last-Modified`` and wall-clock
+    expiry; decoded data lives in an in-memory ``TTLCache`` in front of the
+    file. After a restart, stored entries are picked up on first access and,
+    once stale, served while the client revalidates them with a conditional
+    GET. ChanAPIClient uses the ``a``-prefixed methods, which run the queries
+    (and may wait up to 5 s on another process's lock) in a worker thread;
+    the in-memory cache is only touched on the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size: int = 1000,
+        memory_size: int | None = None,
+        stale_grace_seconds: float = 0.0,
+        on_evict: Callable[[str], None] | None = None,
+        *,
+        memory_bytes: int = DEFAULT_CACHE_BYTES,
+        memory: ResponseCache | None = None,
+    ) -> None:
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None, timeout=5.0
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # One query at a time on the connection, whichever thread runs it
+        self._lock = threading.Lock()
+        # Evictions are reported for the copies held in memory; a ``memory``
+        # cache passed in is used as it is (e.g. a CompressedCache)
+        self._memory: ResponseCache = (
+            memory
+            if memory is not None
+            else TTLCache(
+                max_size=memory_size,
+                stale_grace_seconds=stale_grace_seconds,
+                on_evict=on_evict,
+                max_bytes=memory_bytes,
+            )
+        )
+        self._max_size = max_size
+        self._stale_grace = stale_grace_seconds
+
+    @property
+    def stats(self) -> CacheStats:
+        # Lookups that the file answers after a memory miss still count as misses
+        return self._memory.stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key: str) -> Any | None:
+        entry = self.get_entry(key)
+        if not entry or not entry.is_fresh():
+            return None
+        return entry.data
+
+    def get_entry(self, key: str, *, record_stats: bool = True) -> CacheEntry | None:
+        current = self._memory.get_entry(key, record_stats=record_stats)
+        if current is not None and current.is_fresh():
+            return current
+        # Missing or stale in memory: the file may hold a newer copy
+        # (written before a restart, or by another process)
+        return self._apply(key, current, self._query(key, current))
+
+    async def aget_entry(
+        self, key: str, *, record_stats: bool = True
+    ) -> CacheEntry | None:
+        current = self._memory.get_entry(key, record_stats=record_stats)
+        if current is not None and current.is_fresh():
+            return current
+        stored = await asyncio.to_thread(self._query, key, current)
+        return self._apply(key, current, stored)
+
+    def _apply(
+        self, key: str, current: CacheEntry | None, stored: _Stored | None
+    ) -> CacheEntry | None:
+        if stored is None:
+            return current
+        if stored.body is None:
+            # Revalidated elsewhere; same document, new expiry
+            self._memory.refresh(key, stored.remaining)
+            return current
+        return self._memory.set(
+            key, stored.data, stored.remaining, stored.last_modified, stored.body
+        )
+
+    def _query(self, key: str, current: CacheEntry | None) -> _Stored | None:
+        """What the file holds for ``key`` that is newer than ``current``."""
+        with self._lock:
+            # Metadata first: the body is only read when it will be served
+            row = self._conn.execute(
+                "SELECT last_modified, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            last_modified, expires_at = row
+            remaining = expires_at - time.time()
+            if remaining + self._stale_grace <= 0:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            if current is not None:
+                current_expires_at = time.time() + current.expires_at - time.monotonic()
+                if expires_at <= current_expires_at + 0.001:
+                    return None
+                if last_modified is not None and last_modified == current.last_modified:
+                    return _Stored(None, None, last_modified, remaining)
+            return self._read(key, expires_at, last_modified, remaining)
+
+    def _read(
+        self, key: str, expires_at: float, last_modified: str | None, remaining: float
+    ) -> _Stored | None:
+        """The body of the row whose metadata was just read, decoded."""
+        row = self._conn.execute(
+            "SELECT body FROM responses WHERE key = ? AND expires_at = ?",
+            (key, expires_at),
+        ).fetchone()
+        if row is None:
+            # Replaced by another process in between; read it next time
+            return None
+        try:
+            return _Stored(json.loads(row[0]), row[0], last_modified, remaining)
+        except ValueError:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry:
+        if body is None:
+            body = json.dumps(data).encode()
+        entry = self._memory.set(key, data, ttl_seconds, last_modified, body)
+        self._store(key, body, ttl_seconds, last_modified)
+        return entry
+
+    async def aset(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        last_modified: str | None,
+        body: bytes | None = None,
+    ) -> CacheEntry:
+        if body is None:
+            body = json.dumps(data).encode()
+        entry = self._memory.set(key, data, ttl_seconds, last_modified, body)
+        await asyncio.to_thread(self._store, key, body, ttl_seconds, last_modified)
+        return entry
+
+    def _store(
+        self, key: str, body: bytes, ttl_seconds: float, last_modified: str | None
+    ) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, body, last_modified, expires_at, stored_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, body, last_modified, now + ttl_seconds, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?",
+                (now - self._stale_grace,),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY stored_at DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self._max_size,),
+            )
+
+    def refresh(self, key: str, ttl_seconds: float) -> None:
+        self._memory.refresh(key, ttl_seconds)
+        self._extend(key, ttl_seconds)
+
+    async def arefresh(self, key: str, ttl_seconds: float) -> None:
+        self._memory.refresh(key, ttl_seconds)
+        await asyncio.to_thread(self._extend, key, ttl_seconds)
+
+    def _extend(self, key: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ? WHERE key = ?",
+                (time.time() + ttl_seconds, key),
+            )
@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Any
+
+from .chan_api import CacheEntry, ChanAPIClient, Priority
+
+
+class ThreadStatus(Enum):
+    UNKNOWN = "unknown"
+    UNCHANGED = "unchanged"
+    CHANGED = "changed"
+
+
+@dataclass
+class _BoardIndex:
+    active_at: float
+    polled_at: float = float("-inf")
+    source: Any = None
+    last_modified: dict[int, int] = field(default_factory=dict)
+    # Threads already refetched for their current index value
+    refetched: dict[int, int] = field(default_factory=dict)
+    task: asyncio.Task[None] | None = None
+
+
+def _http_date_to_unix(value: str) -> int | None:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except ValueError:
+        return None
+
+
+class ThreadIndex:
+    """Per-thread ``last_modified`` from each active board's ``threads.json``.
+
+    While threads on a board are being opened, its index is polled every
+    ``poll_seconds`` at revalidation priority and polling stops after
+    ``idle_seconds`` without activity. A cached thread whose Last-Modified is
+    not older than the index entry is current and needs no upstream request;
+    a newer index entry means it must be refetched before being served.
+    """
+
+    def __init__(
+        self,
+        client: ChanAPIClient,
+        poll_seconds: float = 15.0,
+        idle_seconds: float = 300.0,
+    ) -> None:
+        self._client = client
+        self._poll = poll_seconds
+        self._idle = idle_seconds
+        self._boards: dict[str, _BoardIndex] = {}
+
+    def touch(self, board: str) -> None:
+        """Record activity on ``board`` and make sure its index is being polled."""
+        now = time.monotonic()
+        index = self._boards.get(board)
+        if index is None:
+            index = self._boards[board] = _BoardIndex(active_at=now)
+        index.active_at = now
+        loop = asyncio.get_running_loop()
+        if index.task is None or index.task.done() or index.task.get_loop() is not loop:
+            index.task = loop.create_task(self._run(board, index))
+
+    def status(
+        self, board: str, thread_id: int, entry: CacheEntry | None
+    ) -> ThreadStatus:
+        index = self._boards.get(board)
+        if (
+            entry is None
+            or entry.last_modified is None
+            or index is None
+            or time.monotonic() - index.polled_at > 2 * self._poll
+        ):
+            return ThreadStatus.UNKNOWN
+        indexed = index.last_modified.get(thread_id)
+        cached = _http_date_to_unix(entry.last_modified)
+        if indexed is None or cached is None:
+            return ThreadStatus.UNKNOWN
+        if indexed <= cached:
+            return ThreadStatus.UNCHANGED
+        if index.refetched.get(thread_id) == indexed:
+            # Already refetched once for this value; upstream's Last-Modified
+            # disagrees with the index, so fall back to the TTL
+            return ThreadStatus.UNKNOWN
+        index.refetched[thread_id] = indexed
+        return ThreadStatus.CHANGED
+
+    async def aclose(self) -> None:
+        tasks = [index.task for index in self._boards.values() if index.task]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError, RuntimeError):
+                await task
+
+    async def _run(self, board: str, index: _BoardIndex) -> None:
+        while time.monotonic() - index.active_at < self._idle:
+            with contextlib.suppress(Exception):
+                entry = await self._client.fetch_entry(
+                    f"/{board}/threads.json",
+                    ttl_seconds=self._poll,
+                    priority=Priority.REVALIDATE,
+                    must_revalidate=True,
+                )
+                self._update(index, entry)
+            await asyncio.sleep(self._poll)
+
+    @staticmethod
+    def _update(index: _BoardIndex, entry: CacheEntry) -> None:
+        index.polled_at = time.monotonic()
+        if entry.data is index.source:
+            return
+        index.source = entry.data
+        index.last_modified = {
+            thread["no"]: thread["last_modified"]
+            for page in entry.data
+            for thread in page.get("threads", [])
+            if "last_modified" in thread
+        }
+        index.refetched = {
+            no: value
+            for no, value in index.refetched.items()
+            if index.last_modified.get(no) == value
+        }
@@ -1,140 +1,467 @@
 import argparse
+import hashlib
 import html as html_lib
+import importlib.metadata
+import os
 import subprocess
 import sys
+import tempfile
+import time
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterator
+from dataclasses import asdict
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
 import uvicorn
-from fastapi import FastAPI, Path as PathParam, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Path as PathParam, Query, Request
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from httpx import HTTPStatusError
+from jinja2 import Template
+from starlette.background import BackgroundTask
 
-from .clients.chan_api import ChanAPIClient
-from .models import (
-    Board,
-    CatalogThread,
-    Thread,
-    ThreadPost,
-    country_flag_url,
-    format_bytes,
-    image_url,
-    media_kind,
-    thumbnail_url,
+from .clients.catalog_refresher import CatalogRefresher
+from .clients.chan_api import (
+    CacheEntry,
+    ChanAPIClient,
+    RequestScheduler,
+    ResponseCache,
+    TTLCache,
 )
-from .text import (
-    extract_all_quotes,
-    extract_quotes,
-    html_to_text,
-    strip_header_quotes,
-    text_to_html,
+from .clients.compressed_cache import CompressedCache
+from .clients.shared_limiter import SQLiteRateLimiter
+from .clients.sqlite_cache import SQLiteCache
+from .clients.thread_index import ThreadIndex, ThreadStatus
+from .media import MediaCache
+from .metrics import (
+    Exposition,
+    Histogram,
+    ProfileRequests,
+    RequestMetrics,
+    add_phase,
+    phase,
 )
+from .models import Board, CatalogThread, decode, set_media_proxy
+from .page_cache import PageCache, compress, content_encoding, negotiate_encoding
+from .prefetch import Prefetcher
+from .search import SearchIndex
+from .settings import Settings
+from .threads import ThreadState, build_catalog_payload
 
 _PACKAGE_DIR = Path(__file__).parent
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory=str(_PACKAGE_DIR / "static")), name="static")
 
-templates = Jinja2Templates(directory=str(_PACKAGE_DIR / "templates"))
-client = ChanAPIClient()
+# Per-route request and phase timings and status counts, served on /metrics
+route_seconds = Histogram()
+route_responses: Counter[tuple[str, str]] = Counter()
+app.add_middleware(RequestMetrics, phases=route_seconds, responses=route_responses)
+# Outermost, so a profile covers the whole request and keeps its Server-Timing
+app.add_middleware(ProfileRequests)
+
+
+def _fragment_context(request: Request) -> dict:
+    # ``?fragment=1`` renders just the content and status blocks, which app.js
+    # swaps into the current page instead of loading a new one. Search is
+    # advertised (and bound to "/") only when the index is on
+    return {
+        "fragment": request.query_params.get("fragment") == "1",
+        "search_enabled": search_index is not None,
+    }
+
+
+templates = Jinja2Templates(
+    directory=str(_PACKAGE_DIR / "templates"), context_processors=[_fragment_context]
+)
+
+
+class _TimedTemplate(Template):
+    def render(self, *args: object, **kwargs: object) -> str:
+        with phase("render"):
+            return super().render(*args, **kwargs)
+
+
+templates.env.template_class = _TimedTemplate
+
+
+def _build_search_index(settings: Settings) -> SearchIndex | None:
+    if settings.search_index_bytes <= 0:
+        return None
+    return SearchIndex(settings.search_index_bytes)
+
+
+def _build_client(
+    settings: Settings, search_index: SearchIndex | None = None
+) -> ChanAPIClient:
+    # The search index follows what the cache holds in memory
+    on_evict = search_index.discard if search_index is not None else None
+    cache: ResponseCache
+    if settings.compress_responses:
+        cache = CompressedCache(
+            settings.response_cache_bytes,
+            settings.stale_grace_seconds,
+            on_evict,
+            decoded_bytes=settings.decoded_cache_bytes,
+        )
+    else:
+        cache = TTLCache(
+            stale_grace_seconds=settings.stale_grace_seconds,
+            on_evict=on_evict,
+            max_bytes=settings.response_cache_bytes,
+        )
+    if settings.cache_path:
+        cache = SQLiteCache(
+            settings.cache_path,
+            stale_grace_seconds=settings.stale_grace_seconds,
+            memory=cache,
+        )
+    shared = None
+    if settings.rate_limit_path:
+        shared = SQLiteRateLimiter(settings.rate_limit_path, interval_seconds=1.0)
+    return ChanAPIClient(
+        settings.upstream_url,
+        stale_grace_seconds=settings.stale_grace_seconds,
+        cache=cache,
+        scheduler=RequestScheduler(interval_seconds=1.0, shared=shared),
+        on_entry=search_index.update if search_index is not None else None,
+    )
+
+
+def _build_prefetcher(settings: Settings, client: ChanAPIClient) -> Prefetcher | None:
+    if settings.prefetch_depth <= 0:
+        return None
+    # Budgets and poll rates are for the host, split among the workers
+    return Prefetcher(
+        client,
+        depth=settings.prefetch_depth,
+        budget_per_minute=settings.prefetch_budget / settings.workers,
+    )
+
+
+def _build_thread_index(
+    settings: Settings, client: ChanAPIClient
+) -> ThreadIndex | None:
+    if settings.index_poll_seconds <= 0:
+        return None
+    return ThreadIndex(
+        client, poll_seconds=settings.index_poll_seconds * settings.workers
+    )
+
+
+def _build_refresher(
+    settings: Settings, client: ChanAPIClient
+) -> CatalogRefresher | None:
+    boards = [
+        board.strip().strip("/")
+        for board in (settings.overview_boards or "").split(",")
+        if board.strip().strip("/")
+    ]
+    if not boards:
+        return None
+    return CatalogRefresher(
+        client, boards, budget_per_minute=settings.overview_budget / settings.workers
+    )
+
+
+def _build_page_cache(settings: Settings) -> PageCache | None:
+    if settings.page_cache_bytes <= 0:
+        return None
+    return PageCache(settings.page_cache_bytes)
+
+
+def _build_media_cache(settings: Settings) -> MediaCache | None:
+    if not settings.media_cache_path:
+        set_media_proxy(None)
+        return None
+    set_media_proxy("/media")
+    return MediaCache(settings.media_cache_path, max_bytes=settings.media_cache_bytes)
+
+
+settings = Settings.from_env()
+search_index = _build_search_index(settings)
+client = _build_client(settings, search_index)
+prefetcher = _build_prefetcher(settings, client)
+thread_index = _build_thread_index(settings, client)
+refresher = _build_refresher(settings, client)
+media_cache = _build_media_cache(settings)
+page_cache = _build_page_cache(settings)
+
+_THREAD_TTL_SECONDS = 10
+_CATALOG_ITEMS_MAX = 100
+_STREAM_CHUNK_SIZE = 16 * 1024
+
+_THREAD_STATE_CACHE_SIZE = 64
+_thread_states: OrderedDict[tuple[str, int], ThreadState] = OrderedDict()
 
 
 @app.on_event("startup")
 async def startup() -> None:
     await client.start()
+    if refresher is not None:
+        refresher.start()
 
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
+    if refresher is not None:
+        await refresher.aclose()
+    if thread_index is not None:
+        await thread_index.aclose()
+    if media_cache is not None:
+        await media_cache.aclose()
+    # Closes the SQLite cache and rate limiter files too
     await client.aclose()
 
 
-def _board_description(board: Board) -> str:
-    description = board.meta_description or board.title
+def _board_description(board: dict) -> str:
+    description = board.get("meta_description") or board["title"]
     return html_lib.unescape(description)
 
 
-async def _load_boards() -> list[Board]:
-    payload = await client.fetch_json("/boards.json", ttl_seconds=3600)
-    return [Board(**board) for board in payload.get("boards", [])]
+def _decode_boards(payload: dict) -> list[dict]:
+    with phase("payload"):
+        boards = [
+            decode(Board, board, settings.strict_models)
+            for board in payload.get("boards", [])
+        ]
+        # Read the required fields now so a malformed board fails with the fetch
+        return [
+            {
+                "board": board["board"],
+                "title": board["title"],
+                "ws_board": board.get("ws_board"),
+                "meta_description": board.get("meta_description"),
+            }
+            for board in boards
+        ]
+
+
+async def _load_boards() -> list[dict]:
+    return _decode_boards(await client.fetch_json("/boards.json", ttl_seconds=3600))
+
+
+async def _load_thread_entry(board: str, thread_id: int) -> CacheEntry:
+    path = f"/{board}/thread/{thread_id}.json"
+    status = ThreadStatus.UNKNOWN
+    if thread_index is not None:
+        thread_index.touch(board)
+        cached = await client.peek(path)
+        status = thread_index.status(board, thread_id, cached)
+        if (
+            status is ThreadStatus.UNCHANGED
+            and cached is not None
+            and not cached.is_fresh()
+        ):
+            # The board index vouches for it: no upstream request needed
+            await client.mark_fresh(path, _THREAD_TTL_SECONDS)
+    entry = await client.fetch_entry(
+        path,
+        ttl_seconds=_THREAD_TTL_SECONDS,
+        must_revalidate=status is ThreadStatus.CHANGED,
+    )
+    if prefetcher is not None:
+        prefetcher.note_opened(board, thread_id)
+    return entry
+
+
+def _thread_state(board: str, thread_id: int) -> ThreadState:
+    key = (board, thread_id)
+    state = _thread_states.get(key)
+    if state is None:
+        state = ThreadState(board, thread_id, strict=settings.strict_models)
+        _thread_states[key] = state
+    _thread_states.move_to_end(key)
+    while len(_thread_states) > _THREAD_STATE_CACHE_SIZE:
+        _thread_states.popitem(last=False)
+    return state
+
+
+def _thread_posts(board: str, thread_id: int, entry: CacheEntry) -> list[dict]:
+    state = _thread_state(board, thread_id)
+    if not state.matches(entry):
+        with phase("parse"):
+            state.ingest(entry)
+    return state.posts
+
 
+def _thread_post(
+    board: str, thread_id: int, entry: CacheEntry, post_id: int, *, replies: bool = True
+) -> dict | None:
+    with phase("parse"):
+        return _thread_state(board, thread_id).post(entry, post_id, replies=replies)
 
-def _build_post_payload(
-    board: str, thread_id: int, post: ThreadPost, reply_from: list[int]
-) -> dict:
-    comment_text = html_to_text(post.com)
-    quotes_header, quotes_body = extract_quotes(comment_text)
-    full_image_url = image_url(board, post.tim, post.ext)
-    body_text = strip_header_quotes(comment_text)
-    media_type = media_kind(post.ext)
-    file_name = f"{post.filename}{post.ext}" if post.filename and post.ext else None
-    file_size = format_bytes(post.fsize)
-    country = post.country
-    country_name = post.country_name
+
+async def _load_thread_posts(board: str, thread_id: int) -> list[dict]:
+    entry = await _load_thread_entry(board, thread_id)
+    return _thread_posts(board, thread_id, entry)
+
+
+def _build_stamp() -> str:
+    """Changes with the package version and whenever a template or any module
+    that builds page payloads (threads.py, text.py, ...) is edited."""
+    try:
+        version = importlib.metadata.version("imageboard-explorer")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    digest = hashlib.sha1(version.encode())
+    paths = [*_PACKAGE_DIR.rglob("*.py"), *(_PACKAGE_DIR / "templates").iterdir()]
+    for path in sorted(paths):
+        stat = path.stat()
+        name = path.relative_to(_PACKAGE_DIR)
+        digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()
+
+
+_BUILD_STAMP = _build_stamp()
+
+
+def _page_etag(request: Request, last_modified: str | None) -> str | None:
+    """Validator for a page rendered from upstream data with ``last_modified``.
+
+    It covers the code and templates, the request path and query, and the
+    settings that change the markup, so equal tags mean byte-identical pages.
+    """
+    if last_modified is None:
+        return None
+    key = "\n".join(
+        (
+            _BUILD_STAMP,
+            request.url.path,
+            request.url.query,
+            last_modified,
+            str(settings.catalog_window),
+            str(media_cache is not None),
+            str(search_index is not None),
+            settings.overview_boards or "",
+        )
+    )
+    return hashlib.sha1(key.encode()).hexdigest()[:32]
+
+
+def _page_headers(etag: str, encoding: str) -> dict[str, str]:
+    # Each encoding is its own representation, so it gets its own strong tag
+    tag = etag if encoding == "identity" else f"{etag}-{encoding}"
     return {
-        "no": post.no,
-        "name": post.name or "Anonymous",
-        "now": post.now or "",
-        "comment_html": text_to_html(body_text),
-        "thumbnail_url": thumbnail_url(board, post.tim),
-        "quotes_header": quotes_header,
-        "quotes_body": quotes_body,
-        "reply_from": reply_from,
-        "image_url": full_image_url,
-        "media_kind": media_type,
-        "file_name": file_name,
-        "file_size": file_size,
-        "country": country,
-        "country_name": country_name,
-        "country_flag_url": country_flag_url(country),
-        "image_view_href": (
-            f"/board/{board}/thread/{thread_id}/post/{post.no}"
-            if full_image_url
-            else None
-        ),
-        "image_full_href": (
-            f"/board/{board}/thread/{thread_id}/post/{post.no}/image"
-            if full_image_url
-            else None
-        ),
+        "etag": f'"{tag}"',
+        "cache-control": "no-cache",
+        "vary": "Accept-Encoding",
     }
 
 
-async def _load_thread_posts(board: str, thread_id: int) -> list[dict]:
-    payload = await client.fetch_json(
-        f"/{board}/thread/{thread_id}.json", ttl_seconds=10
-    )
-    thread_data = Thread(**payload)
-    posts = thread_data.posts
-    post_ids = {post.no for post in posts}
-    reply_from_map: dict[int, list[int]] = {post.no: [] for post in posts}
-
-    for post in posts:
-        comment_text = html_to_text(post.com)
-        for quoted_id in extract_all_quotes(comment_text):
-            try:
-                quoted_no = int(quoted_id)
-            except ValueError:
-                continue
-            if quoted_no not in post_ids or quoted_no == post.no:
-                continue
-            existing = reply_from_map.get(quoted_no)
-            if existing is None:
-                reply_from_map[quoted_no] = [post.no]
-            elif post.no not in existing:
-                existing.append(post.no)
-
-    return [
-        _build_post_payload(board, thread_id, post, reply_from_map.get(post.no, []))
-        for post in posts
-    ]
+def _if_none_match(request: Request) -> list[str] | None:
+    value = request.headers.get("if-none-match")
+    if value is None:
+        return None
+    return [tag.strip().removeprefix("W/") for tag in value.split(",")]
+
+
+def _cached_page(
+    request: Request, etag: str | None, background: BackgroundTask | None = None
+) -> Response | None:
+    """A 304 or an already encoded body for ``etag``, without rendering."""
+    if etag is None:
+        return None
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    tags = _if_none_match(request)
+    if tags is not None:
+        variants = {f'"{etag}"', f'"{etag}-gzip"', f'"{etag}-br"'}
+        if "*" in tags or variants.intersection(tags):
+            return Response(
+                status_code=304,
+                headers=_page_headers(etag, encoding),
+                background=background,
+            )
+    if page_cache is None:
+        return None
+    cached = page_cache.get(etag, encoding)
+    if cached is None:
+        return None
+    body, encoding = cached
+    headers = _page_headers(etag, encoding)
+    if encoding != "identity":
+        headers["content-encoding"] = encoding
+    return Response(
+        body,
+        media_type="text/html; charset=utf-8",
+        headers=headers,
+        background=background,
+    )
+
+
+def _finish_page(request: Request, etag: str | None, response: Response) -> Response:
+    """Attach validators to a rendered page, compressing and caching its body."""
+    if etag is None or response.status_code != 200:
+        return response
+    if isinstance(response, StreamingResponse):
+        # Streamed pages keep their early first byte; only the validator applies
+        response.headers.update(_page_headers(etag, "identity"))
+        return response
+    body = bytes(response.body)
+    encoding = content_encoding(
+        body, negotiate_encoding(request.headers.get("accept-encoding"))
+    )
+    body = compress(body, encoding)
+    if page_cache is not None:
+        page_cache.set(etag, encoding, body)
+    response.body = body
+    response.headers.update(_page_headers(etag, encoding))
+    response.headers["content-length"] = str(len(body))
+    if encoding != "identity":
+        response.headers["content-encoding"] = encoding
+    return response
+
+
+async def _render_chunks(
+    template: Template, context: dict, chunk_size: int = _STREAM_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    # Jinja yields many tiny strings; batch them so each send carries a
+    # useful amount, yielding to the event loop between batches
+    buffer: list[str] = []
+    size = 0
+    started = time.perf_counter()
+    for piece in template.generate(context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            chunk = "".join(buffer).encode()
+            add_phase("render", time.perf_counter() - started)
+            yield chunk
+            started = time.perf_counter()
+            buffer.clear()
+            size = 0
+    if buffer:
+        chunk = "".join(buffer).encode()
+        add_phase("render", time.perf_counter() - started)
+        yield chunk
+
+
+def _stream_template(name: str, context: dict) -> StreamingResponse:
+    """Like ``TemplateResponse`` but sends the page while it is being rendered."""
+    template = templates.get_template(name)
+    context = {**context, **_fragment_context(context["request"])}
+    return StreamingResponse(
+        _render_chunks(template, context), media_type="text/html; charset=utf-8"
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, selected: str | None = None) -> HTMLResponse:
+async def home(request: Request, selected: str | None = None) -> Response:
     try:
-        boards = await _load_boards()
+        entry = await client.fetch_entry("/boards.json", ttl_seconds=3600)
+        etag = _page_etag(request, entry.last_modified)
+        cached = _cached_page(request, etag)
+        if cached is not None:
+            return cached
+        boards = _decode_boards(entry.data)
     except Exception:
         return templates.TemplateResponse(
             "home.html",
@@ -158,29 +485,49 @@ async def home(request: Request, selected: str | None = None) -> HTMLResponse:
         )
 
     selected_board = next(
-        (board for board in boards if board.board == selected), boards[0]
+        (board for board in boards if board["board"] == selected), boards[0]
     )
     board_items = []
     for board in boards:
         board_items.append(
             {
-                "board": board.board,
-                "title": board.title,
-                "ws_board": board.ws_board,
+                "board": board["board"],
+                "title": board["title"],
+                "ws_board": board.get("ws_board"),
                 "description": _board_description(board),
             }
         )
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "home.html",
         {
             "request": request,
             "screen": "home",
             "boards": board_items,
-            "selected": selected_board.board,
+            "overview": refresher.boards if refresher is not None else None,
+            "selected": (
+                "overview"
+                if selected == "overview" and refresher is not None
+                else selected_board["board"]
+            ),
             "selected_description": _board_description(selected_board),
         },
     )
+    return _finish_page(request, etag, response)
+
+
+def _catalog_items(payload: list[dict]) -> list[dict]:
+    return [item for page in payload for item in page.get("threads", [])]
+
+
+def _catalog_payloads(board: str, items: list[dict]) -> list[dict]:
+    with phase("payload"):
+        return [
+            build_catalog_payload(
+                board, decode(CatalogThread, item, settings.strict_models)
+            )
+            for item in items
+        ]
 
 
 @app.get("/board/{board}/catalog", response_class=HTMLResponse)
@@ -188,9 +535,9 @@ async def catalog(
     request: Request,
     board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
     selected: int | None = None,
-) -> HTMLResponse:
+) -> Response:
     try:
-        payload = await client.fetch_json(f"/{board}/catalog.json", ttl_seconds=30)
+        entry = await client.fetch_entry(f"/{board}/catalog.json", ttl_seconds=30)
     except HTTPStatusError as exc:
         status_code = exc.response.status_code
         message = (
@@ -215,42 +562,79 @@ async def catalog(
             status_code=502,
         )
 
-    threads = []
-    for page in payload:
-        for item in page.get("threads", []):
-            thread = CatalogThread(**item)
-            comment_text = html_to_text(thread.com)
-            threads.append(
-                {
-                    "no": thread.no,
-                    "name": thread.name or "Anonymous",
-                    "now": thread.now or "",
-                    "sub": thread.sub,
-                    "comment_html": text_to_html(comment_text),
-                    "thumbnail_url": thumbnail_url(board, thread.tim),
-                    "replies": thread.replies,
-                    "images": thread.images,
-                    "country": thread.country,
-                    "country_name": thread.country_name,
-                    "country_flag_url": country_flag_url(thread.country),
-                }
-            )
+    items = _catalog_items(entry.data)
+    selected_index = next(
+        (index for index, item in enumerate(items) if item.get("no") == selected), 0
+    )
+    selected_id = items[selected_index]["no"] if items else None
 
-    if threads:
-        selected_thread = next((t for t in threads if t["no"] == selected), threads[0])
-        selected_id = selected_thread["no"]
-    else:
-        selected_id = None
+    background = None
+    if prefetcher is not None and items:
+        # Warm the selected thread and the ones after it once the page is sent
+        background = BackgroundTask(
+            prefetcher.schedule,
+            board,
+            [item["no"] for item in items[selected_index:]],
+        )
+    etag = _page_etag(request, entry.last_modified)
+    cached = _cached_page(request, etag, background)
+    if cached is not None:
+        return cached
 
-    return templates.TemplateResponse(
+    window = None
+    start, end = 0, len(items)
+    if 0 < settings.catalog_window < len(items):
+        # Render only the cards around the selection; app.js fetches the rest
+        # from catalog_items as the selection approaches either edge
+        start = max(0, selected_index - settings.catalog_window // 4)
+        end = min(len(items), start + settings.catalog_window)
+        start = max(0, end - settings.catalog_window)
+        window = {
+            "start": start,
+            "count": settings.catalog_window,
+            "total": len(items),
+        }
+
+    response = templates.TemplateResponse(
         "catalog.html",
         {
             "request": request,
             "screen": "catalog",
             "board": board,
-            "threads": threads,
+            "threads": _catalog_payloads(board, items[start:end]),
             "selected": selected_id,
+            "window": window,
         },
+        background=background,
+    )
+    return _finish_page(request, etag, response)
+
+
+@app.get("/board/{board}/catalog/items", response_class=HTMLResponse)
+async def catalog_items(
+    request: Request,
+    board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
+    start: int = Query(0, ge=0),
+    count: int = Query(30, ge=1, le=_CATALOG_ITEMS_MAX),
+) -> Response:
+    """HTML fragment with catalog cards ``start`` to ``start + count``."""
+    try:
+        payload = await client.fetch_json(f"/{board}/catalog.json", ttl_seconds=30)
+    except HTTPStatusError as exc:
+        return Response(status_code=exc.response.status_code)
+    except Exception:
+        return Response(status_code=502)
+
+    items = _catalog_items(payload)
+    return templates.TemplateResponse(
+        "catalog_items.html",
+        {
+            "request": request,
+            "board": board,
+            "threads": _catalog_payloads(board, items[start : start + count]),
+            "selected": None,
+        },
+        headers={"X-Catalog-Total": str(len(items))},
     )
 
 
@@ -260,9 +644,9 @@ async def thread(
     board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
     thread_id: int = PathParam(..., ge=1),
     selected: int | None = None,
-) -> HTMLResponse:
+) -> Response:
     try:
-        posts = await _load_thread_posts(board, thread_id)
+        entry = await _load_thread_entry(board, thread_id)
     except HTTPStatusError as exc:
         status_code = exc.response.status_code
         message = (
@@ -292,22 +676,32 @@ async def thread(
             status_code=502,
         )
 
+    etag = _page_etag(request, entry.last_modified)
+    cached = _cached_page(request, etag)
+    if cached is not None:
+        return cached
+
+    posts = _thread_posts(board, thread_id, entry)
     if posts:
         selected_post = next((p for p in posts if p["no"] == selected), posts[0])
         selected_id = selected_post["no"]
     else:
         selected_id = None
 
-    return templates.TemplateResponse(
-        "thread.html",
-        {
-            "request": request,
-            "screen": "thread",
-            "board": board,
-            "posts": posts,
-            "selected": selected_id,
-        },
-    )
+    context = {
+        "request": request,
+        "screen": "thread",
+        "board": board,
+        "posts": posts,
+        "selected": selected_id,
+    }
+    response: Response
+    if 0 < settings.stream_min_posts <= len(posts):
+        # A snapshot: the thread state may ingest a newer version mid-stream
+        response = _stream_template("thread.html", {**context, "posts": list(posts)})
+    else:
+        response = templates.TemplateResponse("thread.html", context)
+    return _finish_page(request, etag, response)
 
 
 @app.get(
@@ -318,9 +712,9 @@ async def post_view(
     board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
     thread_id: int = PathParam(..., ge=1),
     post_id: int = PathParam(..., ge=1),
-) -> HTMLResponse:
+) -> Response:
     try:
-        posts = await _load_thread_posts(board, thread_id)
+        entry = await _load_thread_entry(board, thread_id)
     except HTTPStatusError as exc:
         status_code = exc.response.status_code
         message = (
@@ -350,7 +744,12 @@ async def post_view(
             status_code=502,
         )
 
-    post = next((item for item in posts if item["no"] == post_id), None)
+    etag = _page_etag(request, entry.last_modified)
+    cached = _cached_page(request, etag)
+    if cached is not None:
+        return cached
+
+    post = _thread_post(board, thread_id, entry, post_id)
     if not post:
         return templates.TemplateResponse(
             "post_view.html",
@@ -363,7 +762,7 @@ async def post_view(
             status_code=404,
         )
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "post_view.html",
         {
             "request": request,
@@ -372,6 +771,7 @@ async def post_view(
             "post": post,
         },
     )
+    return _finish_page(request, etag, response)
 
 
 @app.get(
@@ -385,7 +785,7 @@ async def post_image(
     post_id: int = PathParam(..., ge=1),
 ) -> HTMLResponse:
     try:
-        posts = await _load_thread_posts(board, thread_id)
+        entry = await _load_thread_entry(board, thread_id)
     except HTTPStatusError as exc:
         status_code = exc.response.status_code
         message = (
@@ -415,7 +815,8 @@ async def post_image(
             status_code=502,
         )
 
-    post = next((item for item in posts if item["no"] == post_id), None)
+    # Only the file fields are shown, so skip collecting replies
+    post = _thread_post(board, thread_id, entry, post_id, replies=False)
     if not post or not post.get("image_url"):
         return templates.TemplateResponse(
             "image_view.html",
@@ -442,6 +843,388 @@ async def post_image(
     )
 
 
+def _api_error(exc: Exception) -> JSONResponse:
+    if isinstance(exc, HTTPStatusError):
+        status_code = exc.response.status_code
+        message = "Not found." if status_code == 404 else "Upstream request failed."
+        return JSONResponse({"error": message}, status_code=status_code)
+    return JSONResponse({"error": "Upstream request failed."}, status_code=502)
+
+
+@app.get("/api/boards")
+async def api_boards() -> Response:
+    try:
+        boards = await _load_boards()
+    except Exception as exc:
+        return _api_error(exc)
+    return JSONResponse(
+        {
+            "boards": [
+                {
+                    "board": board["board"],
+                    "title": board["title"],
+                    "ws_board": board.get("ws_board"),
+                    "description": _board_description(board),
+                    "href": f"/board/{board['board']}/catalog",
+                }
+                for board in boards
+            ]
+        }
+    )
+
+
+@app.get("/api/board/{board}/catalog")
+async def api_catalog(
+    board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
+    start: int = Query(0, ge=0),
+    count: int = Query(_CATALOG_ITEMS_MAX, ge=1, le=_CATALOG_ITEMS_MAX),
+) -> Response:
+    try:
+        payload = await client.fetch_json(f"/{board}/catalog.json", ttl_seconds=30)
+    except Exception as exc:
+        return _api_error(exc)
+    items = _catalog_items(payload)
+    return JSONResponse(
+        {
+            "board": board,
+            "total": len(items),
+            "start": start,
+            "threads": _catalog_payloads(board, items[start : start + count]),
+        }
+    )
+
+
+@app.get("/api/board/{board}/thread/{thread_id}")
+async def api_thread(
+    board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
+    thread_id: int = PathParam(..., ge=1),
+) -> Response:
+    try:
+        posts = await _load_thread_posts(board, thread_id)
+    except Exception as exc:
+        return _api_error(exc)
+    return JSONResponse({"board": board, "thread": thread_id, "posts": posts})
+
+
+@app.get("/api/board/{board}/thread/{thread_id}/post/{post_id}")
+async def api_post(
+    board: str = PathParam(..., pattern=r"^[a-z]{1,6}$"),
+    thread_id: int = PathParam(..., ge=1),
+    post_id: int = PathParam(..., ge=1),
+) -> Response:
+    try:
+        entry = await _load_thread_entry(board, thread_id)
+    except Exception as exc:
+        return _api_error(exc)
+    post = _thread_post(board, thread_id, entry, post_id)
+    if post is None:
+        return JSONResponse({"error": "Post not found."}, status_code=404)
+    return JSONResponse(post)
+
+
+_SEARCH_LIMIT_MAX = 200
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search(
+    request: Request,
+    q: str = "",
+    board: str | None = Query(None, pattern=r"^[a-z]{1,6}$"),
+) -> HTMLResponse:
+    context = {"request": request, "screen": "search", "query": q, "board": board}
+    if search_index is None:
+        return templates.TemplateResponse(
+            "search.html",
+            {**context, "hits": [], "indexed": 0, "error": "Search is disabled."},
+            status_code=404,
+        )
+    # Only what is already cached is searched; no upstream requests
+    hits = search_index.search(q, board=board) if q else []
+    return templates.TemplateResponse(
+        "search.html",
+        {**context, "hits": hits, "indexed": search_index.document_count},
+    )
+
+
+@app.get("/api/search")
+async def api_search(
+    q: str,
+    board: str | None = Query(None, pattern=r"^[a-z]{1,6}$"),
+    limit: int = Query(50, ge=1, le=_SEARCH_LIMIT_MAX),
+) -> Response:
+    if search_index is None:
+        return JSONResponse({"error": "Search is disabled."}, status_code=404)
+    hits = search_index.search(q, board=board, limit=limit)
+    return JSONResponse(
+        {
+            "query": q,
+            "indexed": search_index.document_count,
+            "hits": [{**asdict(hit), "href": hit.href} for hit in hits],
+        }
+    )
+
+
+async def _overview_entries() -> dict[str, CacheEntry | None]:
+    # Whatever is cached now: the refresher keeps these current, so the
+    # overview never waits on upstream
+    assert refresher is not None
+    return {
+        board: await client.peek(f"/{board}/catalog.json") or refresher.latest(board)
+        for board in refresher.boards
+    }
+
+
+def _overview_sections(entries: dict[str, CacheEntry | None]) -> list[dict]:
+    sections = []
+    for board, entry in entries.items():
+        threads = None
+        if entry is not None:
+            items = [
+                item for item in _catalog_items(entry.data) if not item.get("sticky")
+            ]
+            threads = _catalog_payloads(board, items[: settings.overview_threads])
+        sections.append({"board": board, "threads": threads})
+    return sections
+
+
+@app.get("/overview", response_class=HTMLResponse)
+async def overview(request: Request, selected: int | None = None) -> Response:
+    if refresher is None:
+        return templates.TemplateResponse(
+            "overview.html",
+            {
+                "request": request,
+                "screen": "overview",
+                "error": "Overview is disabled.",
+            },
+            status_code=404,
+        )
+    entries = await _overview_entries()
+    stamps = [
+        entry.last_modified
+        for entry in entries.values()
+        if entry is not None and entry.last_modified is not None
+    ]
+    # No validator while a board is still waiting for its first refresh
+    etag = _page_etag(
+        request, "|".join(stamps) if len(stamps) == len(entries) else None
+    )
+    cached = _cached_page(request, etag)
+    if cached is not None:
+        return cached
+
+    sections = _overview_sections(entries)
+    if selected is None:
+        selected = next((s["threads"][0]["no"] for s in sections if s["threads"]), None)
+    response = templates.TemplateResponse(
+        "overview.html",
+        {
+            "request": request,
+            "screen": "overview",
+            "sections": sections,
+            "selected": selected,
+        },
+    )
+    return _finish_page(request, etag, response)
+
+
+@app.get("/api/overview")
+async def api_overview() -> Response:
+    if refresher is None:
+        return JSONResponse({"error": "Overview is disabled."}, status_code=404)
+    return JSONResponse({"boards": _overview_sections(await _overview_entries())})
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Counters and histograms in the Prometheus text format.
+
+    Everything is per process: with ``--workers`` each worker answers for
+    itself.
+    """
+    out = Exposition()
+    cache_stats = client.cache_stats
+    out.sample(
+        "counter",
+        "response_cache_hits_total",
+        "Upstream responses found in the in-memory cache.",
+        cache_stats.hits,
+    )
+    out.sample(
+        "counter",
+        "response_cache_misses_total",
+        "Upstream responses not in the in-memory cache.",
+        cache_stats.misses,
+    )
+    out.sample(
+        "counter",
+        "response_cache_evictions_total",
+        "Responses dropped from the in-memory cache for age or capacity.",
+        cache_stats.evictions,
+    )
+    out.sample(
+        "counter",
+        "response_cache_expirations_total",
+        "Responses dropped from the in-memory cache past their stale grace.",
+        cache_stats.expirations,
+    )
+    out.sample(
+        "gauge",
+        "response_cache_entries",
+        "Responses held in the in-memory cache.",
+        cache_stats.entries,
+    )
+    out.sample(
+        "gauge",
+        "response_cache_bytes",
+        "Approximate memory held by the in-memory response cache.",
+        cache_stats.bytes,
+    )
+    out.sample(
+        "counter",
+        "response_cache_decodes_total",
+        "Compressed responses decoded on a lookup (with --compress-cache).",
+        cache_stats.decodes,
+    )
+    out.sample(
+        "gauge",
+        "response_cache_max_bytes",
+        "Memory budget of the in-memory response cache.",
+        settings.response_cache_bytes,
+    )
+    out.sample(
+        "counter",
+        "response_cache_stale_served_total",
+        "Expired responses served while being revalidated in the background.",
+        client.stale_served,
+    )
+    out.histogram(
+        "upstream_request_seconds",
+        "Upstream round trips by endpoint kind and HTTP status.",
+        client.upstream_seconds,
+        ("endpoint", "status"),
+    )
+    out.histogram(
+        "rate_limit_wait_seconds",
+        "Time upstream requests waited for a rate-limiter slot.",
+        client.scheduler.wait_seconds,
+        ("priority",),
+    )
+    out.sample(
+        "gauge",
+        "rate_limit_queue_depth",
+        "Upstream requests waiting for a rate-limiter slot.",
+        [
+            ({"priority": priority.name.lower()}, depth)
+            for priority, depth in client.scheduler.queue_depth().items()
+        ],
+    )
+    out.histogram(
+        "request_seconds",
+        'Time per route: phase="total" for the whole request, the others for '
+        "the time spent in limiter, upstream, decode, parse, payload and render.",
+        route_seconds,
+        ("route", "phase"),
+    )
+    out.sample(
+        "counter",
+        "responses_total",
+        "HTTP responses by route and status (304 = served from validators).",
+        [
+            ({"route": route, "status": status}, count)
+            for (route, status), count in route_responses.items()
+        ],
+    )
+    if page_cache is not None:
+        out.sample(
+            "counter",
+            "page_cache_hits_total",
+            "Pages sent from already encoded bodies.",
+            page_cache.hits,
+        )
+        out.sample(
+            "counter",
+            "page_cache_misses_total",
+            "Pages that had to be rendered.",
+            page_cache.misses,
+        )
+        out.sample(
+            "gauge",
+            "page_cache_bytes",
+            "Encoded page bytes held.",
+            page_cache.total_bytes,
+        )
+    if prefetcher is not None:
+        out.sample(
+            "counter",
+            "prefetches_total",
+            "Thread prefetches by outcome.",
+            [
+                ({"outcome": outcome}, count)
+                for outcome, count in asdict(prefetcher.stats).items()
+            ],
+        )
+    if search_index is not None:
+        out.sample(
+            "gauge",
+            "search_documents",
+            "Posts in the search index.",
+            search_index.document_count,
+        )
+    return Response(out.text(), media_type=Exposition.CONTENT_TYPE)
+
+
+def _not_modified(request: Request, response: Response) -> bool:
+    tags = _if_none_match(request)
+    if tags is not None:
+        return "*" in tags or response.headers["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+        modified = parsedate_to_datetime(response.headers["last-modified"])
+    except ValueError:
+        return False
+    return modified <= since
+
+
+@app.get("/media/{host}/{path:path}")
+async def media(request: Request, host: str, path: str) -> Response:
+    if media_cache is None or not media_cache.is_valid(host, path):
+        return Response(status_code=404)
+    for _ in range(2):
+        try:
+            local = await media_cache.get(host, path)
+        except Exception:
+            return Response(status_code=502)
+        if local is None:
+            return Response(status_code=404)
+        try:
+            stat_result = local.stat()
+            break
+        except FileNotFoundError:
+            # Evicted (say by another worker) since it was found: fetch it again
+            continue
+    else:
+        return Response(status_code=502)
+    # Upstream media never changes under the same name
+    response = FileResponse(
+        local,
+        stat_result=stat_result,
+        headers={"cache-control": "public, max-age=31536000, immutable"},
+    )
+    if _not_modified(request, response):
+        return Response(
+            status_code=304,
+            headers={
+                key: response.headers[key]
+                for key in ("etag", "last-modified", "cache-control")
+            },
+        )
+    return response
+
+
 def update() -> None:
     """Check for updates and install if available."""
     GREEN = "\033[38;2;67;227;39m"
@@ -464,6 +1247,71 @@ def update() -> None:
         sys.exit(1)
 
 
+# CLI options copied to settings as they are
+_NUMERIC_OPTIONS = {
+    "prefetch": "prefetch_depth",
+    "prefetch_budget": "prefetch_budget",
+    "index_poll": "index_poll_seconds",
+    "stream_threads": "stream_min_posts",
+    "catalog_window": "catalog_window",
+    "overview_threads": "overview_threads",
+    "overview_budget": "overview_budget",
+}
+# Sizes given in MB on the command line and kept in bytes
+_MEGABYTE_OPTIONS = {
+    "response_cache_size": "response_cache_bytes",
+    "decoded_cache_size": "decoded_cache_bytes",
+    "media_cache_size": "media_cache_bytes",
+    "page_cache_size": "page_cache_bytes",
+    "search_index_size": "search_index_bytes",
+}
+
+
+def configure(args: argparse.Namespace) -> None:
+    """Apply CLI overrides on top of the environment settings."""
+    if args.cache_path:
+        settings.cache_path = args.cache_path
+    if args.stale_grace is not None:
+        settings.stale_grace_seconds = args.stale_grace
+    if args.strict_models:
+        settings.strict_models = True
+    settings.workers = args.workers
+    if args.workers > 1:
+        # Workers must share one cache and one 1 req/s budget for the host
+        if not settings.cache_path:
+            state_dir = Path(tempfile.gettempdir()) / "imageboard-explorer"
+            state_dir.mkdir(exist_ok=True)
+            settings.cache_path = str(state_dir / "shared.db")
+        settings.rate_limit_path = settings.rate_limit_path or settings.cache_path
+    for option, name in _NUMERIC_OPTIONS.items():
+        value = getattr(args, option)
+        if value is not None:
+            setattr(settings, name, value)
+    if args.overview:
+        settings.overview_boards = args.overview
+    if args.compress_cache:
+        settings.compress_responses = True
+    if args.media_cache:
+        settings.media_cache_path = args.media_cache
+    for option, name in _MEGABYTE_OPTIONS.items():
+        value = getattr(args, option)
+        if value is not None:
+            setattr(settings, name, value * 1024 * 1024)
+
+
+def _rebuild() -> None:
+    """Rebuild the app's resources from the (configured) settings."""
+    # The routes look `client` up at call time, so rebuilding it here is enough
+    global client, prefetcher, thread_index, refresher, media_cache, page_cache, search_index  # noqa: PLW0603
+    search_index = _build_search_index(settings)
+    client = _build_client(settings, search_index)
+    prefetcher = _build_prefetcher(settings, client)
+    thread_index = _build_thread_index(settings, client)
+    refresher = _build_refresher(settings, client)
+    media_cache = _build_media_cache(settings)
+    page_cache = _build_page_cache(settings)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         prog="imageboard-explorer",
@@ -475,6 +1323,127 @@ def main() -> None:
     parser.add_argument(
         "--port", type=int, default=8000, help="Port to bind to (default: 8000)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes; more than one shares the cache and rate limit "
+        "through a SQLite file (default: 1)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="SQLite file for a response cache that survives restarts",
+    )
+    parser.add_argument(
+        "--response-cache-size",
+        type=int,
+        metavar="MB",
+        help="Memory for decoded upstream responses, approximated from their size "
+        f"(default: {settings.response_cache_bytes // (1024 * 1024)} MB)",
+    )
+    parser.add_argument(
+        "--compress-cache",
+        action="store_true",
+        help="Keep cached responses zlib-compressed and decode them when used, "
+        "which fits several times as many in --response-cache-size",
+    )
+    parser.add_argument(
+        "--decoded-cache-size",
+        type=int,
+        metavar="MB",
+        help="With --compress-cache, memory for decoded copies of the most "
+        f"recently used responses (default: {settings.decoded_cache_bytes // (1024 * 1024)} MB)",
+    )
+    parser.add_argument(
+        "--stale-grace",
+        type=float,
+        help="Seconds an expired response may be served while it is revalidated "
+        f"(default: {settings.stale_grace_seconds:g})",
+    )
+    parser.add_argument(
+        "--strict-models",
+        action="store_true",
+        help="Validate upstream JSON with the pydantic models (for debugging)",
+    )
+    parser.add_argument(
+        "--stream-threads",
+        type=int,
+        metavar="N",
+        help="Stream the page of threads with at least N posts while it renders "
+        "(default: off)",
+    )
+    parser.add_argument(
+        "--catalog-window",
+        type=int,
+        metavar="N",
+        help="Render only N catalog threads around the selection and load the "
+        "rest as the selection moves (default: all)",
+    )
+    parser.add_argument(
+        "--media-cache",
+        metavar="DIR",
+        help="Serve thumbnails, images and flags through a local proxy cached in DIR",
+    )
+    parser.add_argument(
+        "--media-cache-size",
+        type=int,
+        metavar="MB",
+        help="Disk budget of the media cache "
+        f"(default: {settings.media_cache_bytes // (1024 * 1024)} MB)",
+    )
+    parser.add_argument(
+        "--page-cache-size",
+        type=int,
+        metavar="MB",
+        help="Memory for compressed copies of recently served pages; 0 disables "
+        f"(default: {settings.page_cache_bytes // (1024 * 1024)} MB)",
+    )
+    parser.add_argument(
+        "--search-index-size",
+        type=int,
+        metavar="MB",
+        help="Turn on /search over cached catalogs and threads, with an index "
+        "of up to this much memory updated as responses are stored "
+        "(default: off)",
+    )
+    parser.add_argument(
+        "--index-poll",
+        type=float,
+        metavar="SECONDS",
+        help="Poll each active board's threads.json this often to tell exactly "
+        f"which cached threads changed; 0 disables (default: {settings.index_poll_seconds:g})",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        metavar="K",
+        help="After a catalog view, prefetch the selected thread and the next K "
+        "in the background (default: off)",
+    )
+    parser.add_argument(
+        "--prefetch-budget",
+        type=float,
+        help="Upstream prefetches allowed per board per minute "
+        f"(default: {settings.prefetch_budget:g})",
+    )
+    parser.add_argument(
+        "--overview",
+        metavar="BOARDS",
+        help="Comma-separated boards whose top threads /overview shows, kept "
+        "current by background catalog refreshes (default: off)",
+    )
+    parser.add_argument(
+        "--overview-threads",
+        type=int,
+        metavar="N",
+        help=f"Threads shown per board on /overview (default: {settings.overview_threads})",
+    )
+    parser.add_argument(
+        "--overview-budget",
+        type=float,
+        help="Background catalog refreshes allowed per minute for /overview "
+        f"(default: {settings.overview_budget:g})",
+    )
     parser.add_argument(
         "command",
         nargs="?",
@@ -487,7 +1456,20 @@ def main() -> None:
     if args.command == "update":
         update()
     else:
-        uvicorn.run(app, host=args.host, port=args.port)
+        configure(args)
+        if args.workers > 1:
+            # Worker processes re-import this module and build their own
+            # resources from the settings in the environment
+            os.environ.update(settings.to_env())
+            uvicorn.run(
+                "imageboard_explorer.main:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+            )
+        else:
+            _rebuild()
+            uvicorn.run(app, host=args.host, port=args.port)
 
 
 if __name__ == "__main__":
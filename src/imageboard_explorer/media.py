@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import httpx
+
+# Local proxy host segment -> upstream CDN
+CDN_HOSTS = {"i": "https://i.4cdn.org", "s": "https://s.4cdn.org"}
+_MEDIA_PATH_RE = re.compile(r"^[a-z0-9]+(?:/[a-z0-9]+)*\.[a-z0-9]{2,5}$", re.IGNORECASE)
+
+
+class MediaCache:
+    """Size-bounded LRU disk cache for 4chan thumbnails, images and flags.
+
+    CDN files are immutable (names are upload timestamps), so a cached file
+    is never revalidated. Each file keeps the upstream ``Last-Modified`` as
+    its mtime, which makes the ``ETag``/``Last-Modified`` that
+    ``FileResponse`` derives from it stable across restarts; the access time
+    records LRU order.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int = 512 * 1024 * 1024,
+        timeout: float = 30.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._root = Path(directory)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._inflight: dict[str, asyncio.Task[Path | None]] = {}
+        self._scan()
+
+    @staticmethod
+    def is_valid(host: str, path: str) -> bool:
+        return host in CDN_HOSTS and _MEDIA_PATH_RE.match(path) is not None
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    async def aclose(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, host: str, path: str) -> Path | None:
+        """Return the local file for ``host``/``path``, downloading it if needed.
+
+        ``None`` means upstream does not have it.
+        """
+        key = f"{host}/{path}"
+        local = self._root / key
+        if local.exists():
+            if key not in self._files:
+                # Downloaded by another worker sharing the directory
+                self._add(key, local)
+            self._touch(key, local)
+            return local
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._download(host, path, local))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._download_done(key, t))
+        return await asyncio.shield(task)
+
+    def _download_done(self, key: str, task: asyncio.Task[Path | None]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _download(self, host: str, path: str, local: Path) -> Path | None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout, transport=self._transport
+            )
+        local.parent.mkdir(parents=True, exist_ok=True)
+        partial: Path | None = None
+        try:
+            async with self._client.stream("GET", f"{CDN_HOSTS[host]}/{path}") as resp:
+                if resp.status_code == 404:
+                    return None
+                resp.raise_for_status()
+                # A name of its own: other workers may be downloading the same file
+                with tempfile.NamedTemporaryFile(
+                    dir=local.parent,
+                    prefix=f".{local.name}.",
+                    suffix=".part",
+                    delete=False,
+                ) as out:
+                    partial = Path(out.name)
+                    async for chunk in resp.aiter_bytes(64 * 1024):
+                        out.write(chunk)
+                modified = _parse_http_date(resp.headers.get("Last-Modified"))
+        except BaseException:
+            if partial is not None:
+                partial.unlink(missing_ok=True)
+            raise
+        if modified is not None:
+            os.utime(partial, (time.time(), modified))
+        partial.replace(local)
+        self._add(f"{host}/{path}", local)
+        return local
+
+    def _add(self, key: str, local: Path) -> None:
+        self._forget(key)
+        self._files[key] = local.stat().st_size
+        self._total_bytes += self._files[key]
+        self._evict()
+
+    def _touch(self, key: str, local: Path) -> None:
+        self._files.move_to_end(key)
+        with contextlib.suppress(OSError):
+            os.utime(local, (time.time(), local.stat().st_mtime))
+
+    def _forget(self, key: str) -> None:
+        size = self._files.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self) -> None:
+        # Keep the newest file even if it alone exceeds the budget
+        while self._total_bytes > self._max_bytes and len(self._files) > 1:
+            key, size = self._files.popitem(last=False)
+            self._total_bytes -= size
+            (self._root / key).unlink(missing_ok=True)
+
+    def _scan(self) -> None:
+        found = []
+        for local in self._root.rglob("*"):
+            if not local.is_file():
+                continue
+            if local.name.startswith("."):
+                # Leftover partial download
+                local.unlink(missing_ok=True)
+                continue
+            stat = local.stat()
+            found.append(
+                (stat.st_atime, local.relative_to(self._root).as_posix(), stat.st_size)
+            )
+        for _, key, size in sorted(found):
+            self._files[key] = size
+            self._total_bytes += size
+        self._evict()
+
+
+def _parse_http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except ValueError:
+        return None
@@ -0,0 +1,367 @@
+import asyncio
+import cProfile
+import marshal
+import math
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableMapping
+from contextlib import AbstractContextManager
+from contextvars import Context, ContextVar, copy_context
+from typing import Any
+from urllib.parse import parse_qs
+
+# Upper bounds in seconds, from a cached page to a slow upstream
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Phase durations of the request being handled, if it is being timed
+_phases: ContextVar[dict[str, float] | None] = ContextVar("phases", default=None)
+
+
+def _credit(phases: dict[str, float], name: str, seconds: float, own: float) -> None:
+    phases[name] = phases.get(name, 0.0) + own
+    parent = _open.get()
+    if parent is not None:
+        parent.nested += seconds
+
+
+class _Phase:
+    __slots__ = ("_name", "_phases", "_started", "_token", "nested")
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self.nested = 0.0
+
+    def __enter__(self) -> None:
+        self._phases = _phases.get()
+        if self._phases is not None:
+            self._token = _open.set(self)
+            self._started = time.perf_counter()
+
+    def __exit__(self, *_exc: object) -> None:
+        if self._phases is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        _open.reset(self._token)
+        _credit(self._phases, self._name, elapsed, elapsed - self.nested)
+
+
+# The innermost phase open in this task, which nested time is taken out of
+_open: ContextVar[_Phase | None] = ContextVar("open_phase", default=None)
+
+
+def phase(name: str) -> AbstractContextManager[None]:
+    """Add the time spent in the block to ``name`` for the current request.
+
+    Phases are exclusive: time spent in a phase nested inside another (or
+    added with ``add_phase``) only counts towards the inner one, so the
+    phases of a request add up to at most its total. A phase costs about a
+    microsecond, so per-post work can be wrapped.
+    """
+    return _Phase(name)
+
+
+def untimed() -> Context:
+    """A copy of the current context in which nothing is timed, for tasks
+    that outlive or run beside the request that starts them."""
+    context = copy_context()
+    context.run(_phases.set, None)
+    context.run(_open.set, None)
+    return context
+
+
+def add_phase(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        _credit(phases, name, seconds, seconds)
+
+
+class Histogram:
+    """Bucketed observations per tuple of label values."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # Label values -> per-bucket counts (the last one is +Inf) and sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series is not None else 0
+
+    def clear(self) -> None:
+        self._series.clear()
+
+    def series(self) -> Iterator[tuple[tuple[str, ...], list[int], float]]:
+        for labels, (counts, total) in self._series.items():
+            yield labels, counts, total[0]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """A sample value without losing precision: ints exactly, floats by repr."""
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(value)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Exposition:
+    """Builds a page in the Prometheus text format (version 0.0.4)."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = "imageboard_explorer_") -> None:
+        self._prefix = prefix
+        self._lines: list[str] = []
+
+    def _header(self, name: str, kind: str, help_text: str) -> str:
+        name = self._prefix + name
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        return name
+
+    def sample(
+        self,
+        kind: str,
+        name: str,
+        help_text: str,
+        values: float | Iterable[tuple[dict[str, str], float]],
+    ) -> None:
+        """A counter or gauge, either a single value or ``(labels, value)`` pairs."""
+        name = self._header(name, kind, help_text)
+        if isinstance(values, int | float):
+            values = [({}, values)]
+        for labels, value in values:
+            rendered = _labels(tuple(labels), tuple(labels.values()))
+            self._lines.append(f"{name}{rendered} {_number(value)}")
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        histogram: Histogram,
+        label_names: tuple[str, ...],
+    ) -> None:
+        name = self._header(name, "histogram", help_text)
+        bounds = [f"{bound:g}" for bound in histogram.buckets] + ["+Inf"]
+        for labels, counts, total in histogram.series():
+            cumulative = 0
+            for bound, count in zip(bounds, counts, strict=True):
+                cumulative += count
+                rendered = _labels(label_names, labels, f'le="{bound}"')
+                self._lines.append(f"{name}_bucket{rendered} {cumulative}")
+            rendered = _labels(label_names, labels)
+            self._lines.append(f"{name}_sum{rendered} {_number(total)}")
+            self._lines.append(f"{name}_count{rendered} {cumulative}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+def route_name(scope: Scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    return getattr(endpoint, "__name__", None) or type(endpoint).__name__.lower()
+
+
+def server_timing(phases: dict[str, float], total: float) -> bytes:
+    """A ``Server-Timing`` header value with each phase and the total in ms."""
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+class RequestMetrics:
+    """ASGI middleware timing each HTTP request and the phases inside it.
+
+    Phases recorded with ``phase`` while the request is handled (including
+    its streamed body) are observed into ``phases`` by route, next to the
+    total; ``responses`` counts status codes by route. Each response also
+    gets a ``Server-Timing`` header with the phases finished by the time its
+    headers are sent, so a streamed page reports only the render of its
+    first chunk there (``/metrics`` has all of it).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        phases: Histogram,
+        responses: Counter[tuple[str, str]],
+    ) -> None:
+        self.app = app
+        self.phases = phases
+        self.responses = responses
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        phases: dict[str, float] = {}
+        token = _phases.set(phases)
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                timing = server_timing(phases, time.perf_counter() - started)
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", timing),
+                ]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _phases.reset(token)
+            route = route_name(scope)
+            self.phases.observe(time.perf_counter() - started, route, "total")
+            for name, seconds in phases.items():
+                self.phases.observe(seconds, route, name)
+            self.responses[route, status] += 1
+
+
+_LOCAL_HOSTS = frozenset({"127.0.0.1", "::1", "localhost"})
+# Set by proxies; a request carrying them is not from this machine
+_PROXY_HEADERS = frozenset({b"forwarded", b"x-forwarded-for", b"x-real-ip"})
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w.-]+", re.ASCII)
+
+
+def _wants_profile(scope: Scope) -> bool:
+    if any(
+        name == b"x-profile" and value not in {b"", b"0"}
+        for name, value in scope["headers"]
+    ):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return any(value not in {"", "0"} for value in query.get("profile", ()))
+
+
+def _is_local(scope: Scope) -> bool:
+    client = scope.get("client")
+    if client is None or client[0] not in _LOCAL_HOSTS:
+        return False
+    return not any(name in _PROXY_HEADERS for name, _ in scope["headers"])
+
+
+class ProfileRequests:
+    """ASGI middleware running a request under ``cProfile`` on demand.
+
+    A request with ``?profile=1`` or an ``X-Profile: 1`` header, made from
+    localhost and not through a proxy, is handled as usual but its response
+    is swapped for the profile: a ``pstats`` dump served as an attachment
+    (open it with ``python -m pstats`` or snakeviz). The original status and
+    ``Server-Timing`` come along as headers. Profiled requests run one at a
+    time; everything else on the event loop meanwhile is in the profile too.
+    Requests from elsewhere asking for a profile get a 403.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _is_local(scope):
+            await _plain(send, 403, b"Profiling is only available from localhost.")
+            return
+        start: Message = {}
+
+        async def capture(message: Message) -> None:
+            # The body is dropped; handling it is part of what gets profiled
+            if message["type"] == "http.response.start":
+                start.update(message)
+
+        async with self._lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profiler.disable()
+        profiler.create_stats()
+        body = marshal.dumps(profiler.stats)
+        # Header values are latin-1; keep the name to safe ASCII
+        path = _UNSAFE_FILENAME_RE.sub("_", scope["path"].strip("/").replace("/", "-"))
+        path = path or "home"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        headers = [
+            (b"content-type", b"application/octet-stream"),
+            (b"content-length", str(len(body)).encode()),
+            (
+                b"content-disposition",
+                f'attachment; filename="{path}-{stamp}.prof"'.encode(),
+            ),
+            (b"x-profiled-status", str(start.get("status", 500)).encode()),
+        ]
+        headers += [
+            (name, value)
+            for name, value in start.get("headers", ())
+            if name == b"server-timing"
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _plain(send: Send, status: int, body: bytes) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+from .metrics import phase
+
 
 class Board(BaseModel):
     board: str
@@ -44,16 +46,45 @@ class Thread(BaseModel):
     posts: list[ThreadPost]
 
 
+def decode(model: type[BaseModel], raw: dict, strict: bool = False) -> dict:
+    """Return the upstream dict for payload building.
+
+    The fast path hands back ``raw`` untouched and payload builders read the
+    few fields they need with ``.get``. With ``strict`` the dict is validated
+    (and coerced) through ``model`` first, which surfaces schema drift.
+    """
+    if strict:
+        with phase("validate"):
+            return model.model_validate(raw).model_dump()
+    return raw
+
+
+# URL prefix of the local media proxy; None links straight to the CDN
+_media_proxy: str | None = None
+
+
+def set_media_proxy(prefix: str | None) -> None:
+    """Point the media URL helpers at the local proxy mounted at ``prefix``."""
+    global _media_proxy  # noqa: PLW0603 - process-wide switch set at startup
+    _media_proxy = prefix.rstrip("/") if prefix else None
+
+
+def _cdn_url(host: str, path: str) -> str:
+    if _media_proxy is not None:
+        return f"{_media_proxy}/{host}/{path}"
+    return f"https://{host}.4cdn.org/{path}"
+
+
 def thumbnail_url(board: str, tim: int | None) -> str | None:
     if not tim:
         return None
-    return f"https://i.4cdn.org/{board}/{tim}s.jpg"
+    return _cdn_url("i", f"{board}/{tim}s.jpg")
 
 
 def image_url(board: str, tim: int | None, ext: str | None) -> str | None:
     if not tim or not ext:
         return None
-    return f"https://i.4cdn.org/{board}/{tim}{ext}"
+    return _cdn_url("i", f"{board}/{tim}{ext}")
 
 
 IMAGE_EXTS = {
@@ -100,4 +131,4 @@ def country_flag_url(country_code: str | None) -> str | None:
     """Generate country flag URL from country code."""
     if not country_code:
         return None
-    return f"https://s.4cdn.org/image/country/{country_code.lower()}.gif"
+    return _cdn_url("s", f"image/country/{country_code.lower()}.gif")
@@ -0,0 +1,94 @@
+import gzip
+from collections import OrderedDict
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # optional: pip install imageboard-explorer[brotli]
+    brotli = None
+
+# Bodies smaller than this are sent as they are
+MIN_COMPRESS_BYTES = 1024
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str:
+    """Pick ``br``, ``gzip`` or ``identity`` from an ``Accept-Encoding`` header."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q" and _quality(value) <= 0:
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def _quality(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def content_encoding(body: bytes, encoding: str) -> str:
+    """The encoding a body is sent in: the negotiated one unless it is tiny."""
+    return "identity" if len(body) < MIN_COMPRESS_BYTES else encoding
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return bytes(brotli.compress(body, quality=5))
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+class PageCache:
+    """Byte-bounded LRU of encoded page bodies, keyed by ETag and encoding.
+
+    A hit skips both rendering and compression. ETags cover everything a
+    page is rendered from, so entries never need invalidating; pages whose
+    upstream data changed simply stop being asked for and age out.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024) -> None:
+        self._max_bytes = max_bytes
+        self._bodies: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, etag: str, encoding: str) -> tuple[bytes, str] | None:
+        """The body for ``etag`` in ``encoding`` and that encoding, or the
+        uncompressed body of a page too small to compress."""
+        for key in ((etag, encoding), (etag, "identity")):
+            body = self._bodies.get(key)
+            if body is None:
+                continue
+            if key[1] != encoding and len(body) >= MIN_COMPRESS_BYTES:
+                # Stored for a client that takes no compression
+                break
+            self._bodies.move_to_end(key)
+            self.hits += 1
+            return body, key[1]
+        self.misses += 1
+        return None
+
+    def set(self, etag: str, encoding: str, body: bytes) -> None:
+        if len(body) > self._max_bytes:
+            return
+        old = self._bodies.pop((etag, encoding), None)
+        if old is not None:
+            self._total_bytes -= len(old)
+        self._bodies[(etag, encoding)] = body
+        self._total_bytes += len(body)
+        while self._total_bytes > self._max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._total_bytes -= len(evicted)
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from functools import partial
+
+from .clients.chan_api import ChanAPIClient, Priority
+
+PrefetchKey = tuple[str, int]
+
+
+@dataclass
+class PrefetchStats:
+    fetched: int = 0
+    # Opened after the prefetch landed
+    used: int = 0
+    # Never opened within the window
+    wasted: int = 0
+    # Opened while the prefetch was still queued (the page load took it over)
+    late: int = 0
+    skipped_budget: int = 0
+    cancelled: int = 0
+    failed: int = 0
+
+
+@dataclass
+class _Budget:
+    tokens: float
+    updated_at: float = field(default_factory=time.monotonic)
+
+
+class Prefetcher:
+    """Warms thread JSON for the threads a catalog viewer is likely to open next.
+
+    Fetches run at ``Priority.PREFETCH`` so they only use rate-limiter slots
+    that nothing else wants. Each board has a token bucket of
+    ``budget_per_minute`` upstream fetches; a new catalog view for a board
+    cancels that board's queued prefetches that are no longer wanted.
+    """
+
+    def __init__(
+        self,
+        client: ChanAPIClient,
+        *,
+        depth: int = 3,
+        budget_per_minute: float = 20.0,
+        ttl_seconds: float = 10.0,
+        window_seconds: float = 300.0,
+        max_tracked: int = 512,
+    ) -> None:
+        self._client = client
+        self._depth = depth
+        self._budget_per_minute = budget_per_minute
+        self._ttl = ttl_seconds
+        self._window = window_seconds
+        self._max_tracked = max_tracked
+        self._budgets: dict[str, _Budget] = {}
+        self._tasks: dict[PrefetchKey, asyncio.Task[None]] = {}
+        self._opened_early: set[PrefetchKey] = set()
+        # Prefetched and not yet opened, oldest first
+        self._warmed: OrderedDict[PrefetchKey, float] = OrderedDict()
+        self.stats = PrefetchStats()
+
+    async def schedule(self, board: str, thread_ids: Sequence[int]) -> None:
+        """Prefetch the first thread in ``thread_ids`` and the ``depth`` after it.
+
+        Async only so that it runs on the event loop when used as a
+        response background task.
+        """
+        wanted = list(thread_ids[: self._depth + 1])
+        for key, task in list(self._tasks.items()):
+            if key[0] == board and key[1] not in wanted:
+                task.cancel()
+        for thread_id in wanted:
+            key = (board, thread_id)
+            if key in self._tasks or key in self._warmed:
+                continue
+            entry = await self._client.peek(self._path(key))
+            # A concurrent call may have started it while the cache was read
+            if key in self._tasks or (entry is not None and entry.is_fresh()):
+                continue
+            if not self._take_token(board):
+                self.stats.skipped_budget += 1
+                break
+            task = asyncio.create_task(self._warm(key))
+            self._tasks[key] = task
+            task.add_done_callback(partial(self._done, key))
+
+    def note_opened(self, board: str, thread_id: int) -> None:
+        key = (board, thread_id)
+        if key in self._tasks:
+            self._opened_early.add(key)
+        elif self._warmed.pop(key, None) is not None:
+            self.stats.used += 1
+        self._expire(time.monotonic())
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    @staticmethod
+    def _path(key: PrefetchKey) -> str:
+        return f"/{key[0]}/thread/{key[1]}.json"
+
+    async def _warm(self, key: PrefetchKey) -> None:
+        await self._client.fetch_entry(self._path(key), self._ttl, Priority.PREFETCH)
+
+    def _done(self, key: PrefetchKey, task: asyncio.Task[None]) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        early = key in self._opened_early
+        self._opened_early.discard(key)
+        if task.cancelled():
+            self.stats.cancelled += 1
+        elif task.exception() is not None:
+            self.stats.failed += 1
+        else:
+            self.stats.fetched += 1
+            if early:
+                self.stats.late += 1
+            else:
+                self._warmed[key] = time.monotonic()
+        self._expire(time.monotonic())
+
+    def _expire(self, now: float) -> None:
+        while self._warmed:
+            key, warmed_at = next(iter(self._warmed.items()))
+            if (
+                now - warmed_at < self._window
+                and len(self._warmed) <= self._max_tracked
+            ):
+                break
+            del self._warmed[key]
+            self.stats.wasted += 1
+
+    def _take_token(self, board: str) -> bool:
+        now = time.monotonic()
+        budget = self._budgets.get(board)
+        if budget is None:
+            budget = self._budgets[board] = _Budget(self._budget_per_minute, now)
+        budget.tokens = min(
+            self._budget_per_minute,
+            budget.tokens + (now - budget.updated_at) * self._budget_per_minute / 60,
+        )
+        budget.updated_at = now
+        if budget.tokens < 1:
+            return False
+        budget.tokens -= 1
+        return True
@@ -0,0 +1,214 @@
+import heapq
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .clients.chan_api import CacheEntry
+from .text import html_to_text, parse_comment
+
+_SOURCE_RE = re.compile(r"/([a-z0-9]+)/(?:catalog|thread/(\d+))\.json$")
+_TOKEN_RE = re.compile(r"\w{2,}|\d")
+_SNIPPET_CHARS = 160
+# Document ids are the post number with the board's slot in the low bits, so
+# sorting ids sorts posts newest first within and across boards
+_BOARD_BITS = 10
+
+# Rough per-object costs behind ``SearchIndex.total_bytes``, fitted against
+# tracemalloc by bench_search.py
+_DOC_BYTES = 800
+_POSTING_BYTES = 90
+_TERM_BYTES = 450
+
+
+def tokenize(text: str) -> set[str]:
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+@dataclass(slots=True)
+class SearchHit:
+    board: str
+    thread: int
+    no: int
+    subject: str
+    text: str
+    file_name: str | None
+
+    @property
+    def href(self) -> str:
+        return f"/board/{self.board}/thread/{self.thread}?selected={self.no}"
+
+
+@dataclass(slots=True)
+class _Doc:
+    hit: SearchHit
+    # Hash of the upstream fields it was built from, to skip unchanged posts
+    fields: int
+    terms: tuple[str, ...]
+    cost: int
+    # Sources (catalog and/or thread) that contain the post
+    refs: int = 1
+
+
+@dataclass
+class SearchStats:
+    evicted_sources: int = 0
+    indexed_posts: int = 0
+    index_seconds: float = 0.0
+
+
+class SearchIndex:
+    """Inverted index over the catalogs and threads held in the response cache.
+
+    ``update`` is called with every response the client stores and only
+    re-tokenizes posts whose subject, comment or file name changed;
+    ``discard`` drops a response's postings when the cache evicts it. Posts
+    are keyed by board and number, so a thread's first post indexed from both
+    the catalog and the thread is one document. Past ``max_bytes`` (an
+    estimate) the least recently updated responses are dropped as well.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self._max_bytes = max_bytes
+        self._docs: dict[int, _Doc] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._boards: dict[str, int] = {}
+        # Source URL -> documents it contributed, least recently updated first
+        self._sources: OrderedDict[str, set[int]] = OrderedDict()
+        # Source URL -> the version indexed: its Last-Modified, or the data
+        # itself without one (a string doesn't keep a decoded response alive
+        # once the cache only holds it compressed)
+        self._sources_version: dict[str, object] = {}
+        self._total_bytes = 0
+        self.stats = SearchStats()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    @property
+    def document_count(self) -> int:
+        return len(self._docs)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def update(self, url: str, entry: CacheEntry) -> None:
+        match = _SOURCE_RE.search(url)
+        version = self._sources_version.get(url)
+        if match is None or version is entry.data:
+            return
+        if entry.last_modified is not None and version == entry.last_modified:
+            return
+        started = time.perf_counter()
+        board, thread = match.group(1), match.group(2)
+        if thread is None:
+            posts = [
+                (item["no"], item)
+                for page in entry.data
+                for item in page.get("threads", [])
+            ]
+        else:
+            posts = [(int(thread), post) for post in entry.data.get("posts", [])]
+
+        slot = self._boards.setdefault(board, len(self._boards))
+        previous = self._sources.pop(url, set())
+        ids = set()
+        for thread_no, post in posts:
+            doc_id = post["no"] << _BOARD_BITS | slot
+            ids.add(doc_id)
+            self._add(doc_id, board, thread_no, post, new_ref=doc_id not in previous)
+        for doc_id in previous - ids:
+            self._release(doc_id)
+        self._sources[url] = ids
+        self._sources_version[url] = (
+            entry.last_modified if entry.last_modified is not None else entry.data
+        )
+        self.stats.index_seconds += time.perf_counter() - started
+        self._enforce_budget()
+
+    def discard(self, url: str) -> None:
+        ids = self._sources.pop(url, None)
+        if ids is None:
+            return
+        del self._sources_version[url]
+        for doc_id in ids:
+            self._release(doc_id)
+
+    def search(
+        self, query: str, board: str | None = None, limit: int = 50
+    ) -> list[SearchHit]:
+        """Posts containing every term of ``query``, newest first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if board is not None:
+            terms.add(f"/{board}/")
+        postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+        matches = (
+            postings[0].intersection(*postings[1:]) if postings[1:] else postings[0]
+        )
+        return [self._docs[doc_id].hit for doc_id in heapq.nlargest(limit, matches)]
+
+    def _add(
+        self, doc_id: int, board: str, thread_no: int, post: dict, *, new_ref: bool
+    ) -> None:
+        sub, com, filename = post.get("sub"), post.get("com"), post.get("filename")
+        fields = hash((sub, com, filename))
+        doc = self._docs.get(doc_id)
+        if doc is not None and doc.fields == fields:
+            doc.refs += new_ref
+            return
+        refs = int(new_ref)
+        if doc is not None:
+            refs += doc.refs
+            self._remove(doc_id, doc)
+        subject = html_to_text(sub)
+        text = parse_comment(com).text
+        ext = post.get("ext")
+        file_name = f"{filename}{ext}" if filename and ext else None
+        no = post["no"]
+        terms = tokenize(f"{subject} {text} {file_name or ''}")
+        terms.update((str(no), f"/{board}/"))
+        snippet = text[:_SNIPPET_CHARS]
+        doc = _Doc(
+            SearchHit(board, thread_no, no, subject, snippet, file_name),
+            fields,
+            tuple(terms),
+            _DOC_BYTES + len(subject) + len(snippet) + _POSTING_BYTES * len(terms),
+            refs,
+        )
+        self._docs[doc_id] = doc
+        self._total_bytes += doc.cost
+        for term in terms:
+            ids = self._postings.get(term)
+            if ids is None:
+                ids = self._postings[term] = set()
+                self._total_bytes += _TERM_BYTES + len(term)
+            ids.add(doc_id)
+        self.stats.indexed_posts += 1
+
+    def _release(self, doc_id: int) -> None:
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            return
+        doc.refs -= 1
+        if doc.refs <= 0:
+            self._remove(doc_id, doc)
+
+    def _remove(self, doc_id: int, doc: _Doc) -> None:
+        del self._docs[doc_id]
+        self._total_bytes -= doc.cost
+        for term in doc.terms:
+            ids = self._postings[term]
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[term]
+                self._total_bytes -= _TERM_BYTES + len(term)
+
+    def _enforce_budget(self) -> None:
+        # Keep the newest source even if it alone exceeds the budget
+        while self._total_bytes > self._max_bytes and len(self._sources) > 1:
+            self.discard(next(iter(self._sources)))
+            self.stats.evicted_sources += 1
@@ -0,0 +1,90 @@
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from typing import Self
+
+ENV_PREFIX = "IMAGEBOARD_EXPLORER_"
+
+
+def _parse(value: str, kind: object) -> object:
+    if kind in (bool, "bool"):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if kind in (int, "int"):
+        return int(value)
+    if kind in (float, "float"):
+        return float(value)
+    return value or None
+
+
+@dataclass
+class Settings:
+    """Runtime switches, overridable via ``IMAGEBOARD_EXPLORER_<NAME>`` variables.
+
+    Settings travel through the environment so that every uvicorn worker
+    process sees the same configuration as the CLI that started it.
+    """
+
+    # Base URL of the 4chan API (point it at a local stand-in for load tests)
+    upstream_url: str = "https://a.4cdn.org"
+    # Validate upstream JSON with the pydantic models (slower; for debugging)
+    strict_models: bool = False
+    # How long expired responses may still be served while being revalidated
+    stale_grace_seconds: float = 300.0
+    # SQLite file for a response cache that survives restarts (memory only if unset)
+    cache_path: str | None = None
+    # Memory budget of decoded upstream responses, approximated from their size
+    response_cache_bytes: int = 64 * 1024 * 1024
+    # Keep cached responses zlib-compressed, decoding them when they are used
+    compress_responses: bool = False
+    # With compressed responses, memory for decoded copies of the hottest ones
+    decoded_cache_bytes: int = 16 * 1024 * 1024
+    # SQLite file holding a rate limiter shared by all worker processes
+    rate_limit_path: str | None = None
+    # Worker processes; each runs its own background tasks on a share of the budgets
+    workers: int = 1
+    # Seconds between polls of an active board's threads.json (0 = off)
+    index_poll_seconds: float = 15.0
+    # Stream thread pages with at least this many posts (0 = never)
+    stream_min_posts: int = 0
+    # Catalog threads rendered around the selection (0 = render all)
+    catalog_window: int = 0
+    # Directory for the local media proxy's disk cache (proxy off if unset)
+    media_cache_path: str | None = None
+    # Size budget of the media cache in bytes
+    media_cache_bytes: int = 512 * 1024 * 1024
+    # Memory for encoded bodies of recently served pages (0 = off)
+    page_cache_bytes: int = 8 * 1024 * 1024
+    # Memory budget of the /search index over cached posts (0 = search off)
+    search_index_bytes: int = 0
+    # Threads after the selected one to prefetch from a catalog view (0 = off)
+    prefetch_depth: int = 0
+    # Upstream prefetches allowed per board per minute
+    prefetch_budget: float = 20.0
+    # Comma-separated boards on /overview, refreshed in the background (off if unset)
+    overview_boards: str | None = None
+    # Threads shown per board on /overview
+    overview_threads: int = 5
+    # Background catalog refreshes allowed per minute across all overview boards
+    overview_budget: float = 6.0
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] | None = None) -> Self:
+        if environ is None:
+            environ = os.environ
+        values = {}
+        for field in fields(cls):
+            raw = environ.get(f"{ENV_PREFIX}{field.name.upper()}")
+            if raw is not None:
+                values[field.name] = _parse(raw, field.type)
+        return cls(**values)  # type: ignore[arg-type]
+
+    def to_env(self) -> dict[str, str]:
+        env = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            env[f"{ENV_PREFIX}{field.name.upper()}"] = str(value)
+        return env
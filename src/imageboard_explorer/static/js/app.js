@@ -1,12 +1,26 @@
 (function () {
-  const items = Array.from(document.querySelectorAll('.selectable'));
-  const screen = document.body.dataset.screen || '';
-  const descriptionEl = document.getElementById('board-description');
-  const rofiOverlay = document.getElementById('board-search');
-  const rofiQuery = document.getElementById('rofi-query');
-  const rofiResults = document.getElementById('rofi-results');
-
-  let index = items.findIndex((item) => item.classList.contains('selected'));
+  const mainEl = document.querySelector('.app-main');
+  const statusEl = document.querySelector('.status-bar');
+  const windowMargin = 5;
+  // Pages left by in-place navigation, restored on back/forward
+  const snapshots = new Map();
+  const snapshotLimit = 20;
+
+  let items = [];
+  let screen = '';
+  let descriptionEl = null;
+  let rofiOverlay = null;
+  let rofiQuery = null;
+  let rofiResults = null;
+
+  // Windowed catalog: only part of the list is rendered, the rest is fetched
+  let windowList = null;
+  let windowCount = 0;
+  let windowTotal = 0;
+  let windowStart = 0;
+  let windowLoading = false;
+
+  let index = -1;
   let activeLinkIndex = -1;
   let linkRows = [];
   let activeRowIndex = -1;
@@ -15,10 +29,8 @@
   let rofiSelection = 0;
   let rofiMatches = [];
   let boardDataset = [];
-  if (index < 0 && items.length) {
-    index = 0;
-    items[0].classList.add('selected');
-  }
+  let navigating = false;
+  let currentKey = pageKey(window.location.href);
 
   function buildBoardDataset() {
     if (screen !== 'home') {
@@ -161,6 +173,75 @@
     });
   }
 
+  function loadCatalogWindow(forward) {
+    if (!windowList || windowLoading) {
+      return Promise.resolve(0);
+    }
+    const windowEnd = windowStart + items.length;
+    if (forward ? windowEnd >= windowTotal : windowStart <= 0) {
+      return Promise.resolve(0);
+    }
+    const start = forward ? windowEnd : Math.max(0, windowStart - windowCount);
+    const count = forward ? windowCount : windowStart - start;
+    const list = windowList;
+    windowLoading = true;
+    return fetch(`${windowList.dataset.src}?start=${start}&count=${count}`)
+      .then((response) => (response.ok ? response.text() : ''))
+      .then((html) => {
+        if (list !== windowList) {
+          return 0;
+        }
+        const template = document.createElement('template');
+        template.innerHTML = html;
+        const known = new Set(items.map((item) => item.getAttribute('data-thread-id')));
+        const cards = Array.from(template.content.querySelectorAll('.selectable')).filter(
+          (card) => !known.has(card.getAttribute('data-thread-id')),
+        );
+        if (forward) {
+          windowList.append(...cards);
+          items.push(...cards);
+        } else {
+          windowList.prepend(...cards);
+          items.unshift(...cards);
+          index += cards.length;
+          windowStart -= cards.length;
+          windowList.dataset.start = String(windowStart);
+        }
+        return cards.length;
+      })
+      .catch(() => 0)
+      .finally(() => {
+        if (list === windowList) {
+          windowLoading = false;
+        }
+      });
+  }
+
+  function ensureCatalogWindow() {
+    if (!windowList) {
+      return;
+    }
+    if (items.length - 1 - index < windowMargin) {
+      loadCatalogWindow(true);
+    } else if (index < windowMargin) {
+      loadCatalogWindow(false);
+    }
+  }
+
+  function moveSelection(delta) {
+    const nextIndex = index + delta;
+    if (windowList && (nextIndex < 0 || nextIndex >= items.length)) {
+      // At the edge of what is rendered: fetch more, then move
+      loadCatalogWindow(delta > 0).then((added) => {
+        if (added) {
+          setSelected(index + delta, true);
+        }
+      });
+      return;
+    }
+    setSelected(nextIndex, true);
+  }
+
   function setSelected(nextIndex, shouldScroll) {
     if (!items.length || nextIndex < 0 || nextIndex >= items.length) {
       return;
@@ -177,6 +258,8 @@
     if (shouldScroll) {
       item.scrollIntoView({ block: 'center', behavior: 'smooth' });
     }
+    rememberSelection();
+    ensureCatalogWindow();
   }
 
   function setSelectedByElement(element, shouldScroll) {
@@ -202,28 +285,224 @@
     return true;
   }
 
-  if (items.length) {
-    updateDescription(items[index]);
-    linkRows = buildLinkRows(items[index]);
+  function initScreen() {
+    items = Array.from(document.querySelectorAll('.selectable'));
+    screen = document.body.dataset.screen || '';
+    descriptionEl = document.getElementById('board-description');
+    rofiOverlay = document.getElementById('board-search');
+    rofiQuery = document.getElementById('rofi-query');
+    rofiResults = document.getElementById('rofi-results');
+    isRofiOpen = false;
+
+    windowList = document.querySelector('.thread-list[data-total]');
+    windowCount = windowList ? Number(windowList.dataset.count) || 30 : 0;
+    windowTotal = windowList ? Number(windowList.dataset.total) || 0 : 0;
+    windowStart = windowList ? Number(windowList.dataset.start) || 0 : 0;
+    windowLoading = false;
+
+    index = items.findIndex((item) => item.classList.contains('selected'));
+    activeLinkIndex = -1;
+    activeRowIndex = -1;
+    linkRows = [];
+    if (index < 0 && items.length) {
+      index = 0;
+      items[0].classList.add('selected');
+    }
+    if (items.length) {
+      updateDescription(items[index]);
+      linkRows = buildLinkRows(items[index]);
+    }
+    boardDataset = buildBoardDataset();
+    ensureCatalogWindow();
+    const searchInput = document.querySelector('.search-input');
+    if (searchInput && !searchInput.value) {
+      searchInput.focus();
+    }
   }
-  boardDataset = buildBoardDataset();
 
-  window.addEventListener('pageshow', () => {
-    if (screen === 'home' && sessionStorage.getItem('rofiNavigated')) {
-      closeRofi();
-      sessionStorage.removeItem('rofiNavigated');
+  function pageKey(href) {
+    // Pages differ by path and query, but not by selection
+    const url = new URL(href, window.location.href);
+    url.searchParams.delete('selected');
+    url.searchParams.delete('fragment');
+    return url.pathname + url.search;
+  }
+
+  function itemId(item) {
+    return item.getAttribute('data-post-id') ||
+      item.getAttribute('data-thread-id') ||
+      item.getAttribute('data-board') ||
+      '';
+  }
+
+  function rememberSelection() {
+    // Keep ?selected= in the address bar so reloads and history land on the
+    // same item; no request is made
+    const item = items[index];
+    const id = item ? itemId(item) : '';
+    if (!id) {
+      return;
     }
+    const url = new URL(window.location.href);
+    if (url.searchParams.get('selected') === id) {
+      return;
+    }
+    url.searchParams.set('selected', id);
+    try {
+      window.history.replaceState(window.history.state, '', url);
+    } catch (error) {
+      // Some browsers rate-limit history updates; the next move retries
+    }
+  }
+
+  function takeSnapshot() {
+    return {
+      screen,
+      title: document.title,
+      main: mainEl.innerHTML,
+      status: statusEl.innerHTML,
+    };
+  }
+
+  function parseFragment(html) {
+    const template = document.createElement('template');
+    template.innerHTML = html;
+    const fragment = template.content.querySelector('.fragment');
+    if (!fragment) {
+      return null;
+    }
+    return {
+      screen: fragment.dataset.screen || '',
+      title: fragment.dataset.title || document.title,
+      main: fragment.querySelector('.fragment-content').innerHTML,
+      status: fragment.querySelector('.fragment-status').innerHTML,
+    };
+  }
+
+  function showSnapshot(snapshot) {
+    mainEl.innerHTML = snapshot.main;
+    statusEl.innerHTML = snapshot.status;
+    document.body.dataset.screen = snapshot.screen;
+    document.title = snapshot.title;
+    currentKey = pageKey(window.location.href);
+    initScreen();
+    const selected = new URL(window.location.href).searchParams.get('selected');
+    const target = selected ? items.find((item) => itemId(item) === selected) : null;
+    if (target) {
+      setSelectedByElement(target, false);
+    }
+    if (items.length) {
+      items[index].scrollIntoView({ block: 'center' });
+    } else {
+      window.scrollTo(0, 0);
+    }
+  }
+
+  function saveSnapshot(key) {
+    snapshots.delete(key);
+    snapshots.set(key, takeSnapshot());
+    while (snapshots.size > snapshotLimit) {
+      snapshots.delete(snapshots.keys().next().value);
+    }
+  }
+
+  function loadFragment(href) {
+    const url = new URL(href, window.location.href);
+    url.searchParams.set('fragment', '1');
+    // Error pages are fragments too; anything else falls back to a page load
+    return fetch(url).then((response) => response.text()).then(parseFragment);
+  }
+
+  function navigate(href) {
+    if (!mainEl || !statusEl) {
+      window.location.href = href;
+      return;
+    }
+    if (navigating) {
+      return;
+    }
+    navigating = true;
+    loadFragment(href)
+      .then((snapshot) => {
+        if (!snapshot) {
+          throw new Error('not a fragment');
+        }
+        saveSnapshot(currentKey);
+        window.history.pushState({ fragment: true }, '', href);
+        showSnapshot(snapshot);
+      })
+      .catch(() => {
+        window.location.href = href;
+      })
+      .finally(() => {
+        navigating = false;
+      });
+  }
+
+  function restoreLocation() {
+    const snapshot = snapshots.get(pageKey(window.location.href));
+    if (snapshot) {
+      showSnapshot(snapshot);
+      return;
+    }
+    navigating = true;
+    loadFragment(window.location.href)
+      .then((loaded) => {
+        if (!loaded) {
+          throw new Error('not a fragment');
+        }
+        showSnapshot(loaded);
+      })
+      .catch(() => {
+        window.location.reload();
+      })
+      .finally(() => {
+        navigating = false;
+      });
+  }
+
+  initScreen();
+
+  window.addEventListener('popstate', () => {
+    saveSnapshot(currentKey);
+    restoreLocation();
+  });
+
+  document.addEventListener('submit', (event) => {
+    const form = event.target;
+    if (!form.classList.contains('search-form')) {
+      return;
+    }
+    event.preventDefault();
+    const params = new URLSearchParams(new FormData(form));
+    navigate(`${form.getAttribute('action')}?${params}`);
   });
 
   document.addEventListener('keydown', (event) => {
     const activeTag = document.activeElement ? document.activeElement.tagName : '';
     if (activeTag === 'INPUT' || activeTag === 'TEXTAREA') {
+      if (event.key === 'Escape') {
+        document.activeElement.blur();
+      }
+      return;
+    }
+
+    if (event.key === '/' && !isRofiOpen && document.body.dataset.search) {
+      event.preventDefault();
+      const searchInput = document.querySelector('.search-input');
+      if (searchInput) {
+        searchInput.focus();
+        searchInput.select();
+      } else {
+        navigate('/search');
+      }
       return;
     }
 
     if (event.key === 'h' || event.key === 'H') {
       event.preventDefault();
-      window.location.href = '/';
+      closeRofi();
+      navigate('/');
       return;
     }
 
@@ -276,8 +555,8 @@
           event.preventDefault();
           const target = rofiMatches[rofiSelection];
           if (target && target.href) {
-            sessionStorage.setItem('rofiNavigated', '1');
-            window.location.href = target.href;
+            closeRofi();
+            navigate(target.href);
           }
           return;
         }
@@ -297,13 +576,13 @@
 
     if (event.key === 'ArrowDown' || event.key === 'j') {
       event.preventDefault();
-      setSelected(index + 1, true);
+      moveSelection(1);
       return;
     }
 
     if (event.key === 'ArrowUp' || event.key === 'k') {
       event.preventDefault();
-      setSelected(index - 1, true);
+      moveSelection(-1);
       return;
     }
 
@@ -311,7 +590,7 @@
       const item = items[index];
       const href = item.getAttribute('data-href');
       if (href) {
-        window.location.href = href;
+        navigate(href);
       }
     }
 
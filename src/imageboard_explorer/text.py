@@ -1,13 +1,33 @@
 import html
 import re
+from functools import lru_cache
 from urllib.parse import urlparse
 
-_BR_RE = re.compile(r"(<br\s*/?>)+", re.IGNORECASE)
+# Same as (<br\s*/?>)+ but unrolled, which keeps re's fast prefix search
+_BR_RE = re.compile(r"<br\s*/?>(?:<br\s*/?>)*", re.IGNORECASE)
 _QUOTELINK_RE = re.compile(r'<a[^>]*class="quotelink"[^>]*>(.*?)</a>', re.IGNORECASE)
 _TAG_RE = re.compile(r"<[^>]+>")
 _QUOTE_MARK_RE = re.compile(r"&gt;&gt;(\d+)")
 _QUOTE_TEXT_RE = re.compile(r">>(\d+)")
 _URL_RE = re.compile(r"(https?://[^\s<]+)")
+# Quotes and URLs in plain text. A URL ends where a ">>123" quote begins,
+# matching how text_to_html splits them.
+_INLINE_RE = re.compile(r">>(\d+)|(https?://(?:[^\s>]|>(?!>\d))+)")
+# Recently parsed comments, shared by thread rendering and the search index
+_PARSED_COMMENTS = 2048
+# A tag with no stray "<" in it; where one is left over, html_to_text's
+# quotelink and tag passes could disagree with a single tag pass
+_PLAIN_TAG_RE = re.compile(r"<[^<>]+>")
+# The entities upstream escapes comments with, decoded without html.unescape
+_ENTITIES = (("&gt;", ">"), ("&lt;", "<"), ("&quot;", '"'), ("&#039;", "'"))
+
+TEXT = "text"
+BREAK = "break"
+QUOTE = "quote"
+HEADER_QUOTE = "header_quote"
+URL = "url"
+
+Token = tuple[str, str]
 
 
 def _is_safe_url(url: str) -> bool:
@@ -19,6 +39,14 @@ def _is_safe_url(url: str) -> bool:
         return False
 
 
+def _is_plain_http_url(url: str) -> bool:
+    # _INLINE_RE already guarantees an http(s) scheme; urlparse can only reject
+    # bracketed hosts or odd non-ASCII netlocs, so skip it for everything else.
+    if url.isascii() and "[" not in url and "]" not in url:
+        return True
+    return _is_safe_url(url)
+
+
 def html_to_text(raw: str | None) -> str:
     if not raw:
         return ""
@@ -103,3 +131,148 @@ def text_to_html(text: str) -> str:
 
     escaped = _URL_RE.sub(replace_url, escaped)
     return escaped
+
+
+def _tokenize_line(line: str, tokens: list[Token]) -> None:
+    # Most lines hold neither quotes nor links; skip the regex for those
+    if ">>" not in line and "http" not in line:
+        if line:
+            tokens.append((TEXT, line))
+        return
+    position = 0
+    for match in _INLINE_RE.finditer(line):
+        start = match.start()
+        if start > position:
+            tokens.append((TEXT, line[position:start]))
+        quote_id = match.group(1)
+        if quote_id is not None:
+            tokens.append((QUOTE, quote_id))
+        else:
+            tokens.append((URL, match.group(2)))
+        position = match.end()
+    if position < len(line):
+        tokens.append((TEXT, line[position:]))
+
+
+def _header_quotes(line: str) -> list[str] | None:
+    stripped = line.strip()
+    if not stripped.startswith(">>"):
+        return None
+    quotes = _QUOTE_TEXT_RE.findall(stripped)
+    if not quotes or _QUOTE_TEXT_RE.sub("", stripped).strip():
+        return None
+    return quotes
+
+
+def tokenize_comment(text: str) -> list[Token]:
+    """Split comment plaintext into a token stream in a single pass.
+
+    Leading lines made up only of quotes become ``HEADER_QUOTE`` tokens (blank
+    lines among them are dropped); the rest is ``TEXT``/``QUOTE``/``URL``
+    tokens with a ``BREAK`` between lines.
+    """
+    tokens: list[Token] = []
+    lines = text.splitlines()
+    body_start = len(lines)
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        header = _header_quotes(line)
+        if header is None:
+            body_start = index
+            break
+        tokens.extend((HEADER_QUOTE, quote_id) for quote_id in header)
+    if body_start < len(lines):
+        _tokenize_line(lines[body_start].lstrip(), tokens)
+        for line in lines[body_start + 1 :]:
+            tokens.append((BREAK, "\n"))
+            _tokenize_line(line, tokens)
+    return tokens
+
+
+def render_tokens(tokens: list[Token]) -> str:
+    """Render body tokens to the same safe HTML as ``text_to_html``."""
+    parts = []
+    for kind, value in tokens:
+        if kind == TEXT:
+            parts.append(html.escape(value))
+        elif kind == BREAK:
+            parts.append("<br>")
+        elif kind == QUOTE:
+            parts.append(
+                f'<span class="nav-link link-quote" data-quote-id="{value}">'
+                f"&gt;&gt;{value}</span>"
+            )
+        elif kind == URL:
+            url = html.escape(value)
+            if _is_plain_http_url(url):
+                parts.append(
+                    f'<span class="nav-link link-external" data-url="{url}">{url}</span>'
+                )
+            else:
+                parts.append(url)
+    return "".join(parts)
+
+
+class ParsedComment:
+    """A comment tokenized once, with everything the templates need."""
+
+    __slots__ = ("body_html", "body_quotes", "header_quotes", "text", "tokens")
+
+    def __init__(self, text: str, tokens: list[Token]) -> None:
+        self.text = text
+        self.tokens = tokens
+        # Tuples: memoized results end up in every payload built from them
+        self.header_quotes = tuple(
+            value for kind, value in tokens if kind == HEADER_QUOTE
+        )
+        self.body_quotes = tuple(value for kind, value in tokens if kind == QUOTE)
+        self.body_html = render_tokens(tokens)
+
+    @property
+    def all_quotes(self) -> list[str]:
+        return [*self.header_quotes, *self.body_quotes]
+
+
+@lru_cache(maxsize=_PARSED_COMMENTS)
+def parse_comment(raw: str | None) -> ParsedComment:
+    """Parse raw comment HTML once.
+
+    Equivalent to running ``html_to_text`` and then ``extract_quotes``,
+    ``strip_header_quotes`` + ``text_to_html`` and ``extract_all_quotes`` on
+    the result, without the repeated scans: the HTML is cleaned with one tag
+    pass and its lines are tokenized as they come out. The most recent
+    results are memoized, so a post the search index just read renders
+    without parsing again; treat them as read-only.
+    """
+    text = _comment_text(raw)
+    if text is None:
+        text = html_to_text(raw)
+    return ParsedComment(text, tokenize_comment(text))
+
+
+def _unescape(text: str) -> str:
+    plain = text
+    for entity, char in _ENTITIES:
+        plain = plain.replace(entity, char)
+    if plain.count("&") != plain.count("&amp;"):
+        return html.unescape(text)
+    return plain.replace("&amp;", "&")
+
+
+def _comment_text(raw: str | None) -> str | None:
+    """``html_to_text(raw)`` for well-formed HTML, None if a stray ``<`` is in it.
+
+    Without stray brackets quotelinks need no pass of their own, as
+    stripping their tags leaves the same text.
+    """
+    if not raw:
+        return ""
+    text = _BR_RE.sub("\n", raw.replace("<wbr>", ""))
+    if "<" in text:
+        text = _PLAIN_TAG_RE.sub("", text)
+        if "<" in text:
+            return None
+    if "&" in text:
+        text = _unescape(text)
+    return text.strip()
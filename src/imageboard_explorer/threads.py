@@ -0,0 +1,245 @@
+from bisect import insort
+from typing import Any
+
+from .clients.chan_api import CacheEntry
+from .metrics import phase
+from .models import (
+    ThreadPost,
+    country_flag_url,
+    decode,
+    format_bytes,
+    image_url,
+    media_kind,
+    thumbnail_url,
+)
+from .text import ParsedComment, parse_comment, text_to_html
+
+
+def build_post_payload(
+    board: str,
+    thread_id: int,
+    post: dict,
+    reply_from: list[int],
+    comment: ParsedComment | None = None,
+) -> dict:
+    no = post["no"]
+    tim = post.get("tim")
+    ext = post.get("ext")
+    filename = post.get("filename")
+    if comment is None:
+        with phase("text"):
+            comment = parse_comment(post.get("com"))
+    full_image_url = image_url(board, tim, ext)
+    media_type = media_kind(ext)
+    file_name = f"{filename}{ext}" if filename and ext else None
+    file_size = format_bytes(post.get("fsize"))
+    country = post.get("country")
+    country_name = post.get("country_name")
+    return {
+        "no": no,
+        "name": post.get("name") or "Anonymous",
+        "now": post.get("now") or "",
+        "comment_html": comment.body_html,
+        "thumbnail_url": thumbnail_url(board, tim),
+        "quotes_header": comment.header_quotes,
+        "quotes_body": comment.body_quotes,
+        "reply_from": reply_from,
+        "image_url": full_image_url,
+        "media_kind": media_type,
+        "file_name": file_name,
+        "file_size": file_size,
+        "country": country,
+        "country_name": country_name,
+        "country_flag_url": country_flag_url(country),
+        "image_view_href": (
+            f"/board/{board}/thread/{thread_id}/post/{no}" if full_image_url else None
+        ),
+        "image_full_href": (
+            f"/board/{board}/thread/{thread_id}/post/{no}/image"
+            if full_image_url
+            else None
+        ),
+    }
+
+
+def build_catalog_payload(board: str, thread: dict) -> dict:
+    country = thread.get("country")
+    with phase("text"):
+        # The whole comment, header quotes in their own lines included
+        comment_html = text_to_html(parse_comment(thread.get("com")).text)
+    return {
+        "no": thread["no"],
+        "name": thread.get("name") or "Anonymous",
+        "now": thread.get("now") or "",
+        "sub": thread.get("sub"),
+        "comment_html": comment_html,
+        "thumbnail_url": thumbnail_url(board, thread.get("tim")),
+        "replies": thread.get("replies"),
+        "images": thread.get("images"),
+        "country": country,
+        "country_name": thread.get("country_name"),
+        "country_flag_url": country_flag_url(country),
+    }
+
+
+def _quoted_numbers(comment: ParsedComment) -> list[int]:
+    numbers = []
+    for quoted_id in comment.all_quotes:
+        try:
+            numbers.append(int(quoted_id))
+        except ValueError:
+            continue
+    return numbers
+
+
+class ThreadState:
+    """Post payloads for one thread, updated incrementally between fetches.
+
+    Threads are append-only apart from deletions (and the odd file removal),
+    so ``ingest`` only renders posts it has not seen in this exact form before,
+    drops posts that disappeared upstream, and patches the ``reply_from`` lists
+    of the posts they quote.
+    """
+
+    def __init__(self, board: str, thread_id: int, strict: bool = False) -> None:
+        self.board = board
+        self.thread_id = thread_id
+        self.strict = strict
+        self.last_modified: str | None = None
+        self.source: Any = None
+        self.posts: list[dict] = []
+        self.reply_from: dict[int, list[int]] = {}
+        self._raw: dict[int, dict] = {}
+        self._payloads: dict[int, dict] = {}
+        self._quotes: dict[int, list[int]] = {}
+        # Quotes of posts not (yet) in the thread, keyed by the quoted number
+        self._pending: dict[int, list[int]] = {}
+        # Single posts looked up without ingesting the thread
+        self._index_source: Any = None
+        self._index: dict[int, dict] = {}
+        self._lazy: dict[int, dict] = {}
+        self._lazy_replies: set[int] = set()
+
+    def matches(self, entry: CacheEntry) -> bool:
+        if self.source is entry.data:
+            return True
+        return (
+            entry.last_modified is not None
+            and entry.last_modified == self.last_modified
+        )
+
+    def ingest(self, entry: CacheEntry) -> None:
+        raw_posts: list[dict] = entry.data.get("posts", [])
+        changed: list[dict] = []
+        seen: set[int] = set()
+        for raw in raw_posts:
+            no = raw["no"]
+            seen.add(no)
+            # New posts are the common case; known posts are only re-rendered
+            # when upstream changed them (e.g. a deleted file)
+            known = self._raw.get(no)
+            if known is None or known != raw:
+                changed.append(raw)
+
+        removed = [no for no in self._raw if no not in seen]
+        for no in removed:
+            self._remove(no)
+        for raw in changed:
+            self._add(decode(ThreadPost, raw, self.strict), raw)
+
+        if changed or removed:
+            self.posts = list(self._payloads.values())
+        self.last_modified = entry.last_modified
+        self.source = entry.data
+        self._drop_index()
+
+    def post(self, entry: CacheEntry, no: int, *, replies: bool = True) -> dict | None:
+        """Payload of post ``no`` without rendering the rest of the thread.
+
+        An ingested, current thread answers from its payloads. Otherwise the
+        raw posts are indexed by number once per upstream version and only
+        the requested post is built; its ``reply_from`` is filled in (by
+        scanning the other comments) only when ``replies`` is set.
+        """
+        if self.matches(entry):
+            return self._payloads.get(no)
+        if self._index_source is not entry.data:
+            self._drop_index()
+            self._index = {raw["no"]: raw for raw in entry.data.get("posts", [])}
+            self._index_source = entry.data
+        raw = self._index.get(no)
+        if raw is None:
+            return None
+        payload = self._lazy.get(no)
+        if payload is None:
+            post = decode(ThreadPost, raw, self.strict)
+            payload = build_post_payload(self.board, self.thread_id, post, [])
+            self._lazy[no] = payload
+        if replies and no not in self._lazy_replies:
+            payload["reply_from"].extend(self._replies_to(no))
+            self._lazy_replies.add(no)
+        return payload
+
+    def _replies_to(self, no: int) -> list[int]:
+        digits = str(no)
+        replies = []
+        for other, raw in self._index.items():
+            com = raw.get("com")
+            # Only comments containing the number can quote it
+            if other == no or not com or digits not in com.replace("<wbr>", ""):
+                continue
+            with phase("text"):
+                comment = parse_comment(com)
+            if no in _quoted_numbers(comment):
+                replies.append(other)
+        return sorted(replies)
+
+    def _drop_index(self) -> None:
+        self._index_source = None
+        self._index = {}
+        self._lazy = {}
+        self._lazy_replies = set()
+
+    def _add(self, post: dict, raw: dict) -> None:
+        post_no = post["no"]
+        if post_no in self._raw:
+            self._unlink(post_no)
+        with phase("text"):
+            comment = parse_comment(post.get("com"))
+        quoted = [no for no in _quoted_numbers(comment) if no != post_no]
+        reply_from = self.reply_from.get(post_no)
+        if reply_from is None:
+            reply_from = self._pending.pop(post_no, [])
+            self.reply_from[post_no] = reply_from
+        self._raw[post_no] = raw
+        self._quotes[post_no] = quoted
+        # Re-rendered posts keep their slot; new ones append in thread order
+        self._payloads[post_no] = build_post_payload(
+            self.board, self.thread_id, post, reply_from, comment
+        )
+        for quoted_no in quoted:
+            targets = self.reply_from.get(quoted_no)
+            if targets is None:
+                if quoted_no < self.thread_id:
+                    # Older than the opening post: another thread's post
+                    continue
+                targets = self._pending.setdefault(quoted_no, [])
+            if post_no not in targets:
+                insort(targets, post_no)
+
+    def _unlink(self, no: int) -> None:
+        for quoted_no in self._quotes.pop(no, []):
+            targets = self.reply_from.get(quoted_no)
+            if targets is None:
+                targets = self._pending.get(quoted_no)
+                if targets == [no]:
+                    del self._pending[quoted_no]
+                    continue
+            if targets and no in targets:
+                targets.remove(no)
+
+    def _remove(self, no: int) -> None:
+        self._unlink(no)
+        del self._raw[no]
+        del self._payloads[no]
+        self.reply_from.pop(no, None)
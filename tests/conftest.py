@@ -0,0 +1,84 @@
+from collections.abc import Iterator
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import ChanAPIClient, RequestScheduler
+
+
+class Upstream:
+    """A mock 4chan API serving ``routes``.
+
+    Routes map a path (or ``"*"`` for any other) to a JSON body or to a
+    handler of the request; unknown paths are 404s. JSON bodies carry
+    ``last_modified`` when it is set, and a matching ``If-Modified-Since``
+    gets a 304. Requested paths are recorded in ``paths``.
+    """
+
+    def __init__(self, routes: dict[str, Any]) -> None:
+        self.routes = routes
+        self.paths: list[str] = []
+        self.last_modified: str | None = None
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.paths.append(request.url.path)
+        route = self.routes.get(request.url.path, self.routes.get("*"))
+        if route is None:
+            return httpx.Response(404)
+        if callable(route):
+            return route(request)
+        if self.last_modified is None:
+            return httpx.Response(200, json=route)
+        if request.headers.get("if-modified-since") == self.last_modified:
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json=route, headers={"Last-Modified": self.last_modified}
+        )
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    """What upstream serves; test modules override this."""
+    return {}
+
+
+@pytest.fixture
+def upstream(routes: dict[str, Any]) -> Upstream:
+    return Upstream(routes)
+
+
+@pytest.fixture
+def api_client(upstream: Upstream) -> ChanAPIClient:
+    return ChanAPIClient(
+        transport=httpx.MockTransport(upstream),
+        scheduler=RequestScheduler(interval_seconds=0),
+    )
+
+
+@pytest.fixture
+def app_overrides() -> dict[str, Any]:
+    """Further ``main`` globals to replace while the app runs (e.g. a page cache)."""
+    return {}
+
+
+@pytest.fixture
+def app_client(
+    monkeypatch: pytest.MonkeyPatch,
+    api_client: ChanAPIClient,
+    app_overrides: dict[str, Any],
+) -> Iterator[TestClient]:
+    """The app on ``api_client``, with no background fetches or earlier thread state."""
+    overrides = {
+        "client": api_client,
+        "thread_index": None,
+        "prefetcher": None,
+        "_thread_states": type(main._thread_states)(),
+        **app_overrides,
+    }
+    for name, value in overrides.items():
+        monkeypatch.setattr(main, name, value)
+    with TestClient(main.app) as client:
+        yield client
@@ -1,6 +1,6 @@
 import time
 
-from imageboard_explorer.clients.chan_api import TTLCache
+from imageboard_explorer.clients.chan_api import TTLCache, entry_bytes
 
 
 def test_cache_expires() -> None:
@@ -43,3 +43,66 @@ def test_cache_expired_cleanup_on_set() -> None:
     cache.set("b", 2, ttl_seconds=60, last_modified=None)
     assert cache.get("a") is None
     assert cache.get("b") == 2
+
+
+def test_cache_keeps_stale_entries_within_grace() -> None:
+    cache = TTLCache(stale_grace_seconds=60)
+    cache.set("a", 1, ttl_seconds=0.01, last_modified="lm")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    entry = cache.get_entry("a")
+    assert entry is not None
+    assert not entry.is_fresh()
+    assert entry.data == 1
+    assert entry.last_modified == "lm"
+
+
+def test_cache_reports_evictions() -> None:
+    evicted: list[str] = []
+    cache = TTLCache(max_size=2, on_evict=evicted.append)
+    cache.set("a", 1, ttl_seconds=60, last_modified=None)
+    cache.set("a", 2, ttl_seconds=60, last_modified=None)
+    cache.set("b", 3, ttl_seconds=0, last_modified=None)
+    assert evicted == []
+    cache.set("c", 4, ttl_seconds=60, last_modified=None)
+    assert evicted == ["b"]
+    cache.set("d", 5, ttl_seconds=60, last_modified=None)
+    assert evicted == ["b", "a"]
+
+
+def test_cache_byte_budget() -> None:
+    evicted: list[str] = []
+    size = entry_bytes(None, b"x" * 1000)
+    cache = TTLCache(max_bytes=3 * size, on_evict=evicted.append)
+    for key in "abc":
+        cache.set(key, key, ttl_seconds=60, last_modified=None, body=b"x" * 1000)
+    assert cache.stats.bytes == 3 * size
+    cache.get("a")
+    cache.set("d", "d", ttl_seconds=60, last_modified=None, body=b"x" * 2000)
+    # The new entry takes nearly two slots
+    assert evicted == ["b", "c"]
+    assert cache.stats.entries == 2
+    assert cache.stats.bytes == size + entry_bytes(None, b"x" * 2000)
+    # Too big to keep at all: handed back, nothing else dropped
+    entry = cache.set("e", "e", ttl_seconds=60, last_modified=None, body=b"x" * 5000)
+    assert entry.data == "e"
+    assert cache.get("e") is None
+    assert evicted == ["b", "c"]
+
+
+def test_cache_expiry_follows_refresh() -> None:
+    evicted: list[str] = []
+    cache = TTLCache(on_evict=evicted.append)
+    cache.set("a", 1, ttl_seconds=0.01, last_modified=None)
+    cache.set("b", 2, ttl_seconds=0.01, last_modified=None)
+    cache.refresh("a", 60)
+    time.sleep(0.02)
+    cache.set("c", 3, ttl_seconds=60, last_modified=None)
+    assert evicted == ["b"]
+    assert cache.stats.expirations == 1
+    assert cache.get("a") == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 0)
+    cache.refresh("a", 0)
+    cache.set("d", 4, ttl_seconds=60, last_modified=None)
+    assert evicted == ["b", "a"]
+    assert cache.stats.entries == 2
@@ -0,0 +1,58 @@
+import re
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+
+THREADS = [{"no": 100 + index, "com": f"thread {index}"} for index in range(40)]
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    pages = [
+        {"page": 1, "threads": THREADS[:20]},
+        {"page": 2, "threads": THREADS[20:]},
+    ]
+    return {"*": pages}
+
+
+@pytest.fixture(autouse=True)
+def catalog_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "catalog_window", 10)
+
+
+def _thread_ids(html: str) -> list[int]:
+    return [int(no) for no in re.findall(r'data-thread-id="(\d+)"', html)]
+
+
+def test_catalog_renders_only_window_around_selection(app_client: TestClient) -> None:
+    html = app_client.get("/board/a/catalog?selected=120").text
+    assert _thread_ids(html) == list(range(118, 128))
+    assert 'data-start="18"' in html
+    assert 'data-total="40"' in html
+    assert 'thread-card selectable selected"' in html
+
+    # Windows at the end of the list stay full
+    assert _thread_ids(app_client.get("/board/a/catalog?selected=139").text) == list(
+        range(130, 140)
+    )
+
+
+def test_catalog_renders_everything_without_window(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main.settings, "catalog_window", 0)
+    html = app_client.get("/board/a/catalog").text
+    assert _thread_ids(html) == [thread["no"] for thread in THREADS]
+    assert "data-total" not in html
+
+
+def test_catalog_items_fragment(app_client: TestClient) -> None:
+    response = app_client.get("/board/a/catalog/items?start=35&count=10")
+    assert response.status_code == 200
+    assert response.headers["x-catalog-total"] == "40"
+    assert _thread_ids(response.text) == list(range(135, 140))
+    assert "<html" not in response.text
+    assert app_client.get("/board/a/catalog/items?count=1000").status_code == 422
@@ -0,0 +1,221 @@
+import asyncio
+
+import httpx
+import pytest
+
+from imageboard_explorer.clients.chan_api import (
+    ChanAPIClient,
+    Priority,
+    RequestScheduler,
+)
+from imageboard_explorer.clients.compressed_cache import CompressedCache
+
+
+def test_concurrent_fetches_are_coalesced() -> None:
+    calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"posts": [{"no": 1}]})
+
+    async def run() -> list[object]:
+        client = ChanAPIClient(transport=httpx.MockTransport(handler))
+        try:
+            return await asyncio.gather(
+                *(
+                    client.fetch_json("/a/thread/1.json", ttl_seconds=10)
+                    for _ in range(5)
+                )
+            )
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {"posts": [{"no": 1}]} for result in results)
+
+
+def test_coalesced_fetch_error_reaches_every_waiter() -> None:
+    calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        await asyncio.sleep(0.01)
+        return httpx.Response(404)
+
+    async def run() -> list[object]:
+        client = ChanAPIClient(transport=httpx.MockTransport(handler))
+        try:
+            return await asyncio.gather(
+                *(
+                    client.fetch_json("/a/thread/1.json", ttl_seconds=10)
+                    for _ in range(3)
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, httpx.HTTPStatusError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch() -> None:
+    async def handler(_request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json={"ok": True})
+
+    async def run() -> object:
+        client = ChanAPIClient(transport=httpx.MockTransport(handler))
+        try:
+            first = asyncio.create_task(client.fetch_json("/boards.json", 10))
+            second = asyncio.create_task(client.fetch_json("/boards.json", 10))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == {"ok": True}
+
+
+def test_stale_entry_is_served_and_revalidated_in_background() -> None:
+    seen_headers: list[str | None] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.append(request.headers.get("If-Modified-Since"))
+        if request.headers.get("If-Modified-Since"):
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"v": 1}, headers={"Last-Modified": "Mon, 01 Jan 2024"}
+        )
+
+    async def run() -> list[object]:
+        client = ChanAPIClient(
+            transport=httpx.MockTransport(handler), stale_grace_seconds=60
+        )
+        client.scheduler = RequestScheduler(interval_seconds=0)
+        try:
+            first = await client.fetch_json("/boards.json", ttl_seconds=0.01)
+            await asyncio.sleep(0.02)
+            stale = await client.fetch_json("/boards.json", ttl_seconds=60)
+            await asyncio.sleep(0.01)
+            fresh = await client.fetch_json("/boards.json", ttl_seconds=60)
+            return [first, stale, fresh]
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [{"v": 1}] * 3
+    assert seen_headers == [None, "Mon, 01 Jan 2024"]
+
+
+def test_scheduler_dispatches_by_priority_then_arrival() -> None:
+    order: list[str] = []
+
+    async def run() -> dict[str, dict[str, float]]:
+        scheduler = RequestScheduler(interval_seconds=0.02)
+
+        async def request(name: str, priority: Priority) -> None:
+            await scheduler.wait(priority)
+            order.append(name)
+
+        await request("first", Priority.INTERACTIVE)
+        tasks = [
+            asyncio.create_task(request("prefetch", Priority.PREFETCH)),
+            asyncio.create_task(request("revalidate", Priority.REVALIDATE)),
+            asyncio.create_task(request("page-1", Priority.INTERACTIVE)),
+            asyncio.create_task(request("page-2", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == {
+            Priority.INTERACTIVE: 2,
+            Priority.REVALIDATE: 1,
+            Priority.PREFETCH: 1,
+        }
+        await asyncio.gather(*tasks)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert order == ["first", "page-1", "page-2", "revalidate", "prefetch"]
+    assert stats["interactive"]["dispatched"] == 3
+    assert stats["prefetch"]["queued"] == 0
+    assert stats["prefetch"]["wait_seconds_max"] >= 0.06
+
+
+def test_promoted_request_jumps_the_queue() -> None:
+    order: list[str] = []
+
+    async def run() -> None:
+        scheduler = RequestScheduler(interval_seconds=0.02)
+
+        async def request(name: str, priority: Priority, key: str) -> None:
+            await scheduler.wait(priority, key=key)
+            order.append(name)
+
+        await request("first", Priority.INTERACTIVE, "a")
+        tasks = [
+            asyncio.create_task(request("revalidate", Priority.REVALIDATE, "b")),
+            asyncio.create_task(request("prefetch", Priority.PREFETCH, "c")),
+        ]
+        await asyncio.sleep(0)
+        scheduler.promote("c", Priority.INTERACTIVE)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["first", "prefetch", "revalidate"]
+
+
+def test_disconnected_caller_cancels_queued_fetch() -> None:
+    calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"ok": True})
+
+    async def run() -> None:
+        client = ChanAPIClient(
+            transport=httpx.MockTransport(handler),
+            scheduler=RequestScheduler(interval_seconds=0.05),
+        )
+        try:
+            await client.fetch_json("/a/catalog.json", 10)
+            waiting = asyncio.create_task(client.fetch_json("/b/catalog.json", 10))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert client.scheduler.queue_depth()[Priority.INTERACTIVE] == 0
+            # The freed slot goes straight to the next request
+            await client.fetch_json("/c/catalog.json", 10)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert calls == ["/a/catalog.json", "/c/catalog.json"]
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_peeks_do_not_count_as_cache_hits_or_misses(compressed: bool) -> None:
+    async def run() -> tuple[int, int]:
+        client = ChanAPIClient(
+            transport=httpx.MockTransport(lambda _: httpx.Response(200, json=[])),
+            scheduler=RequestScheduler(interval_seconds=0),
+            cache=CompressedCache(1024 * 1024) if compressed else None,
+        )
+        try:
+            assert await client.peek("/a/catalog.json") is None
+            await client.fetch_json("/a/catalog.json", ttl_seconds=10)
+            counts = client.cache_stats.hits, client.cache_stats.misses
+            assert await client.peek("/a/catalog.json") is not None
+            assert await client.peek("/b/catalog.json") is None
+            assert (client.cache_stats.hits, client.cache_stats.misses) == counts
+            await client.fetch_json("/a/catalog.json", ttl_seconds=10)
+            return client.cache_stats.hits, client.cache_stats.misses
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run())[0] == 1
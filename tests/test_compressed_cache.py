@@ -0,0 +1,91 @@
+import asyncio
+import gc
+import json
+import time
+
+import httpx
+
+from imageboard_explorer.clients.chan_api import (
+    ChanAPIClient,
+    RequestScheduler,
+    entry_bytes,
+)
+from imageboard_explorer.clients.compressed_cache import CompressedCache
+
+THREAD = {"posts": [{"no": n, "com": "the same reply again " * 5} for n in range(200)]}
+BODY = json.dumps(THREAD).encode()
+
+
+def test_stores_compressed_and_decodes_on_demand() -> None:
+    cache = CompressedCache(decoded_bytes=0)
+    held = cache.set("t", THREAD, ttl_seconds=60, last_modified="lm", body=BODY)
+    assert cache.stats.bytes < len(BODY) / 5 < entry_bytes(THREAD, BODY)
+    assert cache.decoded_bytes == 0
+    # Held elsewhere: handed out again as it is, without decoding
+    assert cache.get_entry("t") is held
+    assert cache.stats.decodes == 0
+    del held
+    gc.collect()
+
+    entry = cache.get_entry("t")
+    assert entry is not None
+    assert entry.data == THREAD
+    assert entry.last_modified == "lm"
+    assert entry.is_fresh()
+    assert cache.stats.decodes == 1
+
+
+def test_decoded_tier_keeps_hot_entries() -> None:
+    size = entry_bytes(THREAD, BODY)
+    cache = CompressedCache(decoded_bytes=2 * size)
+    for key in "abc":
+        cache.set(key, json.loads(BODY), ttl_seconds=60, last_modified=None, body=BODY)
+    gc.collect()
+    assert cache.decoded_bytes == 2 * size
+    for key in "bcbc":
+        cache.get_entry(key)
+    assert cache.stats.decodes == 0
+    assert cache.get("a") == THREAD
+    assert cache.stats.decodes == 1
+
+
+def test_refresh_and_eviction_reach_handed_out_entries() -> None:
+    evicted: list[str] = []
+    cache = CompressedCache(on_evict=evicted.append)
+    entry = cache.set("t", THREAD, ttl_seconds=0, last_modified="lm", body=BODY)
+    assert not entry.is_fresh()
+    cache.refresh("t", 60)
+    assert entry.is_fresh()
+
+    cache.refresh("t", 0.01)
+    time.sleep(0.02)
+    assert cache.get_entry("t") is None
+    assert evicted == ["t"]
+    assert cache.decoded_bytes == 0
+
+
+def test_client_revalidates_compressed_entries() -> None:
+    seen: list[str | None] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        since = request.headers.get("if-modified-since")
+        seen.append(since)
+        if since == "lm":
+            return httpx.Response(304)
+        return httpx.Response(200, content=BODY, headers={"Last-Modified": "lm"})
+
+    async def run() -> None:
+        client = ChanAPIClient(
+            transport=httpx.MockTransport(handler),
+            cache=CompressedCache(stale_grace_seconds=60, decoded_bytes=0),
+            scheduler=RequestScheduler(interval_seconds=0),
+        )
+        first = await client.fetch_entry("/g/thread/1.json", 0)
+        assert first.data == THREAD
+        again = await client.fetch_entry("/g/thread/1.json", 60, must_revalidate=True)
+        assert again.data == THREAD
+        assert again.is_fresh()
+        await client.aclose()
+
+    asyncio.run(run())
+    assert seen == [None, "lm"]
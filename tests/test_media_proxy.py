@@ -0,0 +1,163 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from email.utils import formatdate
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+from imageboard_explorer.media import MediaCache
+from imageboard_explorer.models import (
+    country_flag_url,
+    image_url,
+    set_media_proxy,
+    thumbnail_url,
+)
+
+VIDEO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def cdn() -> dict:
+    state: dict = {"calls": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"].append(str(request.url))
+        if request.url.path.endswith("404.jpg"):
+            return httpx.Response(404)
+        body = VIDEO if request.url.path.endswith(".webm") else b"x" * 1000
+        return httpx.Response(
+            200,
+            content=body,
+            headers={"Last-Modified": formatdate(1704067200, usegmt=True)},
+        )
+
+    state["transport"] = httpx.MockTransport(handler)
+    return state
+
+
+@pytest.fixture
+def proxy(
+    cdn: dict, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[TestClient]:
+    cache = MediaCache(tmp_path, transport=cdn["transport"])
+    monkeypatch.setattr(main, "media_cache", cache)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_url_helpers_rewrite_to_proxy() -> None:
+    set_media_proxy("/media/")
+    try:
+        assert thumbnail_url("a", 1234) == "/media/i/a/1234s.jpg"
+        assert image_url("b", 5678, ".webm") == "/media/i/b/5678.webm"
+        assert country_flag_url("US") == "/media/s/image/country/us.gif"
+    finally:
+        set_media_proxy(None)
+    assert thumbnail_url("a", 1234) == "https://i.4cdn.org/a/1234s.jpg"
+
+
+def test_proxy_caches_and_answers_conditional_requests(
+    proxy: TestClient, cdn: dict
+) -> None:
+    first = proxy.get("/media/i/a/1234s.jpg")
+    assert first.status_code == 200
+    assert first.content == b"x" * 1000
+    assert first.headers["last-modified"] == formatdate(1704067200, usegmt=True)
+
+    again = proxy.get(
+        "/media/i/a/1234s.jpg", headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert again.status_code == 304
+    since = proxy.get(
+        "/media/i/a/1234s.jpg",
+        headers={"If-Modified-Since": first.headers["last-modified"]},
+    )
+    assert since.status_code == 304
+    assert cdn["calls"] == ["https://i.4cdn.org/a/1234s.jpg"]
+
+
+def test_proxy_serves_byte_ranges(proxy: TestClient) -> None:
+    response = proxy.get("/media/i/a/99.webm", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == VIDEO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(VIDEO)}"
+
+
+def test_proxy_rejects_unknown_and_missing_media(proxy: TestClient) -> None:
+    assert proxy.get("/media/x/a/1.jpg").status_code == 404
+    assert proxy.get("/media/i/../etc/passwd").status_code == 404
+    assert proxy.get("/media/i/a/404.jpg").status_code == 404
+
+
+def test_disk_cache_evicts_least_recently_used(cdn: dict, tmp_path: Path) -> None:
+    async def run() -> MediaCache:
+        cache = MediaCache(tmp_path, max_bytes=2500, transport=cdn["transport"])
+        try:
+            for name in ("1.jpg", "2.jpg", "1.jpg", "3.jpg"):
+                await cache.get("i", f"a/{name}")
+        finally:
+            await cache.aclose()
+        return cache
+
+    cache = asyncio.run(run())
+    assert sorted(p.name for p in (tmp_path / "i" / "a").iterdir()) == [
+        "1.jpg",
+        "3.jpg",
+    ]
+    assert cache.total_bytes == 2000
+    # A restart rebuilds the index from disk
+    assert MediaCache(tmp_path, max_bytes=2500).total_bytes == 2000
+
+
+def test_workers_download_the_same_file_at_once(tmp_path: Path) -> None:
+    async def handler(_: httpx.Request) -> httpx.Response:
+        async def body() -> AsyncIterator[bytes]:
+            yield b"x" * 500
+            # Both downloads are now writing
+            await asyncio.sleep(0.01)
+            yield b"x" * 500
+
+        return httpx.Response(200, content=body())
+
+    async def run() -> list[Path | None]:
+        # Two caches on one directory stand in for two worker processes
+        caches = [
+            MediaCache(tmp_path, transport=httpx.MockTransport(handler))
+            for _ in range(2)
+        ]
+        try:
+            return await asyncio.gather(
+                *(cache.get("i", "a/1.jpg") for cache in caches)
+            )
+        finally:
+            for cache in caches:
+                await cache.aclose()
+
+    assert asyncio.run(run()) == [tmp_path / "i/a/1.jpg"] * 2
+    assert (tmp_path / "i/a/1.jpg").read_bytes() == b"x" * 1000
+    assert [p.name for p in (tmp_path / "i/a").iterdir()] == ["1.jpg"]
+
+
+def test_file_evicted_before_serving_is_fetched_again(
+    proxy: TestClient, cdn: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert main.media_cache is not None
+    get = main.media_cache.get
+    evicted: list[Path] = []
+
+    async def get_then_evict(host: str, path: str) -> Path | None:
+        local = await get(host, path)
+        if local is not None and not evicted:
+            # Another worker evicts it before this one serves it
+            local.unlink()
+            evicted.append(local)
+        return local
+
+    monkeypatch.setattr(main.media_cache, "get", get_then_evict)
+    response = proxy.get("/media/i/a/1234s.jpg")
+    assert response.status_code == 200
+    assert response.content == b"x" * 1000
+    assert len(cdn["calls"]) == 2
@@ -0,0 +1,164 @@
+import asyncio
+import pstats
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from conftest import Upstream
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main, metrics
+from imageboard_explorer.clients.chan_api import endpoint_kind
+from imageboard_explorer.metrics import Exposition, Histogram
+
+THREAD = {"posts": [{"no": 1, "com": "op"}, {"no": 2, "com": "reply"}]}
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {"*": THREAD}
+
+
+@pytest.fixture
+def upstream(upstream: Upstream) -> Upstream:
+    upstream.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+    return upstream
+
+
+@pytest.fixture
+def app_overrides() -> dict[str, Any]:
+    # The middleware holds these, so they are reset rather than replaced
+    main.route_seconds.clear()
+    main.route_responses.clear()
+    return {"page_cache": None}
+
+
+def _value(text: str, sample: str) -> float:
+    for line in text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == f"imageboard_explorer_{sample}":
+            return float(value)
+    raise AssertionError(f"{sample} not in metrics")
+
+
+def test_histogram_exposition() -> None:
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "thread", 'a"b')
+    out = Exposition()
+    out.histogram("x_seconds", "Help.", histogram, ("route", "phase"))
+    out.sample("gauge", "depth", "Depth.", 2)
+    out.sample("gauge", "budget_bytes", "Budget.", 64 * 1024 * 1024)
+    out.sample("counter", "seconds_total", "Seconds.", [({"kind": "a"}, 1234567.25)])
+    assert out.text().splitlines() == [
+        "# HELP imageboard_explorer_x_seconds Help.",
+        "# TYPE imageboard_explorer_x_seconds histogram",
+        'imageboard_explorer_x_seconds_bucket{route="thread",phase="a\\"b",le="0.1"} 2',
+        'imageboard_explorer_x_seconds_bucket{route="thread",phase="a\\"b",le="1"} 3',
+        'imageboard_explorer_x_seconds_bucket{route="thread",phase="a\\"b",le="+Inf"} 4',
+        'imageboard_explorer_x_seconds_sum{route="thread",phase="a\\"b"} 3.65',
+        'imageboard_explorer_x_seconds_count{route="thread",phase="a\\"b"} 4',
+        "# HELP imageboard_explorer_depth Depth.",
+        "# TYPE imageboard_explorer_depth gauge",
+        "imageboard_explorer_depth 2",
+        "# HELP imageboard_explorer_budget_bytes Budget.",
+        "# TYPE imageboard_explorer_budget_bytes gauge",
+        "imageboard_explorer_budget_bytes 67108864",
+        "# HELP imageboard_explorer_seconds_total Seconds.",
+        "# TYPE imageboard_explorer_seconds_total counter",
+        'imageboard_explorer_seconds_total{kind="a"} 1234567.25',
+    ]
+
+
+def test_endpoint_kind() -> None:
+    assert endpoint_kind("https://a.4cdn.org/g/thread/123.json") == "thread"
+    assert endpoint_kind("https://a.4cdn.org/g/catalog.json") == "catalog"
+    assert endpoint_kind("https://a.4cdn.org/boards.json") == "boards"
+    assert endpoint_kind("https://a.4cdn.org/g/1.json") == "other"
+
+
+def test_metrics_cover_cache_upstream_and_route_phases(app_client: TestClient) -> None:
+    first = app_client.get("/board/a/thread/1")
+    app_client.get(
+        "/board/a/thread/1", headers={"if-none-match": first.headers["etag"]}
+    )
+
+    response = app_client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    count = 'upstream_request_seconds_count{endpoint="thread",status="200"}'
+    assert _value(text, count) == 1
+    assert _value(text, "response_cache_misses_total") >= 1
+    assert _value(text, "response_cache_hits_total") >= 1
+    assert _value(text, 'rate_limit_wait_seconds_count{priority="interactive"}') == 1
+    assert _value(text, 'responses_total{route="thread",status="200"}') == 1
+    assert _value(text, 'responses_total{route="thread",status="304"}') == 1
+    for phase in ("total", "limiter", "upstream", "decode", "parse", "render"):
+        assert _value(text, f'request_seconds_count{{route="thread",phase="{phase}"}}')
+    # The 304 was answered before anything was parsed or rendered
+    assert _value(text, 'request_seconds_count{route="thread",phase="total"}') == 2
+    assert _value(text, 'request_seconds_count{route="thread",phase="render"}') == 1
+
+
+def test_nested_phases_are_exclusive() -> None:
+    async def timed() -> dict[str, float]:
+        phases: dict[str, float] = {}
+        metrics._phases.set(phases)
+        with metrics.phase("parse"):
+            time.sleep(0.01)
+            with metrics.phase("text"):
+                time.sleep(0.02)
+        metrics.add_phase("upstream", 0.5)
+        metrics.untimed().run(metrics.add_phase, "render", 1.0)
+        return phases
+
+    phases = asyncio.run(timed())
+    assert set(phases) == {"parse", "text", "upstream"}
+    assert phases["text"] >= 0.02
+    # Only the parse sleep, not the nested one
+    assert 0.01 <= phases["parse"] < phases["text"]
+    assert phases["upstream"] == 0.5
+
+
+def _server_timing(header: str) -> dict[str, float]:
+    entries = {}
+    for entry in header.split(", "):
+        name, _, duration = entry.partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_server_timing_header(app_client: TestClient) -> None:
+    response = app_client.get("/api/board/a/thread/1")
+    timing = _server_timing(response.headers["server-timing"])
+    assert {"limiter", "upstream", "decode", "text", "total"} <= set(timing)
+    assert sum(timing.values()) - timing["total"] <= timing["total"]
+    # Served from the cache: nothing left to fetch or decode
+    again = _server_timing(
+        app_client.get("/api/board/a/thread/1").headers["server-timing"]
+    )
+    assert "upstream" not in again
+    assert "decode" not in again
+
+
+def test_profile_only_from_localhost(app_client: TestClient, tmp_path: Path) -> None:
+    assert app_client.get("/board/a/thread/1?profile=1").status_code == 403
+    local = TestClient(main.app, client=("127.0.0.1", 50000))
+    response = local.get("/board/a/thread/1", headers={"x-profile": "1"})
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert "render;dur=" in response.headers["server-timing"]
+    disposition = response.headers["content-disposition"]
+    assert disposition.startswith('attachment; filename="board-a-thread-1-')
+    (tmp_path / "thread.prof").write_bytes(response.content)
+    stats = pstats.Stats(str(tmp_path / "thread.prof"))
+    assert any(name == "_thread_posts" for _, _, name in stats.stats)
+    proxied = local.get(
+        "/board/a/thread/1?profile=1", headers={"x-forwarded-for": "203.0.113.9"}
+    )
+    assert proxied.status_code == 403
+    unicode = local.get("/board/€/thread/1?profile=1")
+    assert unicode.status_code == 200
+    disposition = unicode.headers["content-disposition"]
+    assert disposition.startswith('attachment; filename="board-_-thread-1-')
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any
+
+import pytest
+from conftest import Upstream
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.catalog_refresher import CatalogRefresher
+from imageboard_explorer.clients.chan_api import ChanAPIClient
+
+CATALOG = [
+    {
+        "page": 1,
+        "threads": [
+            {"no": 1, "sticky": 1, "com": "rules"},
+            {"no": 2, "com": "first"},
+            {"no": 3, "com": "second"},
+            {"no": 4, "com": "third"},
+        ],
+    }
+]
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {"*": CATALOG}
+
+
+@pytest.fixture
+def upstream(upstream: Upstream) -> Upstream:
+    upstream.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+    return upstream
+
+
+def test_interval_follows_how_often_the_catalog_changes(
+    upstream: Upstream, api_client: ChanAPIClient
+) -> None:
+    async def run() -> list[float]:
+        client = api_client
+        refresher = CatalogRefresher(client, ["a"], min_seconds=10, max_seconds=40)
+        intervals = []
+        try:
+            for minute in range(5):
+                if minute >= 3:
+                    upstream.last_modified = f"Mon, 01 Jan 2024 00:0{minute}:00 GMT"
+                # Stale by the time of each refresh
+                await client.mark_fresh("/a/catalog.json", 0)
+                await refresher.refresh("a")
+                intervals.append(refresher.interval("a"))
+            return intervals
+        finally:
+            await client.aclose()
+
+    # First fetch, then two unchanged (304) and two changed refreshes
+    assert asyncio.run(run()) == [10, 15, 22.5, 11.25, 10]
+    assert len(upstream.paths) == 5
+
+
+def test_refreshes_are_spread_within_budget(
+    upstream: Upstream, api_client: ChanAPIClient
+) -> None:
+    async def run() -> CatalogRefresher:
+        client = api_client
+        refresher = CatalogRefresher(client, ["a", "b", "c"], budget_per_minute=600)
+        refresher.start()
+        try:
+            await asyncio.sleep(0.15)
+            return refresher
+        finally:
+            await refresher.aclose()
+            await client.aclose()
+
+    refresher = asyncio.run(run())
+    # One refresh every 100 ms: boards a and b, but not yet c
+    assert upstream.paths == ["/a/catalog.json", "/b/catalog.json"]
+    assert refresher.latest("b") is not None
+    assert refresher.latest("c") is None
+
+
+@pytest.fixture
+def app_overrides(
+    api_client: ChanAPIClient, monkeypatch: pytest.MonkeyPatch
+) -> dict[str, Any]:
+    monkeypatch.setattr(main.settings, "overview_threads", 2)
+    return {"refresher": CatalogRefresher(api_client, ["a", "g"])}
+
+
+def test_overview_never_waits_on_upstream(
+    app_client: TestClient, upstream: Upstream
+) -> None:
+    # The background task is due to refresh "g" later; the page shows what it has
+    page = app_client.get("/overview")
+    assert page.status_code == 200
+    assert "etag" not in page.headers
+    assert "waiting for the first refresh" in page.text
+    assert "/g/catalog.json" not in upstream.paths
+
+    for board in ("a", "g"):
+        app_client.portal.call(main.refresher.refresh, board)
+    page = app_client.get("/overview")
+    assert "waiting for the first refresh" not in page.text
+    assert page.headers["etag"]
+
+    boards = app_client.get("/api/overview").json()["boards"]
+    assert [section["board"] for section in boards] == ["a", "g"]
+    assert [thread["no"] for thread in boards[1]["threads"]] == [2, 3]
+
+
+def test_overview_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main, "refresher", None)
+    with TestClient(main.app) as client:
+        assert client.get("/overview").status_code == 404
+        assert client.get("/api/overview").status_code == 404
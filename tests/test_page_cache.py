@@ -0,0 +1,163 @@
+import asyncio
+import gzip
+from typing import Any
+
+import httpx
+import pytest
+from conftest import Upstream
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import ChanAPIClient, RequestScheduler
+from imageboard_explorer.page_cache import (
+    MIN_COMPRESS_BYTES,
+    PageCache,
+    content_encoding,
+    negotiate_encoding,
+)
+
+THREAD = {"posts": [{"no": 1, "com": "op " * 500}, {"no": 2, "com": "reply"}]}
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {"*": THREAD}
+
+
+@pytest.fixture
+def upstream(upstream: Upstream) -> Upstream:
+    upstream.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+    return upstream
+
+
+@pytest.fixture
+def api_client(upstream: Upstream) -> ChanAPIClient:
+    return ChanAPIClient(
+        transport=httpx.MockTransport(upstream),
+        stale_grace_seconds=0,
+        scheduler=RequestScheduler(interval_seconds=0),
+    )
+
+
+@pytest.fixture
+def app_overrides() -> dict[str, Any]:
+    return {"page_cache": PageCache(1024 * 1024)}
+
+
+def test_unchanged_page_answers_304_without_rendering(app_client: TestClient) -> None:
+    first = app_client.get("/board/a/thread/1", headers={"accept-encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    etag = first.headers["etag"]
+
+    main._thread_states.clear()
+    second = app_client.get(
+        "/board/a/thread/1",
+        headers={"accept-encoding": "gzip", "if-none-match": etag},
+    )
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert not second.content
+    assert not main._thread_states
+
+
+def test_hot_page_served_from_page_cache(app_client: TestClient) -> None:
+    first = app_client.get("/board/a/thread/1", headers={"accept-encoding": "gzip"})
+    main._thread_states.clear()
+    second = app_client.get("/board/a/thread/1", headers={"accept-encoding": "gzip"})
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert main.page_cache.hits == 1
+    assert not main._thread_states
+
+    plain = app_client.get("/board/a/thread/1", headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == first.content
+    assert plain.headers["etag"] != first.headers["etag"]
+
+
+def test_identity_copy_not_served_to_compressing_clients(
+    app_client: TestClient,
+) -> None:
+    plain = app_client.get("/board/a/thread/1", headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert len(plain.content) >= MIN_COMPRESS_BYTES
+    compressed = app_client.get(
+        "/board/a/thread/1", headers={"accept-encoding": "gzip"}
+    )
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.content == plain.content
+
+
+def test_etag_follows_upstream_and_render_params(
+    app_client: TestClient, upstream: Upstream
+) -> None:
+    etag = app_client.get("/board/a/thread/1").headers["etag"]
+    assert app_client.get("/board/a/thread/1?selected=2").headers["etag"] != etag
+    assert app_client.get("/board/a/thread/1?fragment=1").headers["etag"] != etag
+    assert app_client.get("/board/a/thread/1/post/2").headers["etag"] != etag
+
+    # A changed thread gets a new tag, so the old one no longer matches
+    upstream.last_modified = "Mon, 01 Jan 2024 00:01:00 GMT"
+    asyncio.run(main.client.mark_fresh("/a/thread/1.json", 0))
+    response = app_client.get("/board/a/thread/1", headers={"if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_upgrade_changes_etag(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    etag = app_client.get("/board/a/thread/1").headers["etag"]
+    # New code renders different markup from the same upstream data
+    monkeypatch.setattr(main, "_BUILD_STAMP", "next release")
+    response = app_client.get("/board/a/thread/1", headers={"if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_no_validator_without_last_modified(
+    app_client: TestClient, upstream: Upstream
+) -> None:
+    upstream.last_modified = None
+    response = app_client.get("/board/a/thread/1")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_negotiate_encoding() -> None:
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") == "identity"
+    assert negotiate_encoding(None) == "identity"
+
+
+def test_page_cache_evicts_least_recently_used() -> None:
+    cache = PageCache(max_bytes=10)
+    cache.set("a", "gzip", b"12345")
+    cache.set("b", "gzip", b"12345")
+    assert cache.get("a", "gzip") == (b"12345", "gzip")
+    cache.set("c", "gzip", b"12345")
+    assert cache.get("b", "gzip") is None
+    assert cache.get("a", "gzip") == (b"12345", "gzip")
+    assert cache.total_bytes == 10
+    cache.set("d", "gzip", b"x" * 11)
+    assert cache.get("d", "gzip") is None
+
+
+def test_page_cache_stores_encoded_body(app_client: TestClient) -> None:
+    response = app_client.get("/board/a/thread/1", headers={"accept-encoding": "gzip"})
+    cached = main.page_cache.get(response.headers["etag"].strip('"')[:32], "gzip")
+    assert cached is not None
+    raw, encoding = cached
+    assert encoding == "gzip"
+    assert gzip.decompress(raw) == response.content
+
+
+def test_tiny_bodies_stay_uncompressed() -> None:
+    assert content_encoding(b"x" * (MIN_COMPRESS_BYTES - 1), "gzip") == "identity"
+    assert content_encoding(b"x" * MIN_COMPRESS_BYTES, "gzip") == "gzip"
+    cache = PageCache()
+    cache.set("a", "identity", b"tiny")
+    # Stands in for every encoding, and says it is uncompressed
+    assert cache.get("a", "br") == (b"tiny", "identity")
@@ -0,0 +1,82 @@
+from typing import Any
+
+import pytest
+from conftest import Upstream
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+
+BOARDS = {"boards": [{"board": "a", "title": "Anime", "ws_board": 1}]}
+CATALOG = [{"page": 1, "threads": [{"no": 1, "com": "op"}, {"no": 9, "com": "x"}]}]
+THREAD = {
+    "posts": [
+        {"no": 1, "com": "op"},
+        {"no": 2, "com": '<a href="#p1" class="quotelink">&gt;&gt;1</a>'},
+    ]
+}
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {
+        "/boards.json": BOARDS,
+        "/a/catalog.json": CATALOG,
+        "/a/thread/1.json": THREAD,
+    }
+
+
+def test_fragment_renders_without_page_chrome(app_client: TestClient) -> None:
+    page = app_client.get("/board/a/catalog").text
+    fragment = app_client.get("/board/a/catalog?fragment=1").text
+    assert "<html" in page
+    assert "<html" not in fragment
+    assert 'class="fragment" data-screen="catalog"' in fragment
+    assert 'data-thread-id="9"' in fragment
+
+
+def test_streamed_thread_fragment(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main.settings, "stream_min_posts", 1)
+    fragment = app_client.get("/board/a/thread/1?fragment=1").text
+    assert "<html" not in fragment
+    assert 'data-post-id="2"' in fragment
+
+
+def test_json_endpoints(app_client: TestClient) -> None:
+    boards = app_client.get("/api/boards").json()["boards"]
+    assert boards[0]["board"] == "a"
+    assert boards[0]["href"] == "/board/a/catalog"
+
+    catalog = app_client.get("/api/board/a/catalog?start=1").json()
+    assert catalog["total"] == 2
+    assert [thread["no"] for thread in catalog["threads"]] == [9]
+
+    posts = app_client.get("/api/board/a/thread/1").json()["posts"]
+    assert [post["no"] for post in posts] == [1, 2]
+    assert posts[0]["reply_from"] == [2]
+
+    assert app_client.get("/api/board/a/thread/1/post/2").json()["no"] == 2
+    missing = app_client.get("/api/board/a/thread/1/post/3")
+    assert missing.status_code == 404
+    assert missing.json() == {"error": "Post not found."}
+    assert app_client.get("/api/board/a/thread/5").status_code == 404
+
+
+def test_loaded_thread_serves_posts_from_memory(
+    app_client: TestClient, upstream: Upstream
+) -> None:
+    app_client.get("/board/a/thread/1")
+    for post_id in (1, 2, 1):
+        assert (
+            app_client.get(f"/api/board/a/thread/1/post/{post_id}").status_code == 200
+        )
+    assert upstream.paths == ["/a/thread/1.json"]
+
+
+def test_malformed_boards_are_an_upstream_error(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setitem(BOARDS, "boards", [{"title": "No id"}])
+    assert app_client.get("/").status_code == 502
+    assert app_client.get("/api/boards").status_code == 502
@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+
+from imageboard_explorer.clients.chan_api import (
+    ChanAPIClient,
+    Priority,
+    RequestScheduler,
+)
+from imageboard_explorer.prefetch import Prefetcher
+
+
+def _client(calls: list[str], interval: float = 0) -> ChanAPIClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"posts": [{"no": 1}]})
+
+    return ChanAPIClient(
+        transport=httpx.MockTransport(handler),
+        scheduler=RequestScheduler(interval_seconds=interval),
+    )
+
+
+def test_prefetches_selected_and_next_threads_and_counts_use() -> None:
+    calls: list[str] = []
+
+    async def run() -> Prefetcher:
+        client = _client(calls)
+        prefetcher = Prefetcher(client, depth=2, window_seconds=60)
+        try:
+            await prefetcher.schedule("a", [10, 11, 12, 13])
+            await asyncio.sleep(0.01)
+            prefetcher.note_opened("a", 11)
+            # Already warm: nothing more to fetch
+            await prefetcher.schedule("a", [11, 12, 13][:2])
+            await asyncio.sleep(0.01)
+            return prefetcher
+        finally:
+            await client.aclose()
+
+    prefetcher = asyncio.run(run())
+    assert calls == ["/a/thread/10.json", "/a/thread/11.json", "/a/thread/12.json"]
+    assert prefetcher.stats.fetched == 3
+    assert prefetcher.stats.used == 1
+    prefetcher._expire(float("inf"))
+    assert prefetcher.stats.wasted == 2
+
+
+def test_board_budget_caps_prefetches() -> None:
+    calls: list[str] = []
+
+    async def run() -> Prefetcher:
+        client = _client(calls)
+        prefetcher = Prefetcher(client, depth=5, budget_per_minute=2)
+        try:
+            await prefetcher.schedule("a", [1, 2, 3, 4])
+            await prefetcher.schedule("b", [1])
+            await asyncio.sleep(0.01)
+            return prefetcher
+        finally:
+            await client.aclose()
+
+    prefetcher = asyncio.run(run())
+    assert sorted(calls) == ["/a/thread/1.json", "/a/thread/2.json", "/b/thread/1.json"]
+    assert prefetcher.stats.skipped_budget == 1
+
+
+def test_prefetches_yield_to_page_loads_and_are_cancelled_when_unwanted() -> None:
+    calls: list[str] = []
+
+    async def run() -> Prefetcher:
+        client = _client(calls, interval=0.02)
+        prefetcher = Prefetcher(client, depth=1)
+        try:
+            await client.fetch_json("/a/catalog.json", 30)
+            await prefetcher.schedule("a", [1, 2])
+            page = asyncio.create_task(client.fetch_json("/a/thread/9.json", 10))
+            await asyncio.sleep(0.005)
+            assert client.scheduler.queue_depth()[Priority.PREFETCH] == 2
+            # Selection moved on: thread 1 is no longer wanted
+            await prefetcher.schedule("a", [2, 3])
+            await page
+            await asyncio.sleep(0.1)
+            return prefetcher
+        finally:
+            await client.aclose()
+
+    prefetcher = asyncio.run(run())
+    assert calls == [
+        "/a/catalog.json",
+        "/a/thread/9.json",
+        "/a/thread/2.json",
+        "/a/thread/3.json",
+    ]
+    assert prefetcher.stats.cancelled == 1
@@ -0,0 +1,170 @@
+from typing import Any
+
+import httpx
+import pytest
+from conftest import Upstream
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import (
+    CacheEntry,
+    ChanAPIClient,
+    RequestScheduler,
+    TTLCache,
+)
+from imageboard_explorer.search import SearchIndex
+from imageboard_explorer.settings import Settings
+from imageboard_explorer.text import parse_comment
+from imageboard_explorer.threads import ThreadState
+
+THREAD_URL = "https://a.4cdn.org/g/thread/100.json"
+CATALOG_URL = "https://a.4cdn.org/g/catalog.json"
+
+
+def _thread(*posts: dict) -> CacheEntry:
+    return CacheEntry({"posts": list(posts)}, 0.0, None)
+
+
+OP = {"no": 100, "sub": "Desktop thread", "com": "Post your <b>desktops</b>"}
+REPLY = {
+    "no": 101,
+    "com": '<a href="#p100" class="quotelink">&gt;&gt;100</a><br>tiling wm desktop',
+    "filename": "screenshot",
+    "ext": ".png",
+}
+
+
+def _nos(index: SearchIndex, query: str, **kwargs: object) -> list[int]:
+    return [hit.no for hit in index.search(query, **kwargs)]
+
+
+def test_search_matches_subject_comment_file_and_number() -> None:
+    index = SearchIndex()
+    index.update(THREAD_URL, _thread(OP, REPLY))
+    assert _nos(index, "desktop") == [101, 100]
+    assert _nos(index, "DESKTOPS") == [100]
+    assert _nos(index, "tiling desktop") == [101]
+    assert _nos(index, "screenshot png") == [101]
+    assert _nos(index, "101") == [101]
+    # Quoted numbers are indexed as text too, newest first
+    assert _nos(index, ">>100") == [101, 100]
+    assert _nos(index, "desktop", board="a") == []
+    assert _nos(index, "missing") == []
+    assert index.search("!!") == []
+
+    hit = index.search("tiling")[0]
+    assert hit.href == "/board/g/thread/100?selected=101"
+    assert hit.file_name == "screenshot.png"
+    assert hit.text.startswith(">>100")
+
+
+def test_updates_retokenize_only_changed_posts() -> None:
+    index = SearchIndex()
+    index.update(THREAD_URL, _thread(OP, REPLY))
+    assert index.stats.indexed_posts == 2
+    edited = {**REPLY, "filename": None}
+    index.update(THREAD_URL, _thread(OP, edited, {"no": 102, "com": "new"}))
+    assert index.stats.indexed_posts == 4
+    assert _nos(index, "screenshot") == []
+    assert _nos(index, "new") == [102]
+
+    # Posts that disappear upstream leave the index
+    index.update(THREAD_URL, _thread(OP))
+    assert _nos(index, "new") == []
+    assert index.document_count == 1
+
+
+def test_catalog_and_thread_share_documents() -> None:
+    index = SearchIndex()
+    catalog = CacheEntry([{"page": 1, "threads": [OP]}], 0.0, None)
+    index.update(CATALOG_URL, catalog)
+    index.update(THREAD_URL, _thread(OP, REPLY))
+    assert index.document_count == 2
+
+    index.discard(THREAD_URL)
+    assert _nos(index, "desktop") == [100]
+    index.discard(CATALOG_URL)
+    assert index.document_count == 0
+    assert index.term_count == 0
+    assert index.total_bytes == 0
+
+
+def test_budget_evicts_least_recently_updated_source() -> None:
+    index = SearchIndex(max_bytes=1)
+    index.update(CATALOG_URL, CacheEntry([{"threads": [{"no": 5}]}], 0.0, None))
+    index.update(THREAD_URL, _thread(OP))
+    assert _nos(index, "5") == []
+    assert _nos(index, "desktop") == [100]
+    assert index.stats.evicted_sources == 1
+
+
+def test_rendering_reuses_the_comments_the_index_parsed() -> None:
+    index = SearchIndex()
+    entry = _thread(OP, REPLY)
+    index.update(THREAD_URL, entry)
+    misses = parse_comment.cache_info().misses
+    ThreadState("g", 100).ingest(entry)
+    assert parse_comment.cache_info().misses == misses
+
+
+def test_search_is_opt_in() -> None:
+    assert main._build_search_index(Settings()) is None
+    assert main._build_search_index(Settings(search_index_bytes=1024)) is not None
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {
+        "/g/thread/100.json": {"posts": [OP, REPLY]},
+        "*": {"posts": [{"no": 200, "com": "other"}]},
+    }
+
+
+@pytest.fixture
+def search_index() -> SearchIndex:
+    return SearchIndex()
+
+
+@pytest.fixture
+def api_client(upstream: Upstream, search_index: SearchIndex) -> ChanAPIClient:
+    return ChanAPIClient(
+        transport=httpx.MockTransport(upstream),
+        cache=TTLCache(max_size=1, on_evict=search_index.discard),
+        scheduler=RequestScheduler(interval_seconds=0),
+        on_entry=search_index.update,
+    )
+
+
+@pytest.fixture
+def app_overrides(search_index: SearchIndex) -> dict[str, Any]:
+    return {"search_index": search_index}
+
+
+def test_search_route_uses_only_cached_data(
+    app_client: TestClient, upstream: Upstream
+) -> None:
+    assert "data-href" not in app_client.get("/search?q=tiling").text
+    app_client.get("/board/g/thread/100")
+    html = app_client.get("/search?q=tiling").text
+    assert 'data-href="/board/g/thread/100?selected=101"' in html
+    hits = app_client.get("/api/search?q=desktop&board=g").json()["hits"]
+    assert [hit["no"] for hit in hits] == [101, 100]
+    assert upstream.paths == ["/g/thread/100.json"]
+
+    # Evicted from the cache, evicted from the index
+    app_client.get("/board/g/thread/200")
+    assert app_client.get("/api/search?q=tiling").json()["hits"] == []
+    assert app_client.get("/api/search?q=other").json()["indexed"] == 1
+
+
+def test_search_disabled(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert "find posts" in app_client.get("/board/g/thread/100").text
+    monkeypatch.setattr(main, "search_index", None)
+    assert app_client.get("/search?q=x").status_code == 404
+    assert app_client.get("/api/search?q=x").status_code == 404
+    # Neither advertised nor bound to "/" (app.js checks data-search)
+    html = app_client.get("/board/g/thread/100").text
+    assert "find posts" not in html
+    assert "data-search" not in html
@@ -0,0 +1,12 @@
+from imageboard_explorer.settings import Settings
+
+
+def test_settings_from_env() -> None:
+    assert Settings.from_env({}) == Settings()
+    settings = Settings.from_env({"IMAGEBOARD_EXPLORER_STRICT_MODELS": "true"})
+    assert settings.strict_models is True
+
+
+def test_settings_env_round_trip() -> None:
+    settings = Settings(strict_models=True)
+    assert Settings.from_env(settings.to_env()) == settings
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from itertools import pairwise
+from pathlib import Path
+
+import httpx
+import pytest
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import ChanAPIClient, RequestScheduler
+from imageboard_explorer.clients.shared_limiter import SQLiteRateLimiter
+from imageboard_explorer.clients.sqlite_cache import SQLiteCache
+from imageboard_explorer.settings import Settings
+
+
+def test_limiters_on_one_file_share_the_interval(tmp_path: Path) -> None:
+    path = tmp_path / "shared.db"
+    slots: list[float] = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        # Separate connections stand in for separate worker processes
+        limiter = SQLiteRateLimiter(path, interval_seconds=0.05)
+        for _ in range(3):
+            # The reserved slots, not when sleeps happen to wake up
+            slot = limiter._reserve()
+            with lock:
+                slots.append(slot)
+        limiter.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    slots.sort()
+    assert len(slots) == 6
+    gaps = [later - earlier for earlier, later in pairwise(slots)]
+    assert min(gaps) == pytest.approx(0.05)
+
+
+def test_stale_reservation_from_clock_reset_is_ignored(tmp_path: Path) -> None:
+    limiter = SQLiteRateLimiter(tmp_path / "shared.db", interval_seconds=1.0)
+    limiter._conn.execute(
+        "INSERT INTO rate_limits (name, next_slot) VALUES ('upstream', ?)",
+        (time.monotonic() + 10_000,),
+    )
+    started = time.monotonic()
+    asyncio.run(limiter.wait())
+    limiter.close()
+    assert time.monotonic() - started < 0.5
+
+
+def test_worker_reuses_response_fetched_by_another_worker(tmp_path: Path) -> None:
+    path = tmp_path / "shared.db"
+    requests: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json={"posts": []})
+
+    async def run() -> None:
+        first_cache, second_cache = SQLiteCache(path), SQLiteCache(path)
+        first_limiter = SQLiteRateLimiter(path, interval_seconds=0.05)
+        second_limiter = SQLiteRateLimiter(path, interval_seconds=0.05)
+        first = ChanAPIClient(
+            transport=httpx.MockTransport(handler),
+            cache=first_cache,
+            scheduler=RequestScheduler(0, shared=first_limiter),
+        )
+        second = ChanAPIClient(
+            transport=httpx.MockTransport(handler),
+            cache=second_cache,
+            scheduler=RequestScheduler(0, shared=second_limiter),
+        )
+        await asyncio.gather(
+            first.fetch_json("/a/thread/1.json", 10),
+            second.fetch_json("/a/thread/1.json", 10),
+        )
+        for client in (first, second):
+            await client.aclose()
+        for closable in (first_cache, second_cache, first_limiter, second_limiter):
+            closable.close()
+
+    asyncio.run(run())
+    assert requests == ["/a/thread/1.json"]
+
+
+def test_workers_split_background_budgets() -> None:
+    settings = Settings(
+        workers=2, overview_boards="a", prefetch_depth=1, index_poll_seconds=15
+    )
+    client = ChanAPIClient()
+    refresher = main._build_refresher(settings, client)
+    prefetcher = main._build_prefetcher(settings, client)
+    thread_index = main._build_thread_index(settings, client)
+    assert refresher is not None
+    assert prefetcher is not None
+    assert thread_index is not None
+    assert refresher._spacing == 60 / (settings.overview_budget / 2)
+    assert prefetcher._budget_per_minute == settings.prefetch_budget / 2
+    assert thread_index._poll == 30
@@ -0,0 +1,166 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from imageboard_explorer.clients.chan_api import (
+    CacheEntry,
+    ChanAPIClient,
+    RequestScheduler,
+)
+from imageboard_explorer.clients.sqlite_cache import SQLiteCache
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_entries_survive_restart(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path)
+    cache.set("a", {"ok": True}, ttl_seconds=60, last_modified=LAST_MODIFIED)
+    cache.close()
+
+    restarted = SQLiteCache(path)
+    entry = restarted.get_entry("a")
+    restarted.close()
+    assert entry is not None
+    assert entry.data == {"ok": True}
+    assert entry.last_modified == LAST_MODIFIED
+    assert entry.is_fresh()
+
+
+def test_expired_entries_kept_only_within_grace(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path, stale_grace_seconds=60)
+    cache.set("stale", 1, ttl_seconds=0.01, last_modified=None)
+    cache.set("dead", 2, ttl_seconds=-120, last_modified=None)
+    cache.close()
+    time.sleep(0.02)
+
+    restarted = SQLiteCache(path, stale_grace_seconds=60)
+    assert restarted.get("stale") is None
+    stale = restarted.get_entry("stale")
+    assert stale is not None
+    assert stale.data == 1
+    assert restarted.get_entry("dead") is None
+    restarted.close()
+
+
+def test_max_size_drops_oldest_rows(tmp_path: Path) -> None:
+    cache = SQLiteCache(tmp_path / "cache.db", max_size=2, memory_size=1)
+    for key in ("a", "b", "c"):
+        cache.set(key, key, ttl_seconds=60, last_modified=None)
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.get("c") == "c"
+    cache.close()
+
+
+def test_body_read_only_when_served(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path, stale_grace_seconds=60)
+    other = SQLiteCache(path, stale_grace_seconds=60)
+    cache.set("a", [1], ttl_seconds=0, last_modified=LAST_MODIFIED)
+    statements: list[str] = []
+    cache._conn.set_trace_callback(statements.append)
+
+    # Revalidated by another process: same document, only the expiry moves
+    other.refresh("a", 60)
+    entry = cache.get_entry("a")
+    assert entry is not None
+    assert entry.is_fresh()
+    assert not any("SELECT body" in statement for statement in statements)
+
+    cache.refresh("a", 0)
+    other.set("a", [2], ttl_seconds=120, last_modified="newer")
+    assert cache.get("a") == [2]
+    assert any("SELECT body" in statement for statement in statements)
+    for closable in (cache, other):
+        closable.close()
+
+
+def test_restart_mid_flight_serves_stored_data_and_revalidates(
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "cache.db"
+    requests: list[tuple[str, str | None]] = []
+    hang = asyncio.Event()
+    caches: list[SQLiteCache] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        since = request.headers.get("If-Modified-Since")
+        requests.append((request.url.path, since))
+        if request.url.path == "/a/thread/2.json":
+            await hang.wait()
+        if since == LAST_MODIFIED:
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"posts": [{"no": 1}]}, headers={"Last-Modified": LAST_MODIFIED}
+        )
+
+    def make_client() -> ChanAPIClient:
+        caches.append(SQLiteCache(path, stale_grace_seconds=3600))
+        client = ChanAPIClient(transport=httpx.MockTransport(handler), cache=caches[-1])
+        client.scheduler = RequestScheduler(interval_seconds=0)
+        return client
+
+    async def first_process() -> None:
+        client = make_client()
+        await client.fetch_json("/a/thread/1.json", ttl_seconds=0.01)
+        # Shut down while a second fetch is still waiting on upstream
+        pending = asyncio.create_task(client.fetch_json("/a/thread/2.json", 10))
+        await asyncio.sleep(0.01)
+        await client.aclose()
+        pending.cancel()
+
+    async def second_process() -> object:
+        client = make_client()
+        try:
+            data = await client.fetch_json("/a/thread/1.json", ttl_seconds=10)
+            await asyncio.sleep(0.01)
+            return data
+        finally:
+            await client.aclose()
+
+    asyncio.run(first_process())
+    time.sleep(0.02)
+    requests.clear()
+    assert asyncio.run(second_process()) == {"posts": [{"no": 1}]}
+    # Served from disk right away; the background revalidation was conditional
+    assert requests == [("/a/thread/1.json", LAST_MODIFIED)]
+    caches.append(SQLiteCache(path))
+    assert caches[-1].get_entry("https://a.4cdn.org/a/thread/2.json") is None
+    for cache in caches:
+        cache.close()
+
+
+def test_client_queries_off_the_event_loop_and_closes_the_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = SQLiteCache(tmp_path / "cache.db")
+    query_threads: set[int] = set()
+    query = cache._query
+
+    def spy(key: str, current: CacheEntry | None) -> object:
+        query_threads.add(threading.get_ident())
+        return query(key, current)
+
+    monkeypatch.setattr(cache, "_query", spy)
+
+    async def run() -> None:
+        client = ChanAPIClient(
+            transport=httpx.MockTransport(lambda _: httpx.Response(200, json=[])),
+            cache=cache,
+            scheduler=RequestScheduler(interval_seconds=0),
+        )
+        await client.fetch_json("/a/thread/1.json", ttl_seconds=10)
+        await client.aclose()
+
+    asyncio.run(run())
+    assert query_threads
+    assert threading.get_ident() not in query_threads
+    with pytest.raises(sqlite3.ProgrammingError):
+        cache.get_entry("closed")
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from imageboard_explorer import main
+
+POSTS = [
+    {"no": no, "com": f'<a href="#p{no - 1}" class="quotelink">&gt;&gt;{no - 1}</a>'}
+    for no in range(2, 80)
+]
+
+
+@pytest.fixture
+def routes() -> dict[str, Any]:
+    return {"*": {"posts": [{"no": 1, "com": "op"}, *POSTS]}}
+
+
+def test_streamed_thread_page_matches_buffered_render(
+    app_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    buffered = app_client.get("/board/a/thread/1?selected=5")
+    monkeypatch.setattr(main.settings, "stream_min_posts", 10)
+    streamed = app_client.get("/board/a/thread/1?selected=5")
+    assert "content-length" in buffered.headers
+    assert "content-length" not in streamed.headers
+    assert streamed.headers["content-type"] == "text/html; charset=utf-8"
+    assert streamed.text == buffered.text
+
+
+def test_render_chunks_are_batched() -> None:
+    template = main.templates.env.from_string(
+        "{% for i in items %}<p>{{ i }}</p>{% endfor %}"
+    )
+
+    async def collect() -> list[bytes]:
+        context = {"items": range(1000)}
+        return [chunk async for chunk in main._render_chunks(template, context, 1024)]
+
+    chunks = asyncio.run(collect())
+    assert b"".join(chunks) == template.render(items=range(1000)).encode()
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
@@ -2,10 +2,27 @@ from imageboard_explorer.text import (
     extract_all_quotes,
     extract_quotes,
     html_to_text,
+    parse_comment,
     strip_header_quotes,
     text_to_html,
 )
 
+_SAMPLE_COMMENTS = [
+    None,
+    "",
+    "Hello<br>World <b>bold</b> &amp; stuff",
+    (
+        '<a href="#p1111" class="quotelink">&gt;&gt;1111</a><br>'
+        '<a href="#p2222" class="quotelink">&gt;&gt;2222</a><br><br>'
+        "  see https://example.com/a?b=1&amp;c=2 and &gt;&gt;3333"
+    ),
+    '<span class="quote">&gt;implying</span><br>http://exa<wbr>mple.com/&gt;&gt;44 x',
+    "&gt;&gt;5555 &gt;&gt;6666<br>&gt;&gt;7777<br>http://[bad",
+    # Stray brackets and entities outside the usual few
+    '<b<a href="#p1" class="quotelink">&gt;&gt;1</a> &gt;<br>&gt;',
+    "caf&eacute;&#10;&gt;&gt;8888<br>&amp;gt; &quot;x&#039;",
+]
+
 
 def test_html_to_text_strips_tags_and_br() -> None:
     raw = "Hello<br>World <b>bold</b> &amp; stuff"
@@ -33,3 +50,22 @@ def test_strip_header_quotes() -> None:
 def test_extract_all_quotes() -> None:
     text = "hi >>1111 there >>2222\n>>3333"
     assert extract_all_quotes(text) == ["1111", "2222", "3333"]
+
+
+def test_parse_comment_matches_chained_pipeline() -> None:
+    for raw in _SAMPLE_COMMENTS:
+        text = html_to_text(raw)
+        header, body = extract_quotes(text)
+        parsed = parse_comment(raw)
+        assert parsed.text == text
+        assert parsed.header_quotes == tuple(header)
+        assert parsed.body_quotes == tuple(body)
+        assert parsed.all_quotes == extract_all_quotes(text)
+        assert parsed.body_html == text_to_html(strip_header_quotes(text))
+
+
+def test_parse_comment_splits_url_before_quote() -> None:
+    parsed = parse_comment("http://example.com/&gt;&gt;123")
+    assert parsed.body_quotes == ("123",)
+    assert 'data-url="http://example.com/"' in parsed.body_html
+    assert 'data-quote-id="123"' in parsed.body_html
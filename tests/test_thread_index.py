@@ -0,0 +1,82 @@
+import asyncio
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import ChanAPIClient, RequestScheduler
+from imageboard_explorer.clients.thread_index import ThreadIndex
+
+POLL_SECONDS = 0.05
+
+
+@pytest.fixture
+def upstream(monkeypatch: pytest.MonkeyPatch) -> dict:
+    state: dict = {"modified": 1704067200, "posts": [{"no": 1, "com": "op"}]}
+    state["calls"] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"].append(request.url.path)
+        if request.url.path == "/a/threads.json":
+            threads = [{"no": 1, "last_modified": state["modified"], "replies": 0}]
+            return httpx.Response(200, json=[{"page": 1, "threads": threads}])
+        return httpx.Response(
+            200,
+            json={"posts": state["posts"]},
+            headers={"Last-Modified": formatdate(state["modified"], usegmt=True)},
+        )
+
+    api = ChanAPIClient(transport=httpx.MockTransport(handler))
+    api.scheduler = RequestScheduler(interval_seconds=0)
+    monkeypatch.setattr(main, "client", api)
+    monkeypatch.setattr(main, "thread_index", ThreadIndex(api, POLL_SECONDS))
+    monkeypatch.setattr(main, "_thread_states", type(main._thread_states)())
+    monkeypatch.setattr(main, "_THREAD_TTL_SECONDS", 0.01)
+    return state
+
+
+def _thread_calls(state: dict) -> int:
+    return state["calls"].count("/a/thread/1.json")
+
+
+def test_index_skips_unchanged_and_refetches_changed_threads(upstream: dict) -> None:
+    async def run() -> list[list[int]]:
+        try:
+            first = await main._load_thread_posts("a", 1)
+            await asyncio.sleep(POLL_SECONDS / 2)
+            # TTL expired, but the index says the thread is unchanged
+            unchanged = await main._load_thread_posts("a", 1)
+            assert _thread_calls(upstream) == 1
+
+            upstream["modified"] += 60
+            upstream["posts"] = [{"no": 1, "com": "op"}, {"no": 2, "com": "new"}]
+            await asyncio.sleep(POLL_SECONDS * 1.5)
+            # The index moved on: refetched right away, not served stale
+            changed = await main._load_thread_posts("a", 1)
+            assert _thread_calls(upstream) == 2
+            return [
+                [post["no"] for post in posts] for posts in (first, unchanged, changed)
+            ]
+        finally:
+            await main.thread_index.aclose()
+            await main.client.aclose()
+
+    assert asyncio.run(run()) == [[1], [1], [1, 2]]
+
+
+def test_without_fresh_index_falls_back_to_ttl(upstream: dict) -> None:
+    async def run() -> None:
+        try:
+            await main._load_thread_posts("a", 1)
+            await main.thread_index.aclose()
+            await asyncio.sleep(POLL_SECONDS * 2.5)
+            await main._load_thread_posts("a", 1)
+            await asyncio.sleep(0.01)
+        finally:
+            await main.thread_index.aclose()
+            await main.client.aclose()
+
+    asyncio.run(run())
+    # Stale index: the expired entry is served and revalidated as before
+    assert _thread_calls(upstream) == 2
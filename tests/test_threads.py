@@ -0,0 +1,163 @@
+import asyncio
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+from imageboard_explorer import main
+from imageboard_explorer.clients.chan_api import (
+    CacheEntry,
+    ChanAPIClient,
+    RequestScheduler,
+)
+from imageboard_explorer.text import html_to_text, text_to_html
+from imageboard_explorer.threads import ThreadState, build_catalog_payload
+
+
+def _thread_json(*posts: tuple[int, str]) -> dict:
+    return {"posts": [{"no": no, "com": com} for no, com in posts]}
+
+
+@pytest.fixture
+def upstream(monkeypatch: pytest.MonkeyPatch) -> dict:
+    state: dict = {
+        "json": _thread_json((1, "op")),
+        "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+        "calls": 0,
+    }
+
+    def handler(_request: httpx.Request) -> httpx.Response:
+        state["calls"] += 1
+        return httpx.Response(
+            200, json=state["json"], headers={"Last-Modified": state["last_modified"]}
+        )
+
+    api = ChanAPIClient(transport=httpx.MockTransport(handler))
+    api.scheduler = RequestScheduler(interval_seconds=0)
+    monkeypatch.setattr(main, "client", api)
+    monkeypatch.setattr(main, "thread_index", None)
+    monkeypatch.setattr(main, "_thread_states", type(main._thread_states)())
+    return state
+
+
+def _load(thread_id: int = 1) -> list[dict]:
+    return asyncio.run(main._load_thread_posts("a", thread_id))
+
+
+def test_thread_payloads_reused_while_last_modified_unchanged(upstream: dict) -> None:
+    upstream["json"] = _thread_json(
+        (1, "op"), (2, '<a class="quotelink">&gt;&gt;1</a>')
+    )
+    first = _load()
+    main.client._cache._entries.clear()
+    second = _load()
+    assert upstream["calls"] == 2
+    assert second is first
+    assert first[0]["reply_from"] == [2]
+
+
+def test_thread_payloads_rebuilt_when_last_modified_changes(upstream: dict) -> None:
+    first = _load()
+    main.client._cache._entries.clear()
+    upstream["json"] = _thread_json((1, "op"), (2, "reply"))
+    upstream["last_modified"] = "Mon, 01 Jan 2024 00:01:00 GMT"
+    second = _load()
+    assert [post["no"] for post in first] == [1]
+    assert [post["no"] for post in second] == [1, 2]
+
+
+def _quote(no: int) -> str:
+    return f'<a href="#p{no}" class="quotelink">&gt;&gt;{no}</a>'
+
+
+def _ingest(state: ThreadState, *posts: tuple[int, str]) -> list[dict]:
+    state.ingest(CacheEntry(_thread_json(*posts), 0.0, None))
+    return state.posts
+
+
+def test_incremental_ingest_renders_only_new_posts() -> None:
+    state = ThreadState("a", 1)
+    first = _ingest(state, (1, "op"), (2, _quote(1)))
+    op_payload = first[0]
+    posts = _ingest(state, (1, "op"), (2, _quote(1)), (3, _quote(1) + _quote(2)))
+    assert posts[0] is op_payload
+    assert [post["no"] for post in posts] == [1, 2, 3]
+    assert posts[0]["reply_from"] == [2, 3]
+    assert posts[1]["reply_from"] == [3]
+
+
+def test_incremental_ingest_drops_deleted_posts() -> None:
+    state = ThreadState("a", 1)
+    _ingest(state, (1, "op"), (2, _quote(1)), (3, _quote(1)))
+    posts = _ingest(state, (1, "op"), (3, _quote(1)), (4, _quote(2)))
+    assert [post["no"] for post in posts] == [1, 3, 4]
+    assert posts[0]["reply_from"] == [3]
+
+
+def test_pending_quotes_do_not_accumulate() -> None:
+    state = ThreadState("a", 10)
+    # >>5 predates the thread; >>12 may still be posted
+    _ingest(state, (10, "op"), (11, _quote(5) + _quote(12)))
+    assert state._pending == {12: [11]}
+    _ingest(state, (10, "op"))
+    assert state._pending == {}
+
+
+def test_incremental_ingest_matches_full_rebuild() -> None:
+    history = [
+        [(1, "op"), (2, _quote(1))],
+        [(1, "op"), (2, _quote(1)), (3, _quote(2) + "<br>" + _quote(1))],
+        [(1, "op edited"), (3, _quote(2) + "<br>" + _quote(1)), (5, _quote(3))],
+    ]
+    state = ThreadState("a", 1)
+    for posts in history:
+        incremental = _ingest(state, *posts)
+        assert incremental == _ingest(ThreadState("a", 1), *posts)
+
+
+def test_strict_mode_validates_and_builds_same_payloads() -> None:
+    posts = ((1, "op"), (2, _quote(1)))
+    lean = _ingest(ThreadState("a", 1), *posts)
+    strict = _ingest(ThreadState("a", 1, strict=True), *posts)
+    assert lean == strict
+    with pytest.raises(ValidationError):
+        ThreadState("a", 1, strict=True).ingest(
+            CacheEntry({"posts": [{"no": "not-a-number"}]}, 0.0, None)
+        )
+
+
+def test_single_post_lookup_matches_ingested_payload() -> None:
+    posts = ((1, "op"), (2, _quote(1)), (3, _quote(2) + _quote(1)), (12, _quote(1)))
+    entry = CacheEntry(_thread_json(*posts), 0.0, None)
+    expected = _ingest(ThreadState("a", 1), *posts)
+    state = ThreadState("a", 1)
+    assert [state.post(entry, no) for no, _ in posts] == expected
+    assert state.post(entry, 99) is None
+    # Nothing was ingested; the lookups only indexed the raw posts
+    assert not state.posts
+
+
+def test_single_post_lookup_defers_replies() -> None:
+    entry = CacheEntry(_thread_json((1, "op"), (2, _quote(1))), 0.0, None)
+    state = ThreadState("a", 1)
+    assert state.post(entry, 1, replies=False)["reply_from"] == []
+    assert state.post(entry, 1)["reply_from"] == [2]
+    assert state.post(entry, 1)["reply_from"] == [2]
+
+    # A new upstream version is indexed afresh
+    newer = CacheEntry(_thread_json((1, "op"), (2, _quote(1)), (3, _quote(1))), 0, None)
+    assert state.post(newer, 1)["reply_from"] == [2, 3]
+
+
+def test_catalog_comment_matches_baseline_markup() -> None:
+    quote = '<a href="#p{0}" class="quotelink">&gt;&gt;{0}</a>'
+    comments = [
+        None,
+        quote.format(11),
+        f"{quote.format(11)} {quote.format(12)}<br><br>{quote.format(13)}<br>",
+        f"{quote.format(11)}<br>body http://example.com/&gt;&gt;14<br>&gt;&gt;15",
+        "<b<i>stray</i> &eacute;&#10;&gt;&gt;16 &amp;gt;",
+    ]
+    for com in comments:
+        payload = build_catalog_payload("g", {"no": 1, "com": com})
+        assert payload["comment_html"] == text_to_html(html_to_text(com))